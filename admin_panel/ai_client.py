@@ -0,0 +1,157 @@
+"""
+HTTP client for the AI server.
+
+One pooled requests.Session is shared by the whole process, so consecutive calls reuse their
+keep-alive connections instead of opening a new one per row. Every call has a timeout.
+
+Rows of a step are sent in one request to the `<path>/batch` endpoint, gzip compressed when
+large. Servers without batch endpoints answer 404; the client then remembers that for
+AI_BATCH_RECHECK seconds and sends the rows one per request through a bounded thread pool.
+The same applies to the material hash check: without it, every file is uploaded.
+"""
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from requests_toolbelt.multipart.encoder import MultipartEncoder
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+load_dotenv()
+
+AI_SERVER = os.getenv("AI_SERVER", "http://127.0.0.1:5000")
+
+# seconds to connect and to wait for a response; uploads get a longer read timeout
+AI_CONNECT_TIMEOUT = float(os.getenv("AI_CONNECT_TIMEOUT", 5))
+AI_READ_TIMEOUT = float(os.getenv("AI_READ_TIMEOUT", 60))
+AI_UPLOAD_TIMEOUT = float(os.getenv("AI_UPLOAD_TIMEOUT", 600))
+
+# requests in flight at once for the rows of one step, and connections kept open
+AI_CONCURRENCY = int(os.getenv("AI_CONCURRENCY", 8))
+AI_POOL_SIZE = int(os.getenv("AI_POOL_SIZE", 16))
+
+# material files uploaded at the same time
+AI_UPLOAD_CONCURRENCY = int(os.getenv("AI_UPLOAD_CONCURRENCY", 3))
+
+# batch bodies larger than this many bytes are sent gzip compressed, 0 disables compression
+AI_GZIP_MIN_BYTES = int(os.getenv("AI_GZIP_MIN_BYTES", 1024))
+
+# seconds before a server found without a batch or hash check endpoint is asked again
+AI_BATCH_RECHECK = float(os.getenv("AI_BATCH_RECHECK", 600))
+
+_session = None
+_session_lock = threading.Lock()
+_executor = None
+_unsupported = {}  # (base url, path) -> time the server answered 404 for that optional endpoint
+
+
+def _is_not_found(error):
+    return error.response is not None and error.response.status_code in (404, 405)
+
+
+def get_session():
+    global _session, _executor
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                # only failed connection attempts are retried, a POST that reached the server is not resent
+                retry = Retry(total=None, connect=2, read=0, redirect=0, status=0, other=0, backoff_factor=0.2)
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=AI_POOL_SIZE, max_retries=retry)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _executor = ThreadPoolExecutor(max_workers=AI_CONCURRENCY, thread_name_prefix="ai-client")
+                _session = session
+    return _session
+
+
+class AIClient:
+
+    def __init__(self, base_url=None):
+        self.base_url = (base_url or AI_SERVER).rstrip("/")
+        self.session = get_session()
+
+    def post_json(self, path, data):
+        response = self.session.post(f"{self.base_url}{path}", json=data,
+                                     timeout=(AI_CONNECT_TIMEOUT, AI_READ_TIMEOUT))
+        response.raise_for_status()
+        return response
+
+    def post_rows(self, path, rows):
+        # sends one request per row, at most AI_CONCURRENCY at a time. The first failure
+        # cancels the rows not started yet and is raised.
+        futures = [_executor.submit(self.post_json, path, row) for row in rows]
+        done, pending = wait(futures, return_when=FIRST_EXCEPTION)
+        for future in pending:
+            future.cancel()
+        for future in futures:
+            if future in done and future.exception() is not None:
+                wait(pending)
+                raise future.exception()
+        return len(futures)
+
+    def post_batch(self, path, course_code, rows):
+        body = json.dumps({"course_code": course_code, "items": rows}).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if AI_GZIP_MIN_BYTES and len(body) >= AI_GZIP_MIN_BYTES:
+            body = gzip.compress(body, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+        response = self.session.post(f"{self.base_url}{path}/batch", data=body, headers=headers,
+                                     timeout=(AI_CONNECT_TIMEOUT, AI_READ_TIMEOUT))
+        response.raise_for_status()
+        return response
+
+    def supports(self, path):
+        unsupported_at = _unsupported.get((self.base_url, path))
+        return unsupported_at is None or time.monotonic() - unsupported_at > AI_BATCH_RECHECK
+
+    def mark_unsupported(self, path):
+        _unsupported[(self.base_url, path)] = time.monotonic()
+
+    def post_many(self, path, course_code, rows):
+        # all rows in one batch request when the server supports it, else one request per row
+        if self.supports(f"{path}/batch"):
+            try:
+                self.post_batch(path, course_code, rows)
+                return "batch"
+            except requests.HTTPError as e:
+                if not _is_not_found(e):
+                    raise
+                logger.warning(f"AI server has no batch endpoint for {path}, sending rows one by one")
+                self.mark_unsupported(f"{path}/batch")
+        self.post_rows(path, rows)
+        return "rows"
+
+    def missing_files(self, course_code, files):
+        """
+        files: list of {"file_name", "sha256"}. Returns the sha256 values the AI server does
+        not hold for the course, or None when the server has no hash check endpoint.
+        """
+        path = "/api/course_materials/check"
+        if not self.supports(path):
+            return None
+        try:
+            response = self.post_json(path, {"course_code": course_code, "files": files})
+        except requests.HTTPError as e:
+            if not _is_not_found(e):
+                raise
+            logger.warning("AI server has no material hash check, uploading every file")
+            self.mark_unsupported(path)
+            return None
+        return set(response.json()["missing"])
+
+    def upload_file(self, path, file_path, file_name, fields):
+        with open(file_path, 'rb') as f:
+            encoder = MultipartEncoder(fields={**fields, 'file': (file_name, f, 'application/octet-stream')})
+            response = self.session.post(f"{self.base_url}{path}", data=encoder,
+                                         headers={'Content-Type': encoder.content_type},
+                                         timeout=(AI_CONNECT_TIMEOUT, AI_UPLOAD_TIMEOUT))
+        response.raise_for_status()
+        return response
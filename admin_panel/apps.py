@@ -1,6 +1,26 @@
+import os
+import sys
+
 from django.apps import AppConfig
 
 
 class AdminPanelConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "admin_panel"
+
+    def ready(self):
+        from . import processing  # noqa: F401, registers the process_course job handler
+
+        # VECTOR_WARMUP=1 preloads the vector indexes while the server starts accepting requests
+        if os.getenv("VECTOR_WARMUP", "0") == "1" and serving_requests():
+            from vectorization.warmup import warm_up_in_background
+            warm_up_in_background()
+
+
+def serving_requests():
+    # False for management commands like migrate, and for the autoreloader parent of runserver
+    if os.path.basename(sys.argv[0]) != "manage.py":
+        return True  # wsgi server
+    if len(sys.argv) < 2 or sys.argv[1] != "runserver":
+        return False
+    return os.environ.get("RUN_MAIN") == "true" or "--noreload" in sys.argv
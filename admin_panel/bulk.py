@@ -0,0 +1,174 @@
+"""
+Bulk writes of course rows straight to the MongoDB collections behind the djongo models.
+
+djongo turns every ORM save into its own round trip, and its bulk_create inserts unordered, so
+a failure can leave part of the rows behind. insert_all writes all rows in one ordered
+insert_many and deletes what it inserted if that fails. apply_changes writes the inserts,
+updates and deletes found by diff_rows in one bulk_write and puts the original documents back
+if that fails. The documents are built through the model fields, so they look exactly like the
+ones the ORM writes.
+
+Other database backends (klaw_app/test_settings.py uses sqlite) get the ORM equivalent in a transaction.
+"""
+import logging
+from collections import namedtuple
+
+from bson import ObjectId
+from django.db import connection, transaction
+from pymongo import DeleteMany, InsertOne, ReplaceOne, UpdateOne
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+
+def get_collection(model):
+    # the pymongo collection of a djongo model
+    connection.ensure_connection()
+    return connection.connection[model._meta.db_table]
+
+
+def to_document(model, values):
+    instance = model(**values)
+    document = {}
+    for field in model._meta.concrete_fields:
+        if field.primary_key:
+            value = ObjectId()
+        else:
+            value = field.get_db_prep_save(field.pre_save(instance, add=True), connection)
+        document[field.column] = value
+    return document
+
+
+def insert_all(model, rows):
+    """
+    Inserts rows (dicts of field values) in one request, all or nothing. Returns the number
+    of rows inserted.
+    """
+    if not rows:
+        return 0
+    if connection.vendor != 'djongo':
+        with transaction.atomic():
+            return len(model.objects.bulk_create([model(**values) for values in rows]))
+
+    documents = [to_document(model, values) for values in rows]
+    collection = get_collection(model)
+    try:
+        # ordered, so nothing after a failed document is written
+        collection.insert_many(documents, ordered=True)
+    except PyMongoError:
+        # without a replica set there are no transactions, the compensating delete stands in for one
+        inserted = [document['_id'] for document in documents]
+        try:
+            collection.delete_many({'_id': {'$in': inserted}})
+        except PyMongoError as e:
+            logger.error(f"Failed to roll back partial insert into {model._meta.db_table}: {str(e)}")
+        raise
+    return len(documents)
+
+
+# inserts: dicts of field values, updates: (instance, {field: new value}), deletes and unchanged: instances
+Changes = namedtuple('Changes', ['inserts', 'updates', 'deletes', 'unchanged'])
+
+
+def diff_rows(existing, rows, key_fields):
+    """
+    Matches the stored instances of a course against the submitted rows (dicts of field
+    values) by key_fields. Matched rows with other differing values become updates, unmatched
+    rows inserts, and stored rows nothing matched (or a second stored row with the same key)
+    deletes.
+
+    Rows are read back in the order they were stored, and inserts land after the existing
+    rows. When that would not give the submitted order (the rows were reordered, or a new row
+    comes before an existing one), the rows are matched by position instead.
+    """
+    existing = list(existing)
+    by_key = {}
+    duplicates = []
+    for position, instance in enumerate(existing):
+        key = tuple(getattr(instance, name) for name in key_fields)
+        if key in by_key:
+            duplicates.append(instance)
+        else:
+            by_key[key] = (position, instance)
+
+    inserts, updates, unchanged = [], [], []
+    last_position = -1
+    in_order = True
+    for values in rows:
+        position, instance = by_key.pop(tuple(values[name] for name in key_fields), (None, None))
+        if instance is None:
+            inserts.append(values)
+            continue
+        in_order = in_order and not inserts and position > last_position
+        last_position = position
+        changed = {name: value for name, value in values.items() if getattr(instance, name) != value}
+        if changed:
+            updates.append((instance, changed))
+        else:
+            unchanged.append(instance)
+    if not in_order:
+        return _diff_positions(existing, rows)
+    return Changes(inserts, updates, [instance for _, instance in by_key.values()] + duplicates, unchanged)
+
+
+def _diff_positions(existing, rows):
+    # the stored row at each position takes the values submitted for that position
+    updates, unchanged = [], []
+    for instance, values in zip(existing, rows):
+        changed = {name: value for name, value in values.items() if getattr(instance, name) != value}
+        if changed:
+            updates.append((instance, changed))
+        else:
+            unchanged.append(instance)
+    return Changes(list(rows[len(existing):]), updates, existing[len(rows):], unchanged)
+
+
+def _update_fields(model, instance, values):
+    # the $set of an update, including auto_now fields like updated_at
+    for name, value in values.items():
+        setattr(instance, name, value)
+    fields = [field for field in model._meta.concrete_fields
+              if field.attname in values or getattr(field, 'auto_now', False)]
+    return {field.column: field.get_db_prep_save(field.pre_save(instance, add=False), connection)
+            for field in fields}
+
+
+def apply_changes(model, changes):
+    """
+    Writes the inserts, updates and deletes of `changes` in one request, all or nothing.
+    Returns the number of inserted, updated and deleted rows.
+    """
+    counts = {'inserted': len(changes.inserts), 'updated': len(changes.updates), 'deleted': len(changes.deletes)}
+    if not changes.inserts and not changes.updates and not changes.deletes:
+        return counts
+    if connection.vendor != 'djongo':
+        with transaction.atomic():
+            model.objects.bulk_create([model(**values) for values in changes.inserts])
+            for instance, values in changes.updates:
+                for name, value in values.items():
+                    setattr(instance, name, value)
+                instance.save()
+            model.objects.filter(pk__in=[instance.pk for instance in changes.deletes]).delete()
+        return counts
+
+    collection = get_collection(model)
+    touched = [instance.pk for instance, _ in changes.updates] + [instance.pk for instance in changes.deletes]
+    originals = list(collection.find({'_id': {'$in': touched}})) if touched else []
+    documents = [to_document(model, values) for values in changes.inserts]
+    operations = [InsertOne(document) for document in documents]
+    operations += [UpdateOne({'_id': instance.pk}, {'$set': _update_fields(model, instance, values)})
+                   for instance, values in changes.updates]
+    if changes.deletes:
+        operations.append(DeleteMany({'_id': {'$in': [instance.pk for instance in changes.deletes]}}))
+    try:
+        collection.bulk_write(operations, ordered=True)
+    except PyMongoError:
+        # undo whatever part was written: drop the inserts, put back the updated and deleted documents
+        restore = [DeleteMany({'_id': {'$in': [document['_id'] for document in documents]}})]
+        restore += [ReplaceOne({'_id': original['_id']}, original, upsert=True) for original in originals]
+        try:
+            collection.bulk_write(restore, ordered=False)
+        except PyMongoError as e:
+            logger.error(f"Failed to roll back partial bulk write to {model._meta.db_table}: {str(e)}")
+        raise
+    return counts
@@ -0,0 +1,255 @@
+"""
+Persistent background jobs.
+
+Jobs are BackgroundJob rows in mongo, so they survive restarts of both the web server and the
+workers. Views only enqueue them; `python manage.py run_jobs` claims queued jobs and runs the
+handler registered for their kind. A failing job is retried with exponential backoff until it
+reaches max_attempts, unless it raised PermanentJobError. A running job whose worker died is
+queued again once its heartbeat is older than JOB_STALE_AFTER seconds; while a handler runs, a
+thread refreshes the heartbeat every JOB_HEARTBEAT_INTERVAL seconds. Every write of a job is
+conditional on locked_by, so a worker whose job was requeued or claimed by another worker stops
+at its next checkpoint instead of overwriting the new run's progress.
+
+Handlers defined outside this module are registered when AdminPanelConfig.ready imports them.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import urllib.parse
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import connection
+from django.utils import timezone
+
+from .models import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+
+# seconds before the first retry of a failed job, doubled for every further attempt
+JOB_RETRY_DELAY = float(os.getenv("JOB_RETRY_DELAY", 30))
+
+# a running job without a heartbeat for this many seconds is considered abandoned
+JOB_STALE_AFTER = float(os.getenv("JOB_STALE_AFTER", 600))
+
+# seconds between heartbeats of a running job, well below JOB_STALE_AFTER
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", 60))
+
+_handlers = {}
+
+
+class PermanentJobError(Exception):
+    # raised by a handler when retrying cannot help, the job fails without further attempts
+    pass
+
+
+class LostJobError(Exception):
+    # the job no longer belongs to this worker (requeued as stale or claimed by another one)
+    pass
+
+
+def register(kind):
+    # decorator registering the function that runs jobs of `kind`, it receives a JobContext
+    def decorator(handler):
+        _handlers[kind] = handler
+        return handler
+    return decorator
+
+
+def enqueue(kind, course_code, max_attempts=JOB_MAX_ATTEMPTS, **payload):
+    job = BackgroundJob.objects.create(
+        kind=kind,
+        course_code=course_code,
+        payload=json.dumps(payload),
+        max_attempts=max_attempts,
+    )
+    logger.info(f"Job queued: {kind} {job._id} for course {course_code}")
+    return job
+
+
+def job_data(job):
+    return {
+        'id': str(job._id),
+        'kind': job.kind,
+        'status': job.status,
+        'stage': job.stage,
+        'progress': json.loads(job.progress),
+        'timings': json.loads(job.timings),
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'error': job.error,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+    }
+
+
+class JobContext:
+    # what a handler sees of its job: the payload, plus stage timing and progress reporting
+
+    def __init__(self, job):
+        self.job = job
+        self.payload = json.loads(job.payload)
+        self.progress = json.loads(job.progress)  # kept across attempts, handlers can resume from it
+        self.timings = json.loads(job.timings)
+        self.lost = False
+
+    @contextmanager
+    def stage(self, name):
+        self.save(stage=name)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - started)
+            self.save()
+
+    def add_time(self, name, seconds):
+        self.timings[name] = round(self.timings.get(name, 0) + seconds, 3)
+
+    def report(self, **counters):
+        self.progress.update(counters)
+        self.save()
+
+    def save(self, **fields):
+        # every save doubles as the heartbeat of the job; nothing is written once the job is lost
+        if not self.lost:
+            fields.update(
+                progress=json.dumps(self.progress),
+                timings=json.dumps(self.timings),
+                heartbeat_at=timezone.now(),
+            )
+            self.lost = not self._owned().update(**fields)
+        if self.lost:
+            raise LostJobError(f"Job {self.job._id} is no longer run by {self.job.locked_by}")
+
+    def _owned(self):
+        return BackgroundJob.objects.filter(_id=self.job._id, locked_by=self.job.locked_by)
+
+    @contextmanager
+    def heartbeat(self, interval=JOB_HEARTBEAT_INTERVAL):
+        # refreshes heartbeat_at while a step runs longer than JOB_STALE_AFTER between saves
+        stop = threading.Event()
+
+        def beat():
+            try:
+                while not stop.wait(interval):
+                    if not self._owned().update(heartbeat_at=timezone.now()):
+                        self.lost = True
+                        return
+            finally:
+                connection.close()  # the connection Django opened for this thread
+
+        thread = threading.Thread(target=beat, name=f"heartbeat-{self.job._id}", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+
+def requeue_stale():
+    cutoff = timezone.now() - timedelta(seconds=JOB_STALE_AFTER)
+    requeued = BackgroundJob.objects.filter(status='running', heartbeat_at__lt=cutoff).update(
+        status='queued', locked_by='', run_after=timezone.now())
+    if requeued:
+        logger.warning(f"Requeued {requeued} jobs abandoned by their worker")
+    return requeued
+
+
+def claim(worker_id, kinds=None):
+    # takes the oldest runnable job; the conditional update makes sure only one worker gets it
+    now = timezone.now()
+    candidates = BackgroundJob.objects.filter(status='queued', run_after__lte=now)
+    if kinds:
+        candidates = candidates.filter(kind__in=kinds)
+    for job in candidates.order_by('created_at')[:10]:
+        claimed = BackgroundJob.objects.filter(_id=job._id, status='queued', attempts=job.attempts).update(
+            status='running',
+            locked_by=worker_id,
+            attempts=job.attempts + 1,
+            heartbeat_at=now,
+            started_at=now,
+            stage='',
+        )
+        if claimed:
+            return BackgroundJob.objects.get(_id=job._id)
+    return None
+
+
+def run(job):
+    # runs a claimed job to completion, returns True if it succeeded
+    context = JobContext(job)
+    if 'queue_wait' not in context.timings:
+        context.add_time('queue_wait', (job.started_at - job.created_at).total_seconds())
+    handler = _handlers.get(job.kind)
+    try:
+        try:
+            if handler is None:
+                raise ValueError(f"No handler registered for job kind {job.kind!r}")
+            with context.heartbeat():
+                handler(context)
+        except LostJobError:
+            raise
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if handler is not None and job.attempts < job.max_attempts and not isinstance(e, PermanentJobError):
+                delay = JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+                context.save(status='queued', locked_by='', error=error,
+                             run_after=timezone.now() + timedelta(seconds=delay))
+                logger.error(f"Job {job.kind} {job._id} failed (attempt {job.attempts}), retrying in {delay:.0f}s: {error}")
+            else:
+                context.save(status='failed', locked_by='', error=error, finished_at=timezone.now())
+                logger.error(f"Job {job.kind} {job._id} failed after {job.attempts} attempts: {error}")
+            return False
+
+        context.save(status='succeeded', stage='', locked_by='', error='', finished_at=timezone.now())
+    except LostJobError:
+        logger.warning(f"Job {job.kind} {job._id} was requeued or claimed by another worker, "
+                       f"{job.locked_by} stopped its run")
+        return False
+    logger.info(f"Job {job.kind} {job._id} for course {job.course_code} succeeded")
+    return True
+
+
+# --- vectorization of course materials ---
+
+def material_file_path(file_path):
+    # file_path of a CourseMaterial is a url-encoded /media/ url, the file itself lives under media/
+    file_name = urllib.parse.unquote(os.path.basename(file_path))
+    return os.path.join('media', file_name)
+
+
+def enqueue_material_ingestion(course_code, materials, removed=()):
+    # one job per uploaded file, plus one per file that no longer belongs to the course
+    jobs = [enqueue('ingest_material', course_code, file_path=material_file_path(m.file_path)) for m in materials]
+    jobs += [enqueue('remove_material', course_code, file_path=material_file_path(m.file_path)) for m in removed]
+    return jobs
+
+
+@register('ingest_material')
+def ingest_material(context):
+    from vectorization.add import add
+
+    def on_batch(index, size, seconds):
+        context.add_time('embed_and_store', seconds)
+        context.report(batches=index + 1, chunks=context.progress['chunks'] + size)
+
+    context.progress.update(batches=0, chunks=0)
+    with context.stage('ingest'):
+        result = add(context.job.course_code, context.payload['file_path'], on_batch=on_batch)
+    context.report(result=result)
+
+
+@register('remove_material')
+def remove_material(context):
+    from vectorization.add import remove
+
+    with context.stage('remove'):
+        removed = remove(context.job.course_code, os.path.basename(context.payload['file_path']))
+    context.report(chunks_removed=removed)
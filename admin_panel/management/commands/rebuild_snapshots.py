@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from admin_panel.models import Course, CourseSnapshot
+from admin_panel.snapshots import refresh_snapshots
+
+
+class Command(BaseCommand):
+    help = (
+        "Regenerate the course snapshots read by the course detail and list endpoints from the "
+        "basic info, outcome, syllabus, question and material collections."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', action='append', dest='courses', default=[],
+                            help="Only rebuild the snapshot of this course (repeatable).")
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help="Courses loaded per round of queries (default 100).")
+
+    def handle(self, *args, **options):
+        courses = Course.objects.all()
+        if options['courses']:
+            courses = courses.filter(course_code__in=options['courses'])
+        course_codes = list(courses.values_list('course_code', flat=True))
+        batch_size = max(options['batch_size'], 1)
+        started = time.perf_counter()
+
+        for start in range(0, len(course_codes), batch_size):
+            batch = course_codes[start:start + batch_size]
+            refresh_snapshots(Course.objects.filter(course_code__in=batch))
+            self.stdout.write(f"[{min(start + batch_size, len(course_codes))}/{len(course_codes)}] snapshots rebuilt")
+
+        removed = 0
+        if not options['courses']:
+            # snapshots of courses deleted without going through CourseDeleteView
+            orphans = CourseSnapshot.objects.exclude(course_code__in=course_codes)
+            removed = orphans.count()
+            orphans.delete()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {len(course_codes)} snapshots, removed {removed} orphaned, "
+            f"in {time.perf_counter() - started:.1f}s"))
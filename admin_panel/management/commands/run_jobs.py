@@ -0,0 +1,63 @@
+import os
+import signal
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from admin_panel import jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued background jobs (material vectorization and the like). Start it next to the "
+        "web server; several workers on one or more machines can share the queue."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=int(os.getenv("JOB_WORKERS", 2)),
+                            help="Jobs run at the same time (default JOB_WORKERS or 2).")
+        parser.add_argument('--kind', action='append', dest='kinds', default=[],
+                            help="Only run jobs of this kind (repeatable).")
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help="Seconds to wait when the queue is empty (default 2).")
+        parser.add_argument('--once', action='store_true',
+                            help="Exit once no runnable job is left instead of waiting for more.")
+
+    def handle(self, *args, **options):
+        concurrency = max(options['concurrency'], 1)
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        stopping = threading.Event()
+        slots = threading.BoundedSemaphore(concurrency)
+
+        def stop(signum, frame):
+            self.stdout.write("Stopping after the running jobs finish...")
+            stopping.set()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        def run(job):
+            try:
+                jobs.run(job)
+            finally:
+                close_old_connections()
+                slots.release()
+
+        self.stdout.write(f"Worker {worker_id} running up to {concurrency} jobs at a time")
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            while not stopping.is_set():
+                jobs.requeue_stale()
+                slots.acquire()
+                job = jobs.claim(worker_id, options['kinds'])
+                if job is None:
+                    slots.release()
+                    if options['once']:
+                        break
+                    stopping.wait(options['poll_interval'])
+                    continue
+                self.stdout.write(f"Running {job.kind} {job._id} for {job.course_code} (attempt {job.attempts})")
+                executor.submit(run, job)
+        self.stdout.write(self.style.SUCCESS("Worker stopped."))
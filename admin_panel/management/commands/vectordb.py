@@ -0,0 +1,112 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from admin_panel.models import Course, CourseBasicInfo
+from vectorization import maintenance, warmup
+
+
+def human_size(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.1f}{unit}" if unit != "B" else f"{size}B"
+        size /= 1024
+
+
+class Command(BaseCommand):
+    help = "Inspect and clean up the vector store under db/."
+
+    def add_arguments(self, parser):
+        subcommands = parser.add_subparsers(dest='action', required=True)
+
+        subcommands.add_parser('stats', help="Chunk count and disk use per collection.")
+
+        prune = subcommands.add_parser(
+            'prune', help="Drop collections of deleted courses and remove unreferenced segment directories.")
+        prune.add_argument('--dry-run', action='store_true', help="Only report what would be removed.")
+
+        rebuild = subcommands.add_parser('rebuild', help="Rebuild collections without their deleted entries.")
+        rebuild.add_argument('names', nargs='*', help="Collections to rebuild (default: all).")
+        rebuild.add_argument('--vacuum', action='store_true', help="Also VACUUM chroma.sqlite3 afterwards.")
+
+        warm = subcommands.add_parser('warmup', help="Preload collection indexes into memory.")
+        warm.add_argument('names', nargs='*',
+                          help="Collections to warm up (default: VECTOR_WARMUP_COLLECTIONS or the most recent).")
+        warm.add_argument('--limit', type=int, default=warmup.WARMUP_LIMIT,
+                          help="How many recently ingested collections to warm up when no names are given.")
+
+    def handle(self, *args, **options):
+        getattr(self, f"handle_{options['action']}")(options)
+
+    def handle_stats(self, options):
+        stats = maintenance.collection_stats()
+        total = 0
+        self.stdout.write(f"{'collection':<40}{'backend':<9}{'chunks':>10}{'size':>12}")
+        for entry in stats:
+            total += entry['bytes']
+            self.stdout.write(f"{entry['name']:<40}{entry['backend']:<9}{entry['count']:>10}{human_size(entry['bytes']):>12}")
+        try:
+            orphans = maintenance.orphan_segment_directories()
+        except maintenance.CatalogError as e:
+            self.stdout.write(f"{len(stats)} collections, {human_size(total)}; unreferenced segment directories unknown: {e}")
+            return
+        orphan_bytes = sum(maintenance.directory_size(d) for d in orphans)
+        self.stdout.write(f"{len(stats)} collections, {human_size(total)}; "
+                          f"{len(orphans)} unreferenced segment directories, {human_size(orphan_bytes)}")
+
+    def remove_orphans(self):
+        # segment directories no collection refers to, e.g. of collections just dropped or rebuilt
+        freed, failed = maintenance.remove_directories(maintenance.orphan_segment_directories())
+        for directory in failed:
+            self.stderr.write(f"could not remove {directory} completely")
+        return freed
+
+    def handle_prune(self, options):
+        live_courses = set(Course.objects.values_list('course_code', flat=True))
+        live_courses |= set(CourseBasicInfo.objects.values_list('course_code', flat=True))
+        stale = [entry['name'] for entry in maintenance.collection_stats() if entry['name'] not in live_courses]
+        try:
+            orphans = maintenance.orphan_segment_directories()
+        except maintenance.CatalogError as e:
+            raise CommandError(f"{e}; nothing was removed.")
+
+        for name in stale:
+            self.stdout.write(f"collection without a course: {name}")
+        for directory in orphans:
+            self.stdout.write(f"unreferenced segment directory: {directory}")
+        if options['dry_run']:
+            self.stdout.write(f"{len(stale)} collections and {len(orphans)} directories would be removed.")
+            return
+
+        dropped = maintenance.drop_collections(stale)
+        # segments of the collections just dropped are orphans now as well
+        freed = self.remove_orphans()
+        self.stdout.write(self.style.SUCCESS(
+            f"Dropped {len(dropped)} collections, removed segment directories freeing {human_size(freed)}."))
+
+    def handle_rebuild(self, options):
+        names = options['names'] or [entry['name'] for entry in maintenance.collection_stats()]
+        known = {entry['name'] for entry in maintenance.collection_stats()}
+        missing = [name for name in names if name not in known]
+        if missing:
+            raise CommandError(f"Unknown collections: {', '.join(missing)}")
+        for name in names:
+            result = maintenance.rebuild_collection(name)
+            self.stdout.write(f"{name} ({result['backend']}): {result['count']} chunks, "
+                              f"{result['removed']} dead rows removed")
+        try:
+            freed = self.remove_orphans()
+        except maintenance.CatalogError as e:
+            self.stderr.write(f"unreferenced segment directories were kept: {e}")
+            freed = 0
+        if options['vacuum']:
+            freed += maintenance.vacuum_catalog()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(names)} collections, freed {human_size(freed)}."))
+
+    def handle_warmup(self, options):
+        started = time.perf_counter()
+        results = warmup.warm_up(options['names'] or None, limit=options['limit'])
+        for result in results:
+            self.stdout.write(f"{result['name']}: {human_size(result['bytes'])} preloaded in {result['seconds']}s")
+        self.stdout.write(self.style.SUCCESS(
+            f"Warmed up {len(results)} collections in {time.perf_counter() - started:.2f}s."))
@@ -0,0 +1,132 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from admin_panel.jobs import material_file_path
+from admin_panel.models import CourseMaterial
+from vectorization.add import add
+from vectorization.manifest import get_manifest, file_sha256
+
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.txt')
+
+
+def media_source(path, directory):
+    # manifest source of a file found with --media: its path below MEDIA_ROOT (or else below the
+    # walked directory), so files of the same name in different folders do not replace each other.
+    # Files directly in media/ keep their name, as ingested by the ingest_material jobs.
+    root = os.path.abspath(settings.MEDIA_ROOT)
+    path = os.path.abspath(path)
+    if not path.startswith(root + os.sep):
+        root = os.path.abspath(directory)
+    return os.path.relpath(path, root).replace(os.sep, '/')
+
+
+class Command(BaseCommand):
+    help = (
+        "Vectorize course materials into their Chroma collections. Files already ingested with "
+        "the same content are skipped, so an interrupted run can simply be started again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', action='append', dest='courses', default=[],
+                            help="Course code whose CourseMaterial rows are ingested (repeatable).")
+        parser.add_argument('--all-courses', action='store_true',
+                            help="Ingest the materials of every course.")
+        parser.add_argument('--media', nargs='?', const='media', default=None,
+                            help="Walk a directory (default media/) instead of CourseMaterial rows.")
+        parser.add_argument('--collection',
+                            help="Collection that files found with --media are ingested into.")
+        parser.add_argument('--workers', type=int, default=4,
+                            help="Files ingested concurrently (default 4).")
+        parser.add_argument('--force', action='store_true',
+                            help="Re-ingest files even if their content has not changed.")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only list what would be ingested.")
+
+    def handle(self, *args, **options):
+        jobs = self.collect_jobs(options)
+        if not jobs:
+            self.stdout.write("Nothing to vectorize.")
+            return
+
+        if options['dry_run']:
+            self.dry_run(jobs, options['force'])
+            return
+
+        total = len(jobs)
+        counts = {"success": 0, "skipped": 0, "failed": 0}
+        started = time.perf_counter()
+        self.stdout.write(f"Vectorizing {total} files with {options['workers']} workers")
+
+        with ThreadPoolExecutor(max_workers=max(options['workers'], 1)) as executor:
+            futures = {
+                executor.submit(self.ingest, collection, path, source, options['force']): (collection, path)
+                for collection, path, source in jobs
+            }
+            for done, future in enumerate(as_completed(futures), start=1):
+                collection, path = futures[future]
+                try:
+                    result, elapsed = future.result()
+                except Exception as e:
+                    counts["failed"] += 1
+                    self.stderr.write(f"[{done}/{total}] {collection} {path}: failed: {e}")
+                    continue
+                counts[result] = counts.get(result, 0) + 1
+                self.stdout.write(f"[{done}/{total}] {collection} {path}: {result} in {elapsed:.2f}s")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done in {time.perf_counter() - started:.1f}s: {counts['success']} ingested, "
+            f"{counts['skipped']} unchanged, {counts['failed']} failed"
+        ))
+        if counts["failed"]:
+            raise CommandError(f"{counts['failed']} files failed, run the command again to retry them.")
+
+    def collect_jobs(self, options):
+        # list of (collection name, file path, manifest source)
+        if options['media']:
+            if not options['collection']:
+                raise CommandError("--collection is required with --media.")
+            directory = options['media']
+            if not os.path.isdir(directory):
+                raise CommandError(f"{directory} is not a directory.")
+            jobs = []
+            for root, _, files in os.walk(directory):
+                for name in sorted(files):
+                    if name.lower().endswith(SUPPORTED_EXTENSIONS):
+                        path = os.path.join(root, name)
+                        jobs.append((options['collection'], path, media_source(path, directory)))
+            return jobs
+
+        if not options['courses'] and not options['all_courses']:
+            raise CommandError("Pass --course CODE, --all-courses or --media.")
+        materials = CourseMaterial.objects.all()
+        if not options['all_courses']:
+            materials = materials.filter(course_code__in=options['courses'])
+
+        jobs = []
+        for material in materials:
+            path = material_file_path(material.file_path)
+            if not os.path.exists(path):
+                self.stderr.write(f"File not found for course {material.course_code}: {path}")
+                continue
+            jobs.append((material.course_code, path, os.path.basename(path)))
+        return jobs
+
+    def dry_run(self, jobs, force):
+        manifest = get_manifest()
+        pending = 0
+        for collection, path, source in jobs:
+            unchanged = not force and manifest.file_hash(collection, source) == file_sha256(path)
+            pending += not unchanged
+            self.stdout.write(f"{collection} {path}: {'unchanged' if unchanged else 'would ingest'}")
+        self.stdout.write(f"{pending} of {len(jobs)} files would be ingested.")
+
+    @staticmethod
+    def ingest(collection, path, source, force):
+        started = time.perf_counter()
+        result = add(collection, path, source=source, force=force)
+        return result, time.perf_counter() - started
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.25 on 2026-10-17 20:22
+
+from django.db import migrations, models
+import djongo.models.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_panel', '0004_backgroundjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MaterialUpload',
+            fields=[
+                ('_id', djongo.models.fields.ObjectIdField(auto_created=True, primary_key=True, serialize=False)),
+                ('ai_server', models.CharField(max_length=255)),
+                ('course_code', models.CharField(db_index=True, max_length=50)),
+                ('file_name', models.CharField(max_length=255)),
+                ('content_hash', models.CharField(max_length=64)),
+                ('file_size', models.BigIntegerField()),
+                ('file_mtime', models.FloatField()),
+                ('uploaded_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
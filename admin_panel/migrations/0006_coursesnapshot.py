@@ -0,0 +1,24 @@
+# Generated by Django 3.2.25 on 2026-10-17 20:30
+
+from django.db import migrations, models
+import djongo.models.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_panel', '0005_materialupload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseSnapshot',
+            fields=[
+                ('_id', djongo.models.fields.ObjectIdField(auto_created=True, primary_key=True, serialize=False)),
+                ('course_code', models.CharField(max_length=50, unique=True)),
+                ('data', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
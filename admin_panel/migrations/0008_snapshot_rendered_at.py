@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-17 20:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_panel', '0007_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coursesnapshot',
+            name='rendered_at',
+            field=models.DateTimeField(null=True),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from djongo import models
 from bson import ObjectId
+from django.utils import timezone
 import datetime
 
 class CourseBasicInfo(models.Model):
@@ -74,9 +75,71 @@ class Course(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # GetCoursesView pages through one status newest first, see admin_panel/pagination.py
+        indexes = [models.Index(fields=['status', '-created_at', '-_id'], name='course_status_created_idx')]
+
     def __str__(self):
         return f"Course {self.course_code} ({self.status})"
 
+class CourseSnapshot(models.Model):
+    # the whole course as CourseDetailSerializer renders it, rewritten by every course write, see admin_panel/snapshots.py
+    _id = models.ObjectIdField(primary_key=True)
+    course_code = models.CharField(max_length=50, unique=True)
+    data = models.TextField()  # JSON of the serialized course
+    rendered_at = models.DateTimeField(null=True)  # when the source rows were read, a write never replaces a later render
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Snapshot of course {self.course_code}"
+
+class MaterialUpload(models.Model):
+    # last successful upload of a material file to an AI server, so unchanged files are not sent again
+    _id = models.ObjectIdField(primary_key=True)
+    ai_server = models.CharField(max_length=255)
+    course_code = models.CharField(max_length=50, db_index=True)
+    file_name = models.CharField(max_length=255)
+    content_hash = models.CharField(max_length=64)  # sha256 of the file
+    file_size = models.BigIntegerField()
+    file_mtime = models.FloatField()  # size and mtime tell whether content_hash is still current
+    uploaded_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.course_code}: {self.file_name} -> {self.ai_server}"
+
+class BackgroundJob(models.Model):
+    # unit of work run by `python manage.py run_jobs` outside the web process, see admin_panel/jobs.py
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+    _id = models.ObjectIdField(primary_key=True)
+    kind = models.CharField(max_length=50)
+    course_code = models.CharField(max_length=50, db_index=True)
+    payload = models.TextField(default='{}')  # JSON arguments of the job
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued', db_index=True)
+    stage = models.CharField(max_length=50, blank=True, default='')
+    progress = models.TextField(default='{}')  # JSON counters reported by the running job
+    timings = models.TextField(default='{}')  # JSON seconds spent per stage
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    error = models.TextField(blank=True, default='')
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.kind} job for {self.course_code} ({self.status})"
+
 class Contact(models.Model):
     _id = models.ObjectIdField(primary_key=True)
     name = models.CharField(max_length=255)
@@ -101,6 +164,9 @@ class Blog(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft')
 
+    class Meta:
+        indexes = [models.Index(fields=['-created_at', '-id'], name='blog_created_idx')]
+
     def __str__(self):
         return f"{self.title} - {self.status}"
 
@@ -113,6 +179,7 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [models.Index(fields=['-created_at', '-id'], name='notification_created_idx')]
 
 
 
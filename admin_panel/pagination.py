@@ -0,0 +1,133 @@
+"""
+Keyset pagination and field projection for the list endpoints.
+
+A page is the first `limit` rows after the cursor in a fixed order whose last field is unique
+(`-created_at`, `-_id` for most collections). The cursor holds the sort values of the last row
+returned, so the next page is one indexed range query however deep the client pages, unlike
+an offset. Cursors are opaque to clients: base64 of a small JSON document.
+
+`fields=a,b` limits every item of the response to those keys; the views also use it to load
+only the columns they need.
+"""
+import base64
+import json
+import os
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+# items per page when the client gives no `limit`, and the largest `limit` accepted
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", 50))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", 200))
+
+
+class PageError(ValueError):
+    # invalid limit, cursor or fields parameter, reported to the client as a 400
+    pass
+
+
+def page_size(params):
+    limit = params.get('limit')
+    if limit in (None, ''):
+        return PAGE_SIZE
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise PageError("limit must be a number.")
+    if limit < 1:
+        raise PageError("limit must be at least 1.")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def requested_fields(params, allowed):
+    # the `fields` parameter as a list, None when every field is wanted
+    fields = params.get('fields')
+    if not fields:
+        return None
+    fields = [name.strip() for name in fields.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in allowed]
+    if unknown:
+        raise PageError(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(allowed)}.")
+    return fields
+
+
+def project(items, fields):
+    if fields is None:
+        return items
+    return [{name: item[name] for name in fields if name in item} for item in items]
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    return value
+
+
+def _decode_value(field, value):
+    if field.get_internal_type() == 'DateTimeField':
+        parsed = parse_datetime(value) if isinstance(value, str) else None
+        if parsed is None:
+            raise PageError("Invalid cursor.")
+        return parsed
+    if isinstance(value, str):  # an ObjectId
+        try:
+            return ObjectId(value)
+        except InvalidId:
+            raise PageError("Invalid cursor.")
+    if not isinstance(value, int):
+        raise PageError("Invalid cursor.")
+    return value
+
+
+def encode_cursor(key, position):
+    data = json.dumps({"k": [_encode_value(value) for value in key], "n": position}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, model, ordering):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        key, position = data["k"], int(data["n"])
+    except (ValueError, TypeError, KeyError):
+        raise PageError("Invalid cursor.")
+    if not isinstance(key, list) or len(key) != len(ordering):
+        raise PageError("Invalid cursor.")
+    fields = [model._meta.get_field(name.lstrip('-')) for name in ordering]
+    return [_decode_value(field, value) for field, value in zip(fields, key)], position
+
+
+def _after(ordering, key):
+    # rows that come after `key` in `ordering`: (a < ka) or (a = ka and b < kb) ... for descending fields
+    condition = Q()
+    for i, name in enumerate(ordering):
+        field = name.lstrip('-')
+        step = Q(**{f"{field}__{'lt' if name.startswith('-') else 'gt'}": key[i]})
+        for previous, value in zip(ordering[:i], key[:i]):
+            step &= Q(**{previous.lstrip('-'): value})
+        condition |= step
+    return condition
+
+
+def keyset_page(queryset, params, ordering):
+    """
+    One page of `queryset` in `ordering` (Django order_by names, the last one unique).
+    Returns (rows, number of rows before this page, cursor of the next page or None).
+    """
+    size = page_size(params)
+    position = 0
+    cursor = params.get('cursor')
+    if cursor:
+        key, position = decode_cursor(cursor, queryset.model, ordering)
+        queryset = queryset.filter(_after(ordering, key))
+    rows = list(queryset.order_by(*ordering)[:size + 1])  # one more tells whether a next page exists
+    next_cursor = None
+    if len(rows) > size:
+        rows = rows[:size]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, name.lstrip('-')) for name in ordering], position + size)
+    return rows, position, next_cursor
@@ -0,0 +1,217 @@
+"""
+Steps of sending a course to the AI server, in the order ProcessCourseAPIView runs them.
+
+Each step takes the course code and an AIClient. It raises StepError when the course data it
+needs is missing, and lets requests.RequestException through when the AI server call fails.
+
+ProcessCourseAPIView queues a `process_course` job; the job records every completed step in
+its progress, so a retry after a failed AI server call resumes at the step that failed.
+"""
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from django.utils import timezone
+
+from vectorization.manifest import file_sha256
+from .ai_client import AI_UPLOAD_CONCURRENCY, AIClient
+from .jobs import PermanentJobError, material_file_path, register
+from .models import CourseBasicInfo, CourseOutcome, CourseSyllabus, CourseQuestion, CourseMaterial, MaterialUpload
+
+logger = logging.getLogger(__name__)
+
+
+class StepError(Exception):
+    pass
+
+
+def send_basic_info(course_code, client):
+    try:
+        basic_info = CourseBasicInfo.objects.get(course_code=course_code)
+    except CourseBasicInfo.DoesNotExist:
+        raise StepError("Basic info not found")
+    client.post_json("/api/basic_info", {
+        "course_name": basic_info.course_name,
+        "course_code": basic_info.course_code,
+        "year": basic_info.year,
+        "branch": basic_info.branch,
+        "semester": basic_info.semester,
+        "group": basic_info.group
+    })
+
+
+def send_outcomes(course_code, client):
+    outcomes = CourseOutcome.objects.filter(course_code=course_code)
+    if not outcomes:
+        raise StepError("No outcomes found")
+    client.post_many("/api/course_outcome", course_code, [{
+        "course_code": outcome.course_code,
+        "shortform_course_code": outcome.short_form,
+        "course_outcome": outcome.outcome
+    } for outcome in outcomes])
+
+
+def send_syllabus(course_code, client):
+    syllabus_items = CourseSyllabus.objects.filter(course_code=course_code)
+    if not syllabus_items:
+        raise StepError("No syllabus items found")
+    client.post_many("/api/syllabus", course_code, [{
+        "course_code": item.course_code,
+        "syllabus": item.syllabus_item
+    } for item in syllabus_items])
+
+
+def send_questions(course_code, client):
+    questions = CourseQuestion.objects.filter(course_code=course_code)
+    if not questions:
+        raise StepError("No questions found")
+    client.post_many("/api/questions", course_code, [{
+        "course_code": question.course_code,
+        "questions": question.question
+    } for question in questions])
+
+
+def material_hash(file_path, record):
+    # sha256 of the file, reusing the one of the last upload while size and mtime are unchanged
+    stat = os.stat(file_path)
+    if record is not None and record.file_size == stat.st_size and record.file_mtime == stat.st_mtime:
+        return record.content_hash, stat
+    return file_sha256(file_path), stat
+
+
+def send_materials(course_code, client, on_upload=None):
+    """
+    Uploads only the files the AI server does not have yet. The server's hash check decides;
+    a server without one gets every file whose hash differs from our record of the last upload.
+    on_upload(file_name) is called after each recorded upload; when it raises, the uploads
+    that have not started yet are cancelled.
+    """
+    materials = CourseMaterial.objects.filter(course_code=course_code)
+    if not materials:
+        raise StepError("No materials found")
+    files = [(material, material_file_path(material.file_path)) for material in materials]
+    for _, file_path in files:
+        # every file is checked before the first upload starts
+        if not os.path.exists(file_path):
+            raise StepError(f"File not found - {file_path}")
+
+    records = {
+        record.file_name: record
+        for record in MaterialUpload.objects.filter(ai_server=client.base_url, course_code=course_code)
+    }
+    entries = []
+    for material, file_path in files:
+        file_name = os.path.basename(file_path)
+        content_hash, stat = material_hash(file_path, records.get(file_name))
+        entries.append((material, file_path, file_name, content_hash, stat))
+
+    missing = client.missing_files(course_code, [
+        {"file_name": file_name, "sha256": content_hash} for _, _, file_name, content_hash, _ in entries
+    ])
+    if missing is None:
+        pending = [entry for entry in entries
+                   if entry[2] not in records or records[entry[2]].content_hash != entry[3]]
+    else:
+        pending = [entry for entry in entries if entry[3] in missing]
+    logger.info(f"Uploading {len(pending)} of {len(entries)} materials for course {course_code}, "
+                f"the others are unchanged on the AI server")
+
+    def upload(material, file_path, file_name, content_hash, stat):
+        client.upload_file("/api/course_materials", file_path, file_name, {
+            'course_code': material.course_code,
+            'file_type': material.file_type,
+            'sha256': content_hash,
+        })
+
+    with ThreadPoolExecutor(max_workers=AI_UPLOAD_CONCURRENCY) as executor:
+        futures = {executor.submit(upload, *entry): entry for entry in pending}
+        error = None
+        try:
+            for future in as_completed(futures):
+                if future.exception() is not None:
+                    error = error or future.exception()
+                    continue
+                # recorded as each upload finishes, so a retry skips the files that made it
+                _, _, file_name, content_hash, stat = futures[future]
+                MaterialUpload.objects.update_or_create(
+                    ai_server=client.base_url, course_code=course_code, file_name=file_name,
+                    defaults={
+                        'content_hash': content_hash,
+                        'file_size': stat.st_size,
+                        'file_mtime': stat.st_mtime,
+                        'uploaded_at': timezone.now(),
+                    },
+                )
+                if on_upload is not None:
+                    on_upload(file_name)
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+    if error is not None:
+        raise error
+
+
+def trigger_processing(course_code, client):
+    client.post_json("/api/process_file", {"course_code": course_code})
+
+
+STEPS = [
+    ("basic_info", send_basic_info),
+    ("course_outcome", send_outcomes),
+    ("syllabus", send_syllabus),
+    ("questions", send_questions),
+    ("materials", send_materials),
+    ("trigger", trigger_processing),
+]
+
+
+def run_step(name, step, course_code, client, **options):
+    """
+    Runs one step, passing it `options`. Returns (result, milliseconds, failed): result is
+    "success" or the "error: ..." text reported for the step, failed is None on success,
+    "data" for missing course data and "server" for a failed AI server call.
+    """
+    started = time.perf_counter()
+    try:
+        step(course_code, client, **options)
+        result, failed = "success", None
+        logger.info(f"Step {name} done for course: {course_code}")
+    except StepError as e:
+        result, failed = f"error: {str(e)}", "data"
+        logger.error(f"Step {name} failed for course {course_code}: {str(e)}")
+    except requests.RequestException as e:
+        result, failed = f"error: {str(e)}", "server"
+        logger.error(f"Failed to send {name} for course {course_code}: {str(e)}")
+    return result, round((time.perf_counter() - started) * 1000, 1), failed
+
+
+@register('process_course')
+def process_course_job(context):
+    course_code = context.job.course_code
+    client = AIClient()
+    completed = context.progress.setdefault("completed_steps", [])
+    results = context.progress.setdefault("results", {name: "pending" for name, _ in STEPS})
+
+    def uploaded(file_name):
+        # checkpoint after every file; a lost job stops here instead of uploading the rest
+        context.progress["uploaded_materials"] = context.progress.get("uploaded_materials", 0) + 1
+        context.report()
+
+    for name, step in STEPS:
+        if name in completed:
+            continue  # done by an earlier attempt
+        context.save(stage=name)
+        options = {"on_upload": uploaded} if step is send_materials else {}
+        results[name], milliseconds, failed = run_step(name, step, course_code, client, **options)
+        context.add_time(name, milliseconds / 1000)
+        if failed == "data":
+            context.report()
+            raise PermanentJobError(f"{name}: {results[name]}")
+        if failed == "server":
+            context.report()
+            raise RuntimeError(f"{name}: {results[name]}")  # retried from this step
+        completed.append(name)
+        context.report()  # checkpoint
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from django.db import models
 from .models import CourseBasicInfo, CourseOutcome, CourseSyllabus, CourseQuestion, CourseMaterial, Course, Contact, Blog, Notification
 import os
 from django.core.files.storage import FileSystemStorage
@@ -6,6 +7,20 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+def course_exists(serializer, course_code):
+    # views validating many rows of one course check the course once and pass course_checked
+    if serializer.context.get('course_checked'):
+        return True
+    return CourseBasicInfo.objects.filter(course_code=course_code).exists()
+
+class DynamicFieldsMixin:
+    # `fields=[...]` serializes only those fields, used by the list endpoints for the `fields` parameter
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
 class AdminLoginSerializer(serializers.Serializer):
     username = serializers.CharField()
     password = serializers.CharField(write_only=True)
@@ -32,7 +47,7 @@ class CourseOutcomeSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError({"short_form": "This field is required and cannot be empty."})
         if not data.get('outcome') or not data['outcome'].strip():
             raise serializers.ValidationError({"outcome": "This field is required and cannot be empty."})
-        if not CourseBasicInfo.objects.filter(course_code=data['course_code']).exists():
+        if not course_exists(self, data['course_code']):
             raise serializers.ValidationError({"course_code": "Course code does not exist."})
         return data
 
@@ -42,7 +57,7 @@ class CourseSyllabusSerializer(serializers.ModelSerializer):
         fields = ['course_code', 'syllabus_item']
 
     def validate_course_code(self, value):
-        if not CourseBasicInfo.objects.filter(course_code=value).exists():
+        if not course_exists(self, value):
             raise serializers.ValidationError("Course code does not exist.")
         return value
 
@@ -52,7 +67,7 @@ class CourseQuestionSerializer(serializers.ModelSerializer):
         fields = ['course_code', 'question']
 
     def validate_course_code(self, value):
-        if not CourseBasicInfo.objects.filter(course_code=value).exists():
+        if not course_exists(self, value):
             raise serializers.ValidationError("Course code does not exist.")
         return value
 
@@ -76,7 +91,7 @@ class CourseMaterialSerializer(serializers.ModelSerializer):
         return value
 
     def validate_course_code(self, value):
-        if not CourseBasicInfo.objects.filter(course_code=value).exists():
+        if not course_exists(self, value):
             raise serializers.ValidationError("Course code does not exist.")
         return value
 
@@ -92,6 +107,32 @@ class CourseMaterialSerializer(serializers.ModelSerializer):
             file_type=file_type
         )
 
+def load_course_relations(course_codes):
+    """
+    Basic info, outcomes, syllabus, questions and materials of the given courses, fetched with
+    one `course_code__in` query per collection and grouped by course code in memory.
+    """
+    course_codes = list(course_codes)
+    related = {code: {'basic_info': None, 'outcomes': [], 'syllabus': [], 'questions': [], 'materials': []}
+               for code in course_codes}
+    if not course_codes:
+        return related
+    for basic_info in CourseBasicInfo.objects.filter(course_code__in=course_codes):
+        related[basic_info.course_code]['basic_info'] = basic_info
+    for key, model in (('outcomes', CourseOutcome), ('syllabus', CourseSyllabus),
+                       ('questions', CourseQuestion), ('materials', CourseMaterial)):
+        for row in model.objects.filter(course_code__in=course_codes):
+            related[row.course_code][key].append(row)
+    return related
+
+class CourseDetailListSerializer(serializers.ListSerializer):
+    # loads the related rows of all listed courses at once instead of five queries per course
+
+    def to_representation(self, data):
+        courses = list(data.all() if isinstance(data, models.Manager) else data)
+        self.child.related = load_course_relations(course.course_code for course in courses)
+        return super().to_representation(courses)
+
 class CourseDetailSerializer(serializers.ModelSerializer):
     basic_info = serializers.SerializerMethodField()
     outcomes = serializers.SerializerMethodField()
@@ -102,29 +143,29 @@ class CourseDetailSerializer(serializers.ModelSerializer):
     class Meta:
         model = Course
         fields = ['course_code', 'status', 'basic_info', 'outcomes', 'syllabus', 'questions', 'materials', 'created_at', 'updated_at']
+        list_serializer_class = CourseDetailListSerializer
+
+    def related_rows(self, obj):
+        related = getattr(self, 'related', None)
+        if related is None or obj.course_code not in related:
+            related = self.related = load_course_relations([obj.course_code])
+        return related[obj.course_code]
 
     def get_basic_info(self, obj):
-        try:
-            basic_info = CourseBasicInfo.objects.get(course_code=obj.course_code)
-            return CourseBasicInfoSerializer(basic_info).data
-        except CourseBasicInfo.DoesNotExist:
-            return None
+        basic_info = self.related_rows(obj)['basic_info']
+        return CourseBasicInfoSerializer(basic_info).data if basic_info is not None else None
 
     def get_outcomes(self, obj):
-        outcomes = CourseOutcome.objects.filter(course_code=obj.course_code)
-        return CourseOutcomeSerializer(outcomes, many=True).data
+        return CourseOutcomeSerializer(self.related_rows(obj)['outcomes'], many=True).data
 
     def get_syllabus(self, obj):
-        syllabus = CourseSyllabus.objects.filter(course_code=obj.course_code)
-        return CourseSyllabusSerializer(syllabus, many=True).data
+        return CourseSyllabusSerializer(self.related_rows(obj)['syllabus'], many=True).data
 
     def get_questions(self, obj):
-        questions = CourseQuestion.objects.filter(course_code=obj.course_code)
-        return CourseQuestionSerializer(questions, many=True).data
+        return CourseQuestionSerializer(self.related_rows(obj)['questions'], many=True).data
 
     def get_materials(self, obj):
-        materials = CourseMaterial.objects.filter(course_code=obj.course_code)
-        return [{'file_path': m.file_path, 'file_type': m.file_type} for m in materials]
+        return [{'file_path': m.file_path, 'file_type': m.file_type} for m in self.related_rows(obj)['materials']]
 
 class CourseFinalSerializer(serializers.ModelSerializer):
     materials = CourseMaterialSerializer(many=True)
@@ -168,7 +209,7 @@ class ContactSerializer(serializers.ModelSerializer):
         model = Contact
         fields = '__all__'
 
-class BlogSerializer(serializers.ModelSerializer):
+class BlogSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     id = serializers.IntegerField(read_only=True)
     status = serializers.ChoiceField(choices=Blog.STATUS_CHOICES, default='draft')
 
@@ -185,7 +226,7 @@ class BlogSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError({"category": "This field is required."})
         return data
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Notification
         fields = ['id', 'title', 'message', 'created_at']
@@ -0,0 +1,85 @@
+"""
+Materialized course documents.
+
+A CourseSnapshot holds a course exactly as CourseDetailSerializer renders it: basic info,
+outcomes, syllabus, questions and material metadata merged into one JSON document. The course
+write views refresh the snapshot after every change, so CourseDetailView and GetCoursesView
+read one document per course instead of joining six collections. A course without a snapshot
+(created before snapshots existed, or whose refresh failed) gets one on its first read, and
+`python manage.py rebuild_snapshots` regenerates all of them from the source collections.
+
+Two writes of one course can refresh its snapshot concurrently and finish in either order.
+Each snapshot records when its source rows were read (`rendered_at`) and is only replaced by a
+render that started later, so a slow refresh cannot put back rows a later write changed.
+"""
+import json
+import logging
+
+from django.db import IntegrityError
+from django.db.models import Q
+from django.utils import timezone
+
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import Course, CourseSnapshot
+from .serializers import CourseDetailSerializer
+
+logger = logging.getLogger(__name__)
+
+
+def refresh_snapshots(courses):
+    """
+    Rebuilds the snapshots of the given Course instances, loading their related rows with
+    one query per collection. Returns the snapshot data by course code.
+    """
+    rendered_at = timezone.now()
+    courses = list(courses)
+    data = {course['course_code']: course for course in CourseDetailSerializer(courses, many=True).data}
+    for course in courses:
+        save_snapshot(course.course_code, json.dumps(data[course.course_code], cls=JSONEncoder), rendered_at)
+    return data
+
+
+def save_snapshot(course_code, data, rendered_at):
+    # conditional write: a snapshot rendered at or after `rendered_at` is newer and stays
+    fields = {'data': data, 'rendered_at': rendered_at, 'updated_at': timezone.now()}
+    older = Q(rendered_at__lt=rendered_at) | Q(rendered_at__isnull=True)
+    if CourseSnapshot.objects.filter(older, course_code=course_code).update(**fields):
+        return True
+    if CourseSnapshot.objects.filter(course_code=course_code).exists():
+        logger.info(f"Snapshot of course {course_code} was already refreshed by a later write")
+        return False
+    try:
+        CourseSnapshot.objects.create(course_code=course_code, data=data, rendered_at=rendered_at)
+    except IntegrityError:
+        # created concurrently, keep whichever render is the later one
+        return bool(CourseSnapshot.objects.filter(older, course_code=course_code).update(**fields))
+    return True
+
+
+def refresh_snapshot(course_code):
+    # after a write to any collection of the course; a course that is not finalized yet has no snapshot
+    course = Course.objects.filter(course_code=course_code).first()
+    if course is None:
+        delete_snapshot(course_code)
+        return None
+    return refresh_snapshots([course])[course_code]
+
+
+def delete_snapshot(course_code):
+    CourseSnapshot.objects.filter(course_code=course_code).delete()
+
+
+def read_snapshots(course_codes):
+    """
+    The course documents of the given course codes, in that order, building the snapshots
+    that are missing.
+    """
+    course_codes = list(course_codes)
+    data = {snapshot.course_code: json.loads(snapshot.data)
+            for snapshot in CourseSnapshot.objects.filter(course_code__in=course_codes)}
+    missing = [code for code in course_codes if code not in data]
+    if missing:
+        logger.warning(f"Building missing snapshots for {len(missing)} courses")
+        data.update(refresh_snapshots(Course.objects.filter(course_code__in=missing)))
+    return [data[code] for code in course_codes if code in data]
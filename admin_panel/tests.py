@@ -1,3 +1,493 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import jobs
+from .models import CourseBasicInfo, CourseOutcome, CourseSyllabus, CourseQuestion, CourseMaterial, Course, CourseSnapshot, Blog, BackgroundJob, MaterialUpload
+from .serializers import CourseDetailSerializer
+from .snapshots import refresh_snapshot, save_snapshot
+from vectorization.chunks import stream_chunks
+from vectorization.create import collection_cache, drop_collection
+from vectorization.embed import EmbeddingPool
+from vectorization.ingest import detect_encoding, iter_txt_blocks
+from vectorization.maintenance import CatalogError, orphan_segment_directories
+from vectorization.manifest import Manifest, chunk_id, chunk_sha256
+from vectorization.search import search
+from vectorization.stores import FlatCollection
+
+
+class CourseReadTestCase(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+
+    def create_course(self, course_code, status='published'):
+        CourseBasicInfo.objects.create(course_name=f"Course {course_code}", course_code=course_code,
+                                       year=2024, branch="CSE", semester=5, group="A")
+        for i in range(3):
+            CourseOutcome.objects.create(course_code=course_code, short_form=f"CO{i}", outcome=f"Outcome {i}")
+            CourseSyllabus.objects.create(course_code=course_code, syllabus_item=f"Unit {i}")
+            CourseQuestion.objects.create(course_code=course_code, question=f"Question {i}?")
+        CourseMaterial.objects.create(course_code=course_code, file_path=f"/media/{course_code}.pdf", file_type="notes")
+        Course.objects.create(course_code=course_code, status=status)
+
+
+class CourseDetailSerializerQueryCountTest(CourseReadTestCase):
+
+    def test_query_count_does_not_grow_with_courses(self):
+        # one query for the courses, one per related collection
+        for count in (1, 10):
+            for i in range(Course.objects.count(), count):
+                self.create_course(f"CS{i:03d}")
+            with self.assertNumQueries(6):
+                data = CourseDetailSerializer(Course.objects.all(), many=True).data
+            self.assertEqual(len(data), count)
+
+    def test_related_rows_are_grouped_by_course(self):
+        self.create_course("CS100")
+        self.create_course("CS200")
+        CourseQuestion.objects.create(course_code="CS200", question="Only in CS200?")
+        courses = {course['course_code']: course
+                   for course in CourseDetailSerializer(Course.objects.all(), many=True).data}
+        self.assertEqual(courses["CS100"]['basic_info']['course_name'], "Course CS100")
+        self.assertEqual(len(courses["CS100"]['questions']), 3)
+        self.assertEqual(len(courses["CS200"]['questions']), 4)
+        self.assertEqual(courses["CS200"]['materials'], [{'file_path': '/media/CS200.pdf', 'file_type': 'notes'}])
+
+
+class CourseSnapshotTest(CourseReadTestCase):
+
+    def test_list_reads_one_snapshot_per_course(self):
+        for count in (1, 10):
+            for i in range(Course.objects.count(), count):
+                self.create_course(f"CS{i:03d}")
+            call_command('rebuild_snapshots', stdout=StringIO())
+            # the course codes, then the snapshots
+            with self.assertNumQueries(2):
+                response = self.client.get('/api/admin/get-courses/', {'status': 'published'})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), count)
+
+    def test_detail_builds_missing_snapshot(self):
+        self.create_course("CS300")
+        response = self.client.get('/api/admin/courses/CS300/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([o['short_form'] for o in response.data['outcomes']], ["CO0", "CO1", "CO2"])
+        self.assertTrue(CourseSnapshot.objects.filter(course_code="CS300").exists())
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/admin/courses/CS300/').data, response.data)
+
+    def test_writes_refresh_the_snapshot(self):
+        self.create_course("CS400", status='draft')
+        self.client.get('/api/admin/courses/CS400/')
+        response = self.client.patch('/api/admin/course-questions/CS400/', {'questions': ["New question?"]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        questions = self.client.get('/api/admin/courses/CS400/').data['questions']
+        self.assertEqual([q['question'] for q in questions], ["New question?"])
+
+        self.client.post('/api/admin/toggle-course/CS400/')
+        self.assertEqual(self.client.get('/api/admin/courses/CS400/').data['status'], 'published')
+
+        with mock.patch('admin_panel.views.drop_collection'):
+            self.client.delete('/api/admin/course-delete/', QUERY_STRING='course_code=CS400')
+        self.assertFalse(CourseSnapshot.objects.filter(course_code="CS400").exists())
+        self.assertEqual(self.client.get('/api/admin/courses/CS400/').status_code, 404)
+
+    def test_failed_refresh_removes_the_snapshot(self):
+        self.create_course("CS410", status='draft')
+        self.client.get('/api/admin/courses/CS410/')
+        with mock.patch('admin_panel.views.refresh_snapshot', side_effect=RuntimeError("down")):
+            response = self.client.patch('/api/admin/course-questions/CS410/', {'questions': ["New question?"]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(CourseSnapshot.objects.filter(course_code="CS410").exists())
+        questions = self.client.get('/api/admin/courses/CS410/').data['questions']
+        self.assertEqual([q['question'] for q in questions], ["New question?"])
+
+    def test_older_render_does_not_replace_a_newer_one(self):
+        self.create_course("CS420")
+        started = timezone.now()
+        refresh_snapshot("CS420")
+        self.assertFalse(save_snapshot("CS420", json.dumps({'course_code': "CS420"}), started))
+        self.assertEqual(len(self.client.get('/api/admin/courses/CS420/').data['questions']), 3)
+        self.assertTrue(save_snapshot("CS420", json.dumps({'course_code': "CS420"}), timezone.now()))
+
+
+class KeysetPaginationTest(CourseReadTestCase):
+
+    def pages(self, url, params):
+        items, cursor = [], None
+        while True:
+            response = self.client.get(url, {**params, **({'cursor': cursor} if cursor else {})})
+            self.assertEqual(response.status_code, 200)
+            items += response.data['results']
+            cursor = response.data['next_cursor']
+            if cursor is None:
+                return items
+
+    def test_pages_cover_every_blog_once(self):
+        blogs = [Blog.objects.create(title=f"Blog {i}", author="a", category="c", html_code="<p></p>") for i in range(7)]
+        # rows with the same created_at are split by id
+        Blog.objects.filter(id__in=[blog.id for blog in blogs[2:5]]).update(created_at=blogs[2].created_at)
+        items = self.pages('/api/admin/blogs/', {'limit': 2})
+        self.assertEqual(sorted(item['id'] for item in items), sorted(blog.id for blog in blogs))
+        created = [(item['created_at'], item['id']) for item in items]
+        self.assertEqual(created, sorted(created, reverse=True))
+
+    def test_courses_are_paged_with_fields(self):
+        for i in range(5):
+            self.create_course(f"CS{i:03d}")
+        Course.objects.create(course_code="DRAFT", status='draft')
+        items = self.pages('/api/admin/get-courses/', {'status': 'published', 'limit': 2, 'fields': 'course_code,status'})
+        self.assertEqual(sorted(item['course_code'] for item in items), [f"CS{i:03d}" for i in range(5)])
+        self.assertEqual(set(items[0]), {'course_code', 'status'})
+
+    def test_invalid_parameters(self):
+        for params in ({'cursor': 'not-a-cursor'}, {'limit': '0'}, {'fields': 'title,password'}):
+            response = self.client.get('/api/admin/blogs/', params)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('error', response.data)
+
+
+class CourseDeleteTest(CourseReadTestCase):
+
+    def test_only_an_existing_course_drops_its_collection(self):
+        with mock.patch('admin_panel.views.drop_collection') as drop:
+            self.client.delete('/api/admin/course-delete/', QUERY_STRING='course_code=../../admin_panel')
+            drop.assert_not_called()
+            self.create_course("CS500")
+            self.client.delete('/api/admin/course-delete/', QUERY_STRING='course_code=CS500')
+            drop.assert_called_once_with("CS500")
+
+    def test_collection_names_cannot_leave_the_vector_store(self):
+        for name in ('../../precious', '..', 'a/b', '.hidden', ''):
+            with self.assertRaises(ValueError):
+                drop_collection(name, path='db-does-not-exist/')
+
+
+class VectorStoreHandleTest(SimpleTestCase):
+
+    def test_handles_follow_a_promoted_collection(self):
+        path = tempfile.mkdtemp(prefix='klaw_test_db_') + '/'
+        self.addCleanup(shutil.rmtree, path, ignore_errors=True)
+        embeddings = [[1.0, float(i), 0.5] for i in range(5)]
+        promoting, other = FlatCollection('CS600', path, max_rows=3), FlatCollection('CS600', path, max_rows=3)
+        cached = collection_cache.get(path, 'CS600')
+        promoting.upsert(ids=['a', 'b', 'c', 'd'], embeddings=embeddings[:4], documents=list('abcd'))
+        # the other handle still points at the removed flat files
+        other.upsert(ids=['e'], embeddings=embeddings[4:], documents=['e'])
+        self.assertEqual(other.count(), 5)
+        self.assertEqual(len(other.query(query_embeddings=embeddings[:1], n_results=2)['ids'][0]), 2)
+        self.assertIsNot(collection_cache.get(path, 'CS600'), cached)
+
+
+class FailingCommit:
+    # a sqlite connection whose COMMIT fails, as on a full disk or an I/O error
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, *args):
+        if sql == "COMMIT":
+            raise sqlite3.OperationalError("disk I/O error")
+        return self.conn.execute(sql, *args)
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+
+class FlatCollectionCompactTest(SimpleTestCase):
+
+    def test_failed_commit_keeps_rows_and_vectors_together(self):
+        path = tempfile.mkdtemp(prefix='klaw_test_db_') + '/'
+        self.addCleanup(shutil.rmtree, path, ignore_errors=True)
+        embeddings = [[1.0 if j == i else 0.0 for j in range(6)] for i in range(6)]
+        collection = FlatCollection('CS900', path)
+        collection.upsert(ids=list('abcdef'), embeddings=embeddings, documents=list('abcdef'))
+        collection.delete(ids=['a', 'c'])
+
+        def nearest():
+            return [collection.query(query_embeddings=[embedding], n_results=1)['ids'][0][0]
+                    for embedding in embeddings[1::2]]
+
+        connect = collection._connect
+        with mock.patch.object(collection, '_connect', lambda: FailingCommit(connect())):
+            with self.assertRaises(sqlite3.OperationalError):
+                collection.compact()
+        self.assertEqual(nearest(), ['b', 'd', 'f'])
+        self.assertEqual(collection.get(ids=['e'], include=['embeddings'])['embeddings'], [embeddings[4]])
+
+        self.assertEqual(collection.compact(), 2)
+        self.assertEqual(nearest(), ['b', 'd', 'f'])
+        self.assertEqual([name for name in os.listdir(collection.directory) if name.startswith('vectors')],
+                         ['vectors.1.f32'])
+
+
+class StreamChunksTest(SimpleTestCase):
+    text = " ".join(f"Sentence number {i} has a few words." + ("\n\n" if i % 4 == 3 else "") for i in range(40))
+
+    def test_chunks_end_on_sentence_boundaries(self):
+        chunks = list(stream_chunks([self.text], chunk_size=120, overlap=0))
+        self.assertTrue(all(len(chunk) <= 120 and chunk.endswith('.') for chunk in chunks))
+        self.assertEqual(" ".join(chunks).split(), self.text.split())
+
+    def test_consecutive_chunks_overlap(self):
+        chunks = list(stream_chunks([self.text], chunk_size=120, overlap=40))
+        for previous, chunk in zip(chunks, chunks[1:]):
+            start = chunk.split()[0]
+            self.assertIn(" ".join(chunk.split()[:3]), previous)
+            self.assertLessEqual(len(previous) - previous.rindex(start), 40)
+
+    def test_tokens(self):
+        text = " ".join(f"w{i}" for i in range(50))
+        chunks = [chunk.split() for chunk in stream_chunks([text], chunk_size=8, overlap=3, unit="tokens")]
+        self.assertTrue(all(len(chunk) <= 8 for chunk in chunks))
+        for previous, chunk in zip(chunks, chunks[1:]):
+            self.assertEqual(chunk[:3], previous[-3:])
+        self.assertEqual(chunks[-1][-1], "w49")
+
+    def test_pieces_give_the_same_chunks(self):
+        expected = list(stream_chunks([self.text], chunk_size=90, overlap=30))
+        pieces = [self.text[i:i + 7] for i in range(0, len(self.text), 7)]
+        self.assertEqual(list(stream_chunks(pieces, chunk_size=90, overlap=30)), expected)
+
+    def test_large_overlap_does_not_repeat_chunks(self):
+        for chunk_size, overlap, unit in ((97, 92, "chars"), (31, 28, "chars"), (32, 30, "chars"), (12, 11, "tokens")):
+            chunks = list(stream_chunks([self.text], chunk_size=chunk_size, overlap=overlap, unit=unit))
+            self.assertFalse([chunk for previous, chunk in zip(chunks, chunks[1:]) if chunk == previous])
+            self.assertEqual(chunks[-1], self.text[-len(chunks[-1]) - 2:].strip())
+
+    def test_invalid_arguments(self):
+        for kwargs in ({'unit': 'lines'}, {'chunk_size': 0}, {'chunk_size': 10, 'overlap': 10}, {'overlap': -1}):
+            with self.assertRaises(ValueError):
+                list(stream_chunks([self.text], **kwargs))
+
+
+class ManifestTest(SimpleTestCase):
+
+    def setUp(self):
+        path = tempfile.mkdtemp(prefix='klaw_test_db_') + '/'
+        self.addCleanup(shutil.rmtree, path, ignore_errors=True)
+        self.manifest = Manifest(path)
+
+    def test_record_and_forget(self):
+        manifest = self.manifest
+        self.assertIsNone(manifest.file_hash("CS970", "a.pdf"))
+        empty = manifest.version("CS970")
+        manifest.record("CS970", "a.pdf", "hash-a", ["a1", "a2"])
+        manifest.record("CS970", "notes/b.txt", "hash-b", ["b1"])
+        self.assertNotEqual(manifest.version("CS970"), empty)
+        manifest.record("CS970", "a.pdf", "hash-a2", ["a3"])  # the file changed
+        self.assertEqual(manifest.file_hash("CS970", "a.pdf"), "hash-a2")
+        self.assertEqual(manifest.chunk_ids("CS970", "a.pdf"), {"a3"})
+        self.assertEqual(sorted((s['source'], s['chunk_count']) for s in manifest.sources("CS970")),
+                         [("a.pdf", 1), ("notes/b.txt", 1)])
+
+        manifest.forget("CS970", "a.pdf")
+        self.assertEqual([s['source'] for s in manifest.sources("CS970")], ["notes/b.txt"])
+        manifest.forget("CS970")
+        self.assertEqual(manifest.sources("CS970"), [])
+        self.assertEqual(manifest.chunk_ids("CS970", "notes/b.txt"), set())
+
+    def test_recent_collections(self):
+        for name in ("CS971", "CS972", "CS973"):
+            self.manifest.record(name, "a.pdf", "hash", ["c"])
+            time.sleep(0.01)
+        self.assertEqual(self.manifest.recent_collections(2), ["CS973", "CS972"])
+
+    def test_chunk_ids(self):
+        chunk_hash = chunk_sha256("some text")
+        self.assertEqual(chunk_id("a.pdf", chunk_hash, 0), chunk_id("a.pdf", chunk_hash, 0))
+        self.assertEqual(len({chunk_id("a.pdf", chunk_hash, 0), chunk_id("a.pdf", chunk_hash, 1),
+                              chunk_id("b.pdf", chunk_hash, 0)}), 3)
+
+
+class TextEncodingTest(SimpleTestCase):
+    text = "Caf\u00e9 na\u00efve \u2013 r\u00e9sum\u00e9 of the course.\r\nSecond line \u00bd.\n" * 20
+
+    def write(self, data):
+        f = tempfile.NamedTemporaryFile(suffix='.txt', delete=False)
+        self.addCleanup(os.remove, f.name)
+        with f:
+            f.write(data)
+        return f.name
+
+    def test_detect_encoding(self):
+        self.assertEqual(detect_encoding(self.text.encode('utf-8-sig')), "utf-8-sig")
+        self.assertEqual(detect_encoding(self.text.encode('utf-16')), "utf-16")
+        # a block may end in the middle of a character
+        self.assertEqual(detect_encoding(self.text.encode('utf-8')[:4]), "utf-8")
+        self.assertEqual(detect_encoding(self.text.encode('cp1252')), "cp1252")
+
+    def test_blocks_decode_like_open(self):
+        expected = self.text.replace("\r\n", "\n")
+        for encoding in ('utf-8', 'utf-8-sig', 'utf-16', 'cp1252'):
+            path = self.write(self.text.encode(encoding))
+            # an odd block size splits multi-byte characters and \r\n pairs between blocks
+            self.assertEqual("".join(iter_txt_blocks(path, block_size=257)), expected, encoding)
+
+
+class VectorSearchTest(SimpleTestCase):
+
+    def test_search_does_not_create_a_collection(self):
+        directory = tempfile.mkdtemp(prefix='klaw_test_')
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(directory)
+        for backend in ('auto', 'flat', 'chroma'):
+            with mock.patch('vectorization.stores.VECTOR_BACKEND', backend):
+                self.assertEqual(search("CS960", f"anything {backend}"), ([], False))
+        self.assertFalse(os.path.exists(os.path.join('db', 'flat', 'CS960')))
+        self.assertFalse(os.path.exists(os.path.join('db', 'chroma.sqlite3')))
+        self.assertIsNone(collection_cache.get('db/', 'CS960', create=False))
+
+
+class VectorStorePruneTest(TestCase):
+
+    def test_missing_catalog_removes_nothing(self):
+        directory = tempfile.mkdtemp(prefix='klaw_test_')
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(directory)
+        segment = os.path.join('db', '0ea1648f-64a7-4de9-a74b-b29a379448cb')
+        os.makedirs(segment)
+        with self.assertRaises(CatalogError):
+            orphan_segment_directories()
+        with self.assertRaises(CommandError):
+            call_command('vectordb', 'prune', stdout=StringIO())
+        self.assertTrue(os.path.isdir(segment))
+
+
+class EmbeddingPoolTest(SimpleTestCase):
+
+    def pool(self):
+        # list() stands in for the model: every text is returned as its own vector
+        pool = EmbeddingPool(workers=1, batch_size=4, max_latency_ms=1, timeout=60, function=list)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_pool_recovers_from_a_dead_worker(self):
+        pool = self.pool()
+        self.assertEqual(pool.embed(["a", "b"]), ["a", "b"])
+        for process in list(pool._executor._processes.values()):
+            process.kill()
+            process.join()
+        self.assertEqual(pool.embed(["c", "d", "e"]), ["c", "d", "e"])
+        self.assertEqual(pool.metrics()['restarts'], 1)
+
+    def test_callers_fail_when_the_dispatcher_stops(self):
+        pool = self.pool()
+        with mock.patch.object(pool, '_submit', side_effect=MemoryError), \
+                mock.patch('threading.excepthook'):
+            with self.assertRaises(RuntimeError):
+                pool.embed(["a"])
+            pool._dispatcher.join()
+        with self.assertRaises(RuntimeError):
+            pool.embed(["b"])
+
+
+class ProcessCourseJobTest(CourseReadTestCase):
+
+    def test_job_taken_over_by_another_worker_stops_without_writing(self):
+        self.create_course("CS700")
+        for i in range(2):
+            CourseMaterial.objects.create(course_code="CS700", file_path=f"/media/CS700_{i}.txt", file_type="notes")
+        directory = tempfile.mkdtemp(prefix='klaw_test_media_')
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        for material in CourseMaterial.objects.filter(course_code="CS700"):
+            with open(os.path.join(directory, os.path.basename(material.file_path)), 'w') as f:
+                f.write(material.file_path)
+
+        jobs.enqueue('process_course', "CS700")
+        job = jobs.claim('this-worker')
+        client = mock.Mock(base_url='http://ai.test')
+        client.missing_files.return_value = None
+
+        def upload_file(*args):
+            if client.upload_file.call_count > 1:
+                time.sleep(0.2)  # the first upload's checkpoint notices the takeover meanwhile
+
+        client.upload_file.side_effect = upload_file
+        record_upload = MaterialUpload.objects.update_or_create
+
+        def taken_over(*args, **kwargs):
+            # the job was requeued as stale and claimed again while the first file uploaded
+            BackgroundJob.objects.filter(_id=job._id).update(locked_by='other-worker')
+            return record_upload(*args, **kwargs)
+
+        with mock.patch('admin_panel.processing.AIClient', return_value=client), \
+                mock.patch('admin_panel.processing.AI_UPLOAD_CONCURRENCY', 1), \
+                mock.patch('admin_panel.processing.material_file_path',
+                           lambda file_path: os.path.join(directory, os.path.basename(file_path))), \
+                mock.patch.object(MaterialUpload.objects, 'update_or_create', side_effect=taken_over):
+            self.assertFalse(jobs.run(job))
+
+        self.assertLess(client.upload_file.call_count, 3)
+        row = BackgroundJob.objects.get(_id=job._id)
+        self.assertEqual((row.status, row.locked_by), ('running', 'other-worker'))
+        self.assertEqual(json.loads(row.progress)['completed_steps'],
+                         ['basic_info', 'course_outcome', 'syllabus', 'questions'])
+
+
+class CourseRowsPatchTest(CourseReadTestCase):
+
+    def patch_syllabus(self, items):
+        response = self.client.patch('/api/admin/course-syllabus/CS800/', {'syllabus_items': items}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return list(CourseSyllabus.objects.filter(course_code="CS800").values_list('syllabus_item', flat=True))
+
+    def test_submitted_order_is_kept(self):
+        self.create_course("CS800", status='draft')
+        self.assertEqual(self.patch_syllabus(["Unit 0", "Unit 0b", "Unit 1", "Unit 2"]),
+                         ["Unit 0", "Unit 0b", "Unit 1", "Unit 2"])
+        self.assertEqual(self.patch_syllabus(["Unit 2", "Unit 0", "Unit 1", "Unit 0b"]),
+                         ["Unit 2", "Unit 0", "Unit 1", "Unit 0b"])
+        # removing and appending keeps the other rows as they are
+        kept = set(CourseSyllabus.objects.filter(course_code="CS800", syllabus_item__in=["Unit 2", "Unit 1"])
+                   .values_list('pk', flat=True))
+        self.assertEqual(self.patch_syllabus(["Unit 2", "Unit 1", "Unit 3"]), ["Unit 2", "Unit 1", "Unit 3"])
+        self.assertTrue(kept <= set(CourseSyllabus.objects.filter(course_code="CS800").values_list('pk', flat=True)))
+
+
+
+class CourseRowsPostQueryCountTest(CourseReadTestCase):
+
+    def test_query_count_does_not_grow_with_rows(self):
+        CourseBasicInfo.objects.create(course_name="Course CS980", course_code="CS980",
+                                       year=2024, branch="CSE", semester=5, group="A")
+        for count in (5, 60):
+            # the course check, one insert inside its savepoint, then the snapshot refresh: the
+            # course lookup and the removal of the snapshot of a course that is not finalized yet
+            with self.assertNumQueries(6):
+                response = self.client.post('/api/admin/course-questions/', {
+                    'course_code': "CS980", 'questions': [f"Question {count}.{i}?" for i in range(count)],
+                }, format='json')
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(CourseQuestion.objects.filter(course_code="CS980").count(), 65)
+
+
+class VectorizeMediaTest(SimpleTestCase):
+
+    def test_sources_are_paths_below_media(self):
+        directory = tempfile.mkdtemp(prefix='klaw_test_media_')
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        for folder in ('', 'unit1', 'unit2'):
+            os.makedirs(os.path.join(directory, folder), exist_ok=True)
+            with open(os.path.join(directory, folder, 'notes.txt'), 'w') as f:
+                f.write(folder)
+        with override_settings(MEDIA_ROOT=directory), \
+                mock.patch('admin_panel.management.commands.vectorize.add', return_value='success') as add:
+            call_command('vectorize', media=os.path.join(directory, 'unit1'), collection="CS990", stdout=StringIO())
+            call_command('vectorize', media=directory, collection="CS990", stdout=StringIO())
+        self.assertEqual(sorted(c.kwargs['source'] for c in add.call_args_list),
+                         ['notes.txt', 'unit1/notes.txt', 'unit1/notes.txt', 'unit2/notes.txt'])
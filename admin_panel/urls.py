@@ -3,8 +3,8 @@ from .views import (
     AdminLoginView, CourseBasicInfoView, CourseOutcomesView, CourseSyllabusView,
     CourseQuestionsView, CourseMaterialsView, CourseDeleteView, ToggleCourseStatusView,
     GetCoursesView, ContactFormView, CreateBlogView, ListBlogsView,
-    SingleBlogView, EditBlogView, ToggleBlogStatusView, DeleteBlogView, CourseDetailView,
-    PushNotificationView, NotificationHistoryView,ProcessCourseAPIView,list_users,view_user_details,ToggleUserStatus,
+    SingleBlogView, EditBlogView, ToggleBlogStatusView, DeleteBlogView, CourseDetailView, CourseSearchView, CourseJobsView,
+    PushNotificationView, NotificationHistoryView,ProcessCourseAPIView,ProcessStatusView,list_users,view_user_details,ToggleUserStatus,
 )
 
 urlpatterns = [
@@ -21,9 +21,12 @@ urlpatterns = [
     path('course-materials/<str:course_code>/', CourseMaterialsView.as_view(), name='course-materials'),
     path('course-delete/', CourseDeleteView.as_view(), name='course-delete'),
     path('process/', ProcessCourseAPIView.as_view(), name='process-course'),
+    path('process/<str:job_id>/', ProcessStatusView.as_view(), name='process-status'),
     path('toggle-course/<str:course_code>/', ToggleCourseStatusView.as_view(), name='toggle-course-status'),
     path('get-courses/', GetCoursesView.as_view(), name='get-courses'),
     path('courses/<str:course_code>/', CourseDetailView.as_view(), name='course-detail'),
+    path('courses/<str:course_code>/search/', CourseSearchView.as_view(), name='course-search'),
+    path('courses/<str:course_code>/jobs/', CourseJobsView.as_view(), name='course-jobs'),
     path('contact/', ContactFormView.as_view(), name='contact-form'),
     path('create-blog/', CreateBlogView.as_view(), name='create-blog'),
     path('blogs/', ListBlogsView.as_view(), name='list-blogs'),
@@ -6,23 +6,30 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
 from django.views import View 
 from .models import AdminAppUser
-import urllib.parse
-from .models import CourseBasicInfo, CourseOutcome, CourseSyllabus, CourseQuestion, CourseMaterial, Course, Contact, Blog, Notification
+from .models import CourseBasicInfo, CourseOutcome, CourseSyllabus, CourseQuestion, CourseMaterial, Course, Contact, Blog, Notification, BackgroundJob
 from .serializers import (
     AdminLoginSerializer, CourseBasicInfoSerializer, CourseOutcomeSerializer,
     CourseSyllabusSerializer, CourseQuestionSerializer, CourseMaterialSerializer,
-    CourseFinalSerializer, ContactSerializer, BlogSerializer, CourseDetailSerializer, 
+    CourseFinalSerializer, ContactSerializer, BlogSerializer, CourseDetailSerializer,
     NotificationSerializer
 )
 from django.core.files.storage import FileSystemStorage
 import logging
 from dotenv import load_dotenv
 from django.views.decorators.csrf import csrf_exempt
+import hashlib
 import os
-import requests
-from requests_toolbelt.multipart.encoder import MultipartEncoder
+import time
 from bson import ObjectId
 from .utils import send_notification_to_topic
+from .jobs import enqueue, enqueue_material_ingestion, job_data, material_file_path
+from .bulk import Changes, apply_changes, diff_rows, insert_all
+from .snapshots import delete_snapshot, read_snapshots, refresh_snapshot
+from .pagination import PageError, keyset_page, project, requested_fields
+from pymongo.errors import PyMongoError
+from vectorization.search import search as search_collection
+from vectorization.create import drop_collection
+from vectorization.manifest import file_sha256
 logger = logging.getLogger(__name__)
 load_dotenv()
 
@@ -59,6 +66,7 @@ class CourseBasicInfoView(APIView):
         serializer = CourseBasicInfoSerializer(data=request.data)
         if serializer.is_valid():
             instance = serializer.save()
+            update_snapshot(instance.course_code)
             logger.info(f"Course basic info created: {instance.course_code}")
             return Response({"course_code": instance.course_code, "message": "successful"}, status=status.HTTP_201_CREATED)
         logger.error(f"Course basic info creation failed: {serializer.errors}")
@@ -85,6 +93,7 @@ class CourseBasicInfoView(APIView):
             serializer = CourseBasicInfoSerializer(basic_info, data=request.data, partial=True)
             if serializer.is_valid():
                 instance = serializer.save()
+                update_snapshot(course_code)
                 logger.info(f"Course basic info updated: {course_code}")
                 return Response({"message": "successful", "course_code": course_code}, status=status.HTTP_200_OK)
             logger.error(f"Course basic info update failed: {serializer.errors}")
@@ -93,6 +102,66 @@ class CourseBasicInfoView(APIView):
             logger.error(f"Course not found: {course_code}")
             return Response({"error": "Course not found."}, status=status.HTTP_404_NOT_FOUND)
 
+def update_snapshot(course_code):
+    # the course document read by CourseDetailView and GetCoursesView follows every write
+    try:
+        refresh_snapshot(course_code)
+    except Exception as e:
+        logger.error(f"Failed to refresh snapshot of course {course_code}: {str(e)}")
+        # a stale snapshot would be served until the next write, without one the next read rebuilds it
+        try:
+            delete_snapshot(course_code)
+        except Exception as e:
+            logger.error(f"Failed to remove stale snapshot of course {course_code}: {str(e)}")
+
+def validate_course_rows(serializer_class, rows):
+    """
+    Validates all rows of a course in memory, the caller has checked the course itself.
+    Returns (validated rows, None) or (None, the error Response of the first invalid row).
+    """
+    serializer = serializer_class(data=rows, many=True, context={'course_checked': True})
+    if not serializer.is_valid():
+        errors = serializer.errors
+        if isinstance(errors, list):
+            errors = next(row_errors for row_errors in errors if row_errors)  # the first invalid row
+        return None, Response(errors, status=status.HTTP_400_BAD_REQUEST)
+    return serializer.validated_data, None
+
+def create_course_rows(serializer_class, course_code, rows):
+    """
+    Validates all rows of a course, checking the course itself once, and inserts them in one
+    bulk write; nothing is written unless every row is valid. Returns None on success, else
+    the error Response.
+    """
+    if not CourseBasicInfo.objects.filter(course_code=course_code).exists():
+        return Response({"course_code": ["Course code does not exist."]}, status=status.HTTP_400_BAD_REQUEST)
+    validated, error = validate_course_rows(serializer_class, rows)
+    if error is not None:
+        return error
+    try:
+        insert_all(serializer_class.Meta.model, validated)
+    except PyMongoError as e:
+        logger.error(f"Bulk insert into {serializer_class.Meta.model.__name__} failed for {course_code}: {str(e)}")
+        return Response({"error": "Failed to save, nothing was written."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    return None
+
+def replace_course_rows(serializer_class, course_code, rows, key_fields):
+    """
+    Makes the stored rows of a course match `rows`: all rows are validated first, then only
+    the differences (matched by key_fields) are written, in one bulk write. Returns
+    (counts, None) or (None, the error Response).
+    """
+    validated, error = validate_course_rows(serializer_class, rows)
+    if error is not None:
+        return None, error
+    model = serializer_class.Meta.model
+    changes = diff_rows(model.objects.filter(course_code=course_code), validated, key_fields)
+    try:
+        return apply_changes(model, changes), None
+    except PyMongoError as e:
+        logger.error(f"Bulk update of {model.__name__} failed for {course_code}: {str(e)}")
+        return None, Response({"error": "Failed to save, nothing was changed."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 class CourseOutcomesView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -109,13 +178,13 @@ class CourseOutcomesView(APIView):
             if not outcome_data.get('short_form', '').strip() or not outcome_data.get('outcome', '').strip():
                 logger.error("Course outcomes creation failed: Empty short_form or outcome")
                 return Response({"error": "Each outcome must have a non-empty short_form and outcome."}, status=status.HTTP_400_BAD_REQUEST)
-            serializer = CourseOutcomeSerializer(data={**outcome_data, 'course_code': course_code})
-            if serializer.is_valid():
-                serializer.save()
-                logger.info(f"Course outcome added: {course_code} - {outcome_data.get('short_form')}")
-            else:
-                logger.error(f"Course outcome creation failed: {serializer.errors}")
-                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        error = create_course_rows(CourseOutcomeSerializer, course_code,
+                                   [{**outcome_data, 'course_code': course_code} for outcome_data in outcomes])
+        if error is not None:
+            logger.error(f"Course outcome creation failed: {error.data}")
+            return error
+        update_snapshot(course_code)
+        logger.info(f"Course outcomes added: {course_code} - {len(outcomes)} outcomes")
         return Response({"course_code": course_code, "message": "successful"}, status=status.HTTP_201_CREATED)
 
     def patch(self, request, course_code):
@@ -136,12 +205,6 @@ class CourseOutcomesView(APIView):
                 logger.error(f"Course outcomes update failed: Duplicate short_form values in {course_code}")
                 return Response({"error": "Outcome short_form values must be unique."}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Delete existing outcomes
-            deleted_count = CourseOutcome.objects.filter(course_code=course_code).delete()[0]
-            logger.info(f"Deleted {deleted_count} existing outcomes for course: {course_code}")
-
-            # Create new outcomes
-            created_outcomes = []
             for outcome_data in outcomes_data:
                 if 'course_code' in outcome_data:
                     logger.error(f"Attempt to modify course_code in outcome: {course_code}")
@@ -149,15 +212,17 @@ class CourseOutcomesView(APIView):
                 if not outcome_data.get('short_form', '').strip() or not outcome_data.get('outcome', '').strip():
                     logger.error(f"Course outcomes update failed: Empty short_form or outcome for {course_code}")
                     return Response({"error": "Each outcome must have a non-empty short_form and outcome."}, status=status.HTTP_400_BAD_REQUEST)
-                serializer = CourseOutcomeSerializer(data={**outcome_data, 'course_code': course_code})
-                if serializer.is_valid():
-                    serializer.save()
-                    created_outcomes.append(outcome_data.get('short_form'))
-                else:
-                    logger.error(f"Course outcome update failed: {serializer.errors}")
-                    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-            logger.info(f"Course outcomes updated: {course_code} - {len(created_outcomes)} outcomes added: {created_outcomes}")
+            # Only outcomes whose short_form is new or whose text or position changed are written
+            counts, error = replace_course_rows(CourseOutcomeSerializer, course_code, [
+                {**outcome_data, 'course_code': course_code} for outcome_data in outcomes_data
+            ], key_fields=['short_form'])
+            if error is not None:
+                logger.error(f"Course outcome update failed: {error.data}")
+                return error
+
+            update_snapshot(course_code)
+            logger.info(f"Course outcomes updated: {course_code} - {counts}")
             return Response({"message": "successful", "course_code": course_code}, status=status.HTTP_200_OK)
         except Course.DoesNotExist:
             logger.error(f"Course not found: {course_code}")
@@ -179,13 +244,13 @@ class CourseSyllabusView(APIView):
             if not item.strip():
                 logger.error("Course syllabus creation failed: Empty syllabus item")
                 return Response({"error": "Each syllabus item must be non-empty."}, status=status.HTTP_400_BAD_REQUEST)
-            serializer = CourseSyllabusSerializer(data={'course_code': course_code, 'syllabus_item': item})
-            if serializer.is_valid():
-                serializer.save()
-                logger.info(f"Syllabus item added: {course_code}")
-            else:
-                logger.error(f"Syllabus item creation failed: {serializer.errors}")
-                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        error = create_course_rows(CourseSyllabusSerializer, course_code,
+                                   [{'course_code': course_code, 'syllabus_item': item} for item in syllabus_items])
+        if error is not None:
+            logger.error(f"Syllabus item creation failed: {error.data}")
+            return error
+        update_snapshot(course_code)
+        logger.info(f"Syllabus items added: {course_code} - {len(syllabus_items)} items")
         return Response({"course_code": course_code, "message": "successful"}, status=status.HTTP_201_CREATED)
 
     def patch(self, request, course_code):
@@ -206,25 +271,16 @@ class CourseSyllabusView(APIView):
                 logger.error(f"Course syllabus update failed: Duplicate syllabus items in {course_code}")
                 return Response({"error": "Syllabus items must be unique."}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Delete existing syllabus items
-            deleted_count = CourseSyllabus.objects.filter(course_code=course_code).delete()[0]
-            logger.info(f"Deleted {deleted_count} existing syllabus items for course: {course_code}")
-
-            # Create new syllabus items
-            created_items = []
-            for item in syllabus_items:
-                if not item.strip():
-                    logger.error(f"Course syllabus update failed: Empty syllabus item for {course_code}")
-                    return Response({"error": "Each syllabus item must be non-empty."}, status=status.HTTP_400_BAD_REQUEST)
-                serializer = CourseSyllabusSerializer(data={'course_code': course_code, 'syllabus_item': item})
-                if serializer.is_valid():
-                    serializer.save()
-                    created_items.append(item)
-                else:
-                    logger.error(f"Syllabus item update failed: {serializer.errors}")
-                    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            # Only added, removed and moved items are written
+            counts, error = replace_course_rows(CourseSyllabusSerializer, course_code, [
+                {'course_code': course_code, 'syllabus_item': item} for item in syllabus_items
+            ], key_fields=['syllabus_item'])
+            if error is not None:
+                logger.error(f"Syllabus item update failed: {error.data}")
+                return error
 
-            logger.info(f"Course syllabus updated: {course_code} - {len(created_items)} items added")
+            update_snapshot(course_code)
+            logger.info(f"Course syllabus updated: {course_code} - {counts}")
             return Response({"message": "successful", "course_code": course_code}, status=status.HTTP_200_OK)
         except Course.DoesNotExist:
             logger.error(f"Course not found: {course_code}")
@@ -246,13 +302,13 @@ class CourseQuestionsView(APIView):
             if not question.strip():
                 logger.error("Course questions creation failed: Empty question")
                 return Response({"error": "Each question must be non-empty."}, status=status.HTTP_400_BAD_REQUEST)
-            serializer = CourseQuestionSerializer(data={'course_code': course_code, 'question': question})
-            if serializer.is_valid():
-                serializer.save()
-                logger.info(f"Question added: {course_code}")
-            else:
-                logger.error(f"Question creation failed: {serializer.errors}")
-                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        error = create_course_rows(CourseQuestionSerializer, course_code,
+                                   [{'course_code': course_code, 'question': question} for question in questions])
+        if error is not None:
+            logger.error(f"Question creation failed: {error.data}")
+            return error
+        update_snapshot(course_code)
+        logger.info(f"Questions added: {course_code} - {len(questions)} questions")
         return Response({"course_code": course_code, "message": "successful"}, status=status.HTTP_201_CREATED)
 
     def patch(self, request, course_code):
@@ -273,30 +329,46 @@ class CourseQuestionsView(APIView):
                 logger.error(f"Course questions update failed: Duplicate questions in {course_code}")
                 return Response({"error": "Questions must be unique."}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Delete existing questions
-            deleted_count = CourseQuestion.objects.filter(course_code=course_code).delete()[0]
-            logger.info(f"Deleted {deleted_count} existing questions for course: {course_code}")
-
-            # Create new questions
-            created_questions = []
-            for question in questions:
-                if not question.strip():
-                    logger.error(f"Course questions update failed: Empty question for {course_code}")
-                    return Response({"error": "Each question must be non-empty."}, status=status.HTTP_400_BAD_REQUEST)
-                serializer = CourseQuestionSerializer(data={'course_code': course_code, 'question': question})
-                if serializer.is_valid():
-                    serializer.save()
-                    created_questions.append(question)
-                else:
-                    logger.error(f"Question update failed: {serializer.errors}")
-                    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            # Only added, removed and moved questions are written
+            counts, error = replace_course_rows(CourseQuestionSerializer, course_code, [
+                {'course_code': course_code, 'question': question} for question in questions
+            ], key_fields=['question'])
+            if error is not None:
+                logger.error(f"Question update failed: {error.data}")
+                return error
 
-            logger.info(f"Course questions updated: {course_code} - {len(created_questions)} questions added")
+            update_snapshot(course_code)
+            logger.info(f"Course questions updated: {course_code} - {counts}")
             return Response({"message": "successful", "course_code": course_code}, status=status.HTTP_200_OK)
         except Course.DoesNotExist:
             logger.error(f"Course not found: {course_code}")
             return Response({"error": "Course not found."}, status=status.HTTP_404_NOT_FOUND)
 
+def queue_vectorization(course_code, materials, removed=()):
+    # vectorization runs in `manage.py run_jobs`, the upload only records the work to do
+    try:
+        return [str(job._id) for job in enqueue_material_ingestion(course_code, materials, removed)]
+    except Exception as e:
+        logger.error(f"Failed to queue vectorization for course {course_code}: {str(e)}")
+        return []
+
+def matching_material(candidates, file):
+    # the stored material with the same name as the upload and the same content, if any
+    for material in candidates:
+        file_path = material_file_path(material.file_path)
+        if os.path.exists(file_path) and os.path.getsize(file_path) == file.size:
+            if file_sha256(file_path) == upload_sha256(file):
+                candidates.remove(material)
+                return material
+    return None
+
+def upload_sha256(file):
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
 class CourseMaterialsView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -326,8 +398,10 @@ class CourseMaterialsView(APIView):
         })
         if serializer.is_valid():
             instance = serializer.save()
+            update_snapshot(instance.course_code)
             logger.info(f"Course finalized: {instance.course_code} with status {instance.status}")
-            return Response({"course_code": instance.course_code, "message": "successful"}, status=status.HTTP_201_CREATED)
+            jobs = queue_vectorization(instance.course_code, CourseMaterial.objects.filter(course_code=instance.course_code))
+            return Response({"course_code": instance.course_code, "message": "successful", "jobs": jobs}, status=status.HTTP_201_CREATED)
         logger.error(f"Course materials creation failed: {serializer.errors}")
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -349,28 +423,54 @@ class CourseMaterialsView(APIView):
                 logger.error(f"Course materials update failed: Duplicate file names in {course_code}")
                 return Response({"error": "File names must be unique."}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Delete existing materials
-            deleted_count = CourseMaterial.objects.filter(course_code=course_code).delete()[0]
-            logger.info(f"Deleted {deleted_count} existing materials for course: {course_code}")
-
-            # Create new materials
-            created_files = []
-            for i, file in enumerate(files):
-                file_type = request.data.get(f'file_type_{i}', 'Unknown')
-                serializer = CourseMaterialSerializer(data={
-                    'course_code': course_code,
-                    'file': file,
-                    'file_type': file_type
-                })
-                if serializer.is_valid():
-                    serializer.save()
-                    created_files.append(file.name)
+            # Validate every file before anything is stored
+            validated, error = validate_course_rows(CourseMaterialSerializer, [{
+                'course_code': course_code,
+                'file': file,
+                'file_type': request.data.get(f'file_type_{i}', 'Unknown')
+            } for i, file in enumerate(files)])
+            if error is not None:
+                logger.error(f"Course material update failed: {error.data}")
+                return error
+
+            # Files already stored under the same name with the same content are kept as they are
+            fs = FileSystemStorage(location='media/')
+            stored = {}
+            for material in CourseMaterial.objects.filter(course_code=course_code):
+                stored.setdefault(os.path.basename(material_file_path(material.file_path)), []).append(material)
+            inserts, updates, unchanged, new_files = [], [], [], []
+            for material_data in validated:
+                file = material_data['file']
+                material = matching_material(stored.get(fs.get_valid_name(file.name), []), file)
+                if material is None:
+                    new_files.append(material_data)
+                elif material.file_type != material_data['file_type']:
+                    updates.append((material, {'file_type': material_data['file_type']}))
                 else:
-                    logger.error(f"Course material update failed: {serializer.errors}")
-                    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+                    unchanged.append(material)
+            deletes = [material for materials in stored.values() for material in materials]
 
-            logger.info(f"Course materials updated: {course_code} - {len(created_files)} files added: {created_files}")
-            return Response({"message": "successful"}, status=status.HTTP_200_OK)
+            saved = []
+            try:
+                for material_data in new_files:
+                    filename = fs.save(material_data['file'].name, material_data['file'])
+                    saved.append(filename)
+                    inserts.append({
+                        'course_code': course_code,
+                        'file_path': fs.url(filename),
+                        'file_type': material_data['file_type']
+                    })
+                counts = apply_changes(CourseMaterial, Changes(inserts, updates, deletes, unchanged))
+            except (OSError, PyMongoError) as e:
+                for filename in saved:
+                    fs.delete(filename)
+                logger.error(f"Course materials update failed for {course_code}: {str(e)}")
+                return Response({"error": "Failed to save, nothing was changed."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+            update_snapshot(course_code)
+            logger.info(f"Course materials updated: {course_code} - {counts}, {len(unchanged)} unchanged")
+            jobs = queue_vectorization(course_code, [CourseMaterial(**values) for values in inserts], removed=deletes)
+            return Response({"message": "successful", "jobs": jobs}, status=status.HTTP_200_OK)
         except Course.DoesNotExist:
             logger.error(f"Course not found: {course_code}")
             return Response({"error": "Course not found."}, status=status.HTTP_404_NOT_FOUND)
@@ -385,12 +485,24 @@ class CourseDeleteView(APIView):
             return Response({"error": "Course code is required."}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
+            existed = (CourseBasicInfo.objects.filter(course_code=course_code).exists()
+                       or Course.objects.filter(course_code=course_code).exists())
             CourseBasicInfo.objects.filter(course_code=course_code).delete()
             CourseOutcome.objects.filter(course_code=course_code).delete()
             CourseSyllabus.objects.filter(course_code=course_code).delete()
             CourseQuestion.objects.filter(course_code=course_code).delete()
             CourseMaterial.objects.filter(course_code=course_code).delete()
             Course.objects.filter(course_code=course_code).delete()
+            delete_snapshot(course_code)
+            BackgroundJob.objects.filter(course_code=course_code, status='queued').delete()
+
+            # the vectorized materials of the course go with it; only a course that existed has a collection
+            if existed:
+                try:
+                    if drop_collection(course_code):
+                        logger.info(f"Vector collection dropped for course: {course_code}")
+                except Exception as e:
+                    logger.error(f"Failed to drop vector collection for course {course_code}: {str(e)}")
             
             logger.info(f"Course deleted: {course_code}")
             return Response({"detail": f"Course {course_code} and related data deleted successfully."}, status=status.HTTP_200_OK)
@@ -402,14 +514,70 @@ class CourseDetailView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, course_code):
-        try:
-            course = Course.objects.get(course_code=course_code)
-            serializer = CourseDetailSerializer(course)
-            logger.info(f"Retrieved course details for: {course_code}")
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        except Course.DoesNotExist:
+        courses = read_snapshots([course_code])
+        if not courses:
             logger.error(f"Course not found: {course_code}")
             return Response({"detail": "Course not found."}, status=status.HTTP_404_NOT_FOUND)
+        logger.info(f"Retrieved course details for: {course_code}")
+        return Response(courses[0], status=status.HTTP_200_OK)
+
+class CourseSearchView(APIView):
+    permission_classes = [IsAuthenticated]
+    max_results = 50
+
+    def get(self, request, course_code):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            logger.error(f"Course search failed: No query provided for {course_code}")
+            return Response({"error": "Query parameter 'q' is required."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            k = int(request.query_params.get('k', 5))
+        except ValueError:
+            return Response({"error": "k must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= k <= self.max_results:
+            return Response({"error": f"k must be between 1 and {self.max_results}."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not CourseBasicInfo.objects.filter(course_code=course_code).exists():
+            logger.error(f"Course search failed: Course not found: {course_code}")
+            return Response({"detail": "Course not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        started = time.perf_counter()
+        try:
+            results, cached = search_collection(course_code, query, k)
+        except Exception as e:
+            logger.error(f"Course search failed for {course_code}: {str(e)}")
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        took_ms = round((time.perf_counter() - started) * 1000, 2)
+        logger.info(f"Course search on {course_code}: {len(results)} results in {took_ms}ms (cached={cached})")
+        return Response({
+            "course_code": course_code,
+            "query": query,
+            "results": results,
+            "cached": cached,
+            "took_ms": took_ms
+        }, status=status.HTTP_200_OK)
+
+class CourseJobsView(APIView):
+    permission_classes = [IsAuthenticated]
+    max_jobs = 50
+
+    def get(self, request, course_code):
+        jobs = BackgroundJob.objects.filter(course_code=course_code)
+        job_status = request.query_params.get('status')
+        if job_status:
+            jobs = jobs.filter(status=job_status)
+        jobs = list(jobs.order_by('-created_at')[:self.max_jobs])
+
+        summary = {
+            choice: BackgroundJob.objects.filter(course_code=course_code, status=choice).count()
+            for choice, _ in BackgroundJob.STATUS_CHOICES
+        }
+        logger.info(f"Retrieved {len(jobs)} jobs for course: {course_code}")
+        return Response({
+            "course_code": course_code,
+            "summary": summary,
+            "jobs": [job_data(job) for job in jobs],
+        }, status=status.HTTP_200_OK)
 
 class ToggleCourseStatusView(APIView):
     permission_classes = [IsAuthenticated]
@@ -423,6 +591,7 @@ class ToggleCourseStatusView(APIView):
             course = Course.objects.get(course_code=course_code)
             course.status = 'published' if course.status == 'draft' else 'draft'
             course.save()
+            update_snapshot(course.course_code)
             logger.info(f"Course status toggled: {course.course_code} to {course.status} by user: {request.user.username}")
             return Response({
                 "course_code": course.course_code,
@@ -442,10 +611,17 @@ class GetCoursesView(APIView):
             logger.error(f"Invalid status filter: {status_filter}")
             return Response({"error": "Invalid status filter. Use 'draft' or 'published'."}, status=status.HTTP_400_BAD_REQUEST)
 
-        courses = Course.objects.filter(status=status_filter)
-        serializer = CourseDetailSerializer(courses, many=True)
+        try:
+            fields = requested_fields(request.query_params, CourseDetailSerializer.Meta.fields)
+            page, _, next_cursor = keyset_page(
+                Course.objects.filter(status=status_filter).only('_id', 'course_code', 'created_at'),
+                request.query_params, ('-created_at', '-_id'))
+        except PageError as e:
+            logger.error(f"Invalid course list request: {str(e)}")
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        courses = project(read_snapshots(course.course_code for course in page), fields)
         logger.info(f"Retrieved {len(courses)} courses with status {status_filter}")
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response({"results": courses, "next_cursor": next_cursor}, status=status.HTTP_200_OK)
 
 class ContactFormView(APIView):
     permission_classes = []
@@ -476,10 +652,18 @@ class ListBlogsView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        blogs = Blog.objects.all().order_by('-created_at')
-        serializer = BlogSerializer(blogs, many=True)
-        logger.info(f"Retrieved {len(blogs)} blogs")
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        try:
+            fields = requested_fields(request.query_params, BlogSerializer.Meta.fields)
+            blogs = Blog.objects.all()
+            if fields is not None:
+                blogs = blogs.only(*set(fields) | {'id', 'created_at'})
+            page, _, next_cursor = keyset_page(blogs, request.query_params, ('-created_at', '-id'))
+        except PageError as e:
+            logger.error(f"Invalid blog list request: {str(e)}")
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = BlogSerializer(page, many=True, fields=fields)
+        logger.info(f"Retrieved {len(page)} blogs")
+        return Response({"results": serializer.data, "next_cursor": next_cursor}, status=status.HTTP_200_OK)
 
 class SingleBlogView(APIView):
     permission_classes = [IsAuthenticated]
@@ -570,10 +754,18 @@ class NotificationHistoryView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        notifications = Notification.objects.all()
-        serializer = NotificationSerializer(notifications, many=True)
-        logger.info(f"Retrieved {len(notifications)} notifications for user: {request.user.username}")
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        try:
+            fields = requested_fields(request.query_params, NotificationSerializer.Meta.fields)
+            notifications = Notification.objects.all()
+            if fields is not None:
+                notifications = notifications.only(*set(fields) | {'id', 'created_at'})
+            page, _, next_cursor = keyset_page(notifications, request.query_params, ('-created_at', '-id'))
+        except PageError as e:
+            logger.error(f"Invalid notification list request: {str(e)}")
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = NotificationSerializer(page, many=True, fields=fields)
+        logger.info(f"Retrieved {len(page)} notifications for user: {request.user.username}")
+        return Response({"results": serializer.data, "next_cursor": next_cursor}, status=status.HTTP_200_OK)
 
 
 logger = logging.getLogger(__name__)
@@ -598,172 +790,65 @@ class ProcessCourseAPIView(APIView):
                 logger.error(f"Process course failed: Course {course_code} is not in draft status")
                 return Response({"error": "Only draft courses can be processed."}, status=status.HTTP_403_FORBIDDEN)
 
-            # Initialize response structure
-            results = {
-                "basic_info": "success",
-                "course_outcome": "success",
-                "syllabus": "success",
-                "questions": "success",
-                "materials": "success",
-                "trigger": "success"
-            }
-            ai_server_url = os.getenv("AI_SERVER", "http://127.0.0.1:5000")
-
-            # 1. Basic Info
-            try:
-                basic_info = CourseBasicInfo.objects.get(course_code=course_code)
-                basic_info_data = {
-                    "course_name": basic_info.course_name,
-                    "course_code": basic_info.course_code,
-                    "year": basic_info.year,
-                    "branch": basic_info.branch,
-                    "semester": basic_info.semester,
-                    "group": basic_info.group
-                }
-                response = requests.post(f"{ai_server_url}/api/basic_info", json=basic_info_data)
-                response.raise_for_status()
-                logger.info(f"Basic info sent for course: {course_code}")
-            except CourseBasicInfo.DoesNotExist:
-                logger.error(f"Basic info not found for course: {course_code}")
-                results["basic_info"] = "error: Basic info not found"
-                return Response({"course_code": course_code, "status": "failed", "results": results}, status=status.HTTP_400_BAD_REQUEST)
-            except requests.RequestException as e:
-                logger.error(f"Failed to send basic info for course {course_code}: {str(e)}")
-                results["basic_info"] = f"error: {str(e)}"
-                return Response({"course_code": course_code, "status": "failed", "results": results}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-            # 2. Course Outcomes
-            try:
-                outcomes = CourseOutcome.objects.filter(course_code=course_code)
-                if not outcomes:
-                    logger.error(f"No outcomes found for course: {course_code}")
-                    results["course_outcome"] = "error: No outcomes found"
-                    return Response({"course_code": course_code, "status": "failed", "results": results}, status=status.HTTP_400_BAD_REQUEST)
-                for outcome in outcomes:
-                    outcome_data = {
-                        "course_code": outcome.course_code,
-                        "shortform_course_code": outcome.short_form,
-                        "course_outcome": outcome.outcome
-                    }
-                    response = requests.post(f"{ai_server_url}/api/course_outcome", json=outcome_data)
-                    response.raise_for_status()
-                logger.info(f"Outcomes sent for course: {course_code}")
-            except requests.RequestException as e:
-                logger.error(f"Failed to send outcomes for course {course_code}: {str(e)}")
-                results["course_outcome"] = f"error: {str(e)}"
-                return Response({"course_code": course_code, "status": "failed", "results": results}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-            # 3. Syllabus
-            try:
-                syllabus_items = CourseSyllabus.objects.filter(course_code=course_code)
-                if not syllabus_items:
-                    logger.error(f"No syllabus items found for course: {course_code}")
-                    results["syllabus"] = "error: No syllabus items found"
-                    return Response({"course_code": course_code, "status": "failed", "results": results}, status=status.HTTP_400_BAD_REQUEST)
-                for item in syllabus_items:
-                    syllabus_data = {
-                        "course_code": item.course_code,
-                        "syllabus": item.syllabus_item
-                    }
-                    response = requests.post(f"{ai_server_url}/api/syllabus", json=syllabus_data)
-                    response.raise_for_status()
-                logger.info(f"Syllabus sent for course: {course_code}")
-            except requests.RequestException as e:
-                logger.error(f"Failed to send syllabus for course {course_code}: {str(e)}")
-                results["syllabus"] = f"error: {str(e)}"
-                return Response({"course_code": course_code, "status": "failed", "results": results}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-            # 4. Questions
-            try:
-                questions = CourseQuestion.objects.filter(course_code=course_code)
-                if not questions:
-                    logger.error(f"No questions found for course: {course_code}")
-                    results["questions"] = "error: No questions found"
-                    return Response({"course_code": course_code, "status": "failed", "results": results}, status=status.HTTP_400_BAD_REQUEST)
-                for question in questions:
-                    question_data = {
-                        "course_code": question.course_code,
-                        "questions": question.question
-                    }
-                    response = requests.post(f"{ai_server_url}/api/questions", json=question_data)
-                    response.raise_for_status()
-                logger.info(f"Questions sent for course: {course_code}")
-            except requests.RequestException as e:
-                logger.error(f"Failed to send questions for course {course_code}: {str(e)}")
-                results["questions"] = f"error: {str(e)}"
-                return Response({"course_code": course_code, "status": "failed", "results": results}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-            # 5. Course Materials
-            try:
-                materials = CourseMaterial.objects.filter(course_code=course_code)
-                if not materials:
-                    logger.error(f"No materials found for course: {course_code}")
-                    results["materials"] = "error: No materials found"
-                    return Response({"course_code": course_code, "status": "failed", "results": results}, status=status.HTTP_400_BAD_REQUEST)
-                for material in materials:
-                    # Decode URL-encoded characters and strip leading '/' to get correct file path
-                    file_name = urllib.parse.unquote(os.path.basename(material.file_path))
-                    file_path = os.path.join('media', file_name)
-                    if not os.path.exists(file_path):
-                        logger.error(f"File not found for course {course_code}: {file_path}")
-                        results["materials"] = f"error: File not found - {file_path}"
-                        return Response({"course_code": course_code, "status": "failed", "results": results}, status=status.HTTP_400_BAD_REQUEST)
-                    with open(file_path, 'rb') as f:
-                        encoder = MultipartEncoder(
-                            fields={
-                                'course_code': material.course_code,
-                                'file_type': material.file_type,
-                                'file': (file_name, f, 'application/octet-stream')
-                            }
-                        )
-                        headers = {'Content-Type': encoder.content_type}
-                        response = requests.post(f"{ai_server_url}/api/course_materials", data=encoder, headers=headers)
-                        response.raise_for_status()
-                logger.info(f"Materials sent for course: {course_code}")
-            except requests.RequestException as e:
-                logger.error(f"Failed to send materials for course {course_code}: {str(e)}")
-                results["materials"] = f"error: {str(e)}"
-                return Response({"course_code": course_code, "status": "failed", "results": results}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-
-            # 6. Trigger Final Processing
-            try:
-                response = requests.post(f"{ai_server_url}/api/process_file", json={"course_code": course_code})
-                response.raise_for_status()
-                logger.info(f"Final processing triggered for course: {course_code}")
-            except requests.RequestException as e:
-                logger.error(f"Failed to trigger processing for course {course_code}: {str(e)}")
-                results["trigger"] = f"error: {str(e)}"
-                return Response({"course_code": course_code, "status": "failed", "results": results}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-            # All steps successful
+            # Sending the course to the AI server runs as a background job, see admin_panel/processing.py
+            job = BackgroundJob.objects.filter(
+                course_code=course_code, kind='process_course', status__in=['queued', 'running']
+            ).first()
+            if job is None:
+                job = enqueue('process_course', course_code)
+                logger.info(f"Processing queued for course: {course_code}")
             return Response({
                 "course_code": course_code,
-                "status": "processing_started",
-                "results": results
-            }, status=status.HTTP_200_OK)
+                "status": "processing_queued",
+                "job_id": str(job._id)
+            }, status=status.HTTP_202_ACCEPTED)
 
         except Course.DoesNotExist:
             logger.error(f"Course not found: {course_code}")
             return Response({"error": "Course not found."}, status=status.HTTP_404_NOT_FOUND)
 
+class ProcessStatusView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id):
+        try:
+            job = BackgroundJob.objects.get(_id=ObjectId(job_id), kind='process_course')
+        except Exception:  # invalid ObjectId or no such job
+            logger.error(f"Process job not found: {job_id}")
+            return Response({"error": "Job not found."}, status=status.HTTP_404_NOT_FOUND)
+        data = job_data(job)
+        data["course_code"] = job.course_code
+        return Response(data, status=status.HTTP_200_OK)
+
+
+# response key -> AdminAppUser field of list_users, index is the serial number starting from 1
+USER_LIST_FIELDS = {
+    'index': None,
+    'id': 'id',
+    'name': 'full_name',
+    'phone number': 'phone_number',
+    'year of study': 'year_of_study',
+    'status': 'status',
+}
 
 def list_users(request):
     permission_classes = [IsAuthenticated] 
-    users = AdminAppUser.objects.all()  # Fetch all users from the shared table
+    try:
+        fields = requested_fields(request.GET, list(USER_LIST_FIELDS))
+        columns = {USER_LIST_FIELDS[name] for name in (fields or USER_LIST_FIELDS) if USER_LIST_FIELDS[name]}
+        users = AdminAppUser.objects.only(*columns | {'id'})  # Fetch users from the shared table
+        page, position, next_cursor = keyset_page(users, request.GET, ('id',))
+    except PageError as e:
+        return JsonResponse({'error': str(e)}, status=400)
     user_data = []
     
-    for index, user in enumerate(users, start=1):
+    # only the requested attributes are read, the others were not loaded
+    for index, user in enumerate(page, start=position + 1):  # serial number continued across pages
         user_data.append({
-            
-            'index': index,  # Serial number starting from 1
-            'id': user.id,  # User ID
-            'name': user.full_name,
-            'phone number': user.phone_number ,
-            'year of study': user.year_of_study,
-            'status': user.status,
+            name: index if column is None else getattr(user, column)
+            for name, column in USER_LIST_FIELDS.items() if fields is None or name in fields
         })
-    return JsonResponse({'users': user_data}, status=200)
+    return JsonResponse({'users': user_data, 'next_cursor': next_cursor}, status=200)
 
 
 from django.views.decorators.csrf import csrf_exempt
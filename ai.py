@@ -1,35 +1,247 @@
-from flask import Flask, request
+"""
+Local stand-in for the AI server.
+
+Accepts the same requests as the real server and, for load testing the dispatch path, can
+inject latency, errors, slow uploads and connection resets. Request counts and handling times
+are recorded per endpoint.
+
+    python ai.py                                   # plain stub on port 5000
+    python ai.py --latency-ms 80 --latency-dist lognormal --error-rate 0.02 --reset-rate 0.01 --quiet
+
+GET  /__stats   counts, injected faults and p50/p95/p99/max milliseconds per endpoint
+POST /__config  change the fault settings at runtime, e.g. {"error_rate": 0.1}
+POST /__reset   clear the stats and the material hashes received
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import random
+import socket
+import struct
+import threading
+import time
+
+from flask import Flask, g, request
 app = Flask(__name__)
 
+uploaded_hashes = {}  # course code -> sha256 of the material files received
+
+# fault injection, every setting can be changed through /__config
+config = {
+    "latency_ms": float(os.getenv("AI_STUB_LATENCY_MS", 0)),  # median added latency
+    "latency_dist": os.getenv("AI_STUB_LATENCY_DIST", "fixed"),  # fixed, uniform (0..2x) or lognormal
+    "latency_sigma": float(os.getenv("AI_STUB_LATENCY_SIGMA", 0.5)),  # spread of the lognormal distribution
+    "error_rate": float(os.getenv("AI_STUB_ERROR_RATE", 0)),  # share of requests answered with 503
+    "reset_rate": float(os.getenv("AI_STUB_RESET_RATE", 0)),  # share of connections reset without a response
+    "upload_kbps": float(os.getenv("AI_STUB_UPLOAD_KBPS", 0)),  # read speed for material uploads, 0 is unlimited
+    "quiet": os.getenv("AI_STUB_QUIET", "0") == "1",
+}
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def log(*args):
+    if not config["quiet"]:
+        print(*args)
+
+
+def _endpoint_stats(endpoint):
+    return _stats.setdefault(endpoint, {"count": 0, "errors": 0, "resets": 0, "durations": []})
+
+
+def _latency():
+    median = config["latency_ms"] / 1000
+    if median <= 0:
+        return 0
+    if config["latency_dist"] == "uniform":
+        return random.uniform(0, 2 * median)
+    if config["latency_dist"] == "lognormal":
+        return random.lognormvariate(0, config["latency_sigma"]) * median
+    return median
+
+
+class ThrottledInput:
+    # wraps wsgi.input so the request body is read at no more than `bytes_per_second`
+
+    def __init__(self, stream, bytes_per_second):
+        self.stream = stream
+        self.bytes_per_second = bytes_per_second
+
+    def _throttle(self, data):
+        if data:
+            time.sleep(len(data) / self.bytes_per_second)
+        return data
+
+    def read(self, size=-1):
+        return self._throttle(self.stream.read(size if size is not None and size >= 0 else 64 * 1024))
+
+    def readline(self, size=-1):
+        return self._throttle(self.stream.readline(size))
+
+
+def _reset_connection():
+    # SO_LINGER with a zero timeout makes close() send a RST instead of a FIN
+    connection = request.environ.get("werkzeug.socket")
+    if connection is None:
+        return False
+    connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+    connection.close()
+    return True
+
+
+@app.before_request
+def inject_faults():
+    g.started = time.perf_counter()
+    if request.path.startswith("/__"):
+        return None
+    endpoint = request.path
+    if random.random() < config["reset_rate"] and _reset_connection():
+        with _stats_lock:
+            stats = _endpoint_stats(endpoint)
+            stats["count"] += 1
+            stats["resets"] += 1
+        g.recorded = True
+        return "", 500  # never reaches the client
+    delay = _latency()
+    if delay:
+        time.sleep(delay)
+    if config["upload_kbps"] > 0 and endpoint == "/api/course_materials":
+        request.environ["wsgi.input"] = ThrottledInput(request.environ["wsgi.input"], config["upload_kbps"] * 1024)
+    if random.random() < config["error_rate"]:
+        with _stats_lock:
+            _endpoint_stats(endpoint)["errors"] += 1
+        return {"status": "error", "error": "injected failure"}, 503
+    return None
+
+
+@app.after_request
+def record_request(response):
+    if not request.path.startswith("/__") and not g.get("recorded"):
+        with _stats_lock:
+            stats = _endpoint_stats(request.path)
+            stats["count"] += 1
+            stats["durations"].append(time.perf_counter() - g.started)
+    return response
+
+
+def batch_items():
+    # body of a batch request: {"course_code": ..., "items": [...]}, optionally gzip compressed
+    body = request.get_data()
+    if request.headers.get('Content-Encoding') == 'gzip':
+        body = gzip.decompress(body)
+    data = json.loads(body)
+    return data['course_code'], data['items']
+
 @app.route('/api/basic_info', methods=['POST'])
 def basic_info():
-    print("Received basic_info:", request.json)
+    log("Received basic_info:", request.json)
     return {"status": "success"}, 200
 
 @app.route('/api/course_outcome', methods=['POST'])
 def course_outcome():
-    print("Received course_outcome:", request.json)
+    log("Received course_outcome:", request.json)
     return {"status": "success"}, 200
 
 @app.route('/api/syllabus', methods=['POST'])
 def syllabus():
-    print("Received syllabus:", request.json)
+    log("Received syllabus:", request.json)
     return {"status": "success"}, 200
 
 @app.route('/api/questions', methods=['POST'])
 def questions():
-    print("Received questions:", request.json)
+    log("Received questions:", request.json)
     return {"status": "success"}, 200
 
+@app.route('/api/course_outcome/batch', methods=['POST'])
+def course_outcome_batch():
+    course_code, items = batch_items()
+    log(f"Received {len(items)} course_outcome for {course_code}:", items)
+    return {"status": "success", "received": len(items)}, 200
+
+@app.route('/api/syllabus/batch', methods=['POST'])
+def syllabus_batch():
+    course_code, items = batch_items()
+    log(f"Received {len(items)} syllabus for {course_code}:", items)
+    return {"status": "success", "received": len(items)}, 200
+
+@app.route('/api/questions/batch', methods=['POST'])
+def questions_batch():
+    course_code, items = batch_items()
+    log(f"Received {len(items)} questions for {course_code}:", items)
+    return {"status": "success", "received": len(items)}, 200
+
 @app.route('/api/course_materials', methods=['POST'])
 def course_materials():
-    print("Received course_materials:", request.form, request.files)
+    log("Received course_materials:", request.form, request.files)
+    digest = hashlib.sha256()
+    for block in iter(lambda: request.files['file'].stream.read(1024 * 1024), b""):
+        digest.update(block)
+    uploaded_hashes.setdefault(request.form['course_code'], set()).add(digest.hexdigest())
     return {"status": "success"}, 200
 
+@app.route('/api/course_materials/check', methods=['POST'])
+def course_materials_check():
+    # which of the listed files (by sha256) still have to be uploaded
+    data = request.json
+    known = uploaded_hashes.get(data['course_code'], set())
+    missing = [f['sha256'] for f in data['files'] if f['sha256'] not in known]
+    log(f"Checked {len(data['files'])} course_materials for {data['course_code']}: {len(missing)} missing")
+    return {"missing": missing}, 200
+
 @app.route('/api/process_file', methods=['POST'])
 def process_file():
-    print("Received process_file:", request.json)
+    log("Received process_file:", request.json)
     return {"status": "success"}, 200
 
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+@app.route('/__stats', methods=['GET'])
+def stats():
+    with _stats_lock:
+        report = {}
+        for endpoint, entry in sorted(_stats.items()):
+            ordered = sorted(entry["durations"])
+            report[endpoint] = {"count": entry["count"], "errors": entry["errors"], "resets": entry["resets"]}
+            if ordered:
+                report[endpoint].update({
+                    f"{name}_ms": round(_percentile(ordered, fraction) * 1000, 2)
+                    for name, fraction in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99), ("max", 1.0))
+                })
+    return {"config": config, "endpoints": report}, 200
+
+@app.route('/__config', methods=['POST'])
+def update_config():
+    unknown = set(request.json) - set(config)
+    if unknown:
+        return {"error": f"Unknown settings: {', '.join(sorted(unknown))}"}, 400
+    config.update(request.json)
+    return {"config": config}, 200
+
+@app.route('/__reset', methods=['POST'])
+def reset():
+    with _stats_lock:
+        _stats.clear()
+    uploaded_hashes.clear()
+    return {"status": "success"}, 200
+
+
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--latency-ms", type=float, default=config["latency_ms"])
+    parser.add_argument("--latency-dist", choices=["fixed", "uniform", "lognormal"], default=config["latency_dist"])
+    parser.add_argument("--latency-sigma", type=float, default=config["latency_sigma"])
+    parser.add_argument("--error-rate", type=float, default=config["error_rate"])
+    parser.add_argument("--reset-rate", type=float, default=config["reset_rate"])
+    parser.add_argument("--upload-kbps", type=float, default=config["upload_kbps"])
+    parser.add_argument("--quiet", action="store_true", default=config["quiet"], help="do not print the payloads")
+    args = parser.parse_args()
+    config.update({key: value for key, value in vars(args).items() if key in config})
+    app.run(host=args.host, port=args.port, threaded=True)
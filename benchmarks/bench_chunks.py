@@ -0,0 +1,81 @@
+"""
+Throughput benchmark: streaming chunker vs the fixed 100 character slicer.
+
+usage:
+    python benchmarks/bench_chunks.py --size-mb 20 --chunk-size 1000 --overlap 150
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vectorization.chunks import create_chunks, stream_chunks  # noqa: E402
+
+
+WORDS = ("course outcome syllabus question student module chapter lecture theory practice "
+         "equation reaction history language passage example summary analysis").split()
+
+
+def synthetic_pages(size_bytes, page_size=3000, seed=0):
+    # pages of random sentences and paragraphs, roughly like text extracted from a pdf
+    rng = random.Random(seed)
+    pages = []
+    total = 0
+    while total < size_bytes:
+        paragraphs = []
+        length = 0
+        while length < page_size:
+            sentences = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 25))).capitalize() + "."
+                         for _ in range(rng.randint(2, 6))]
+            paragraph = " ".join(sentences)
+            paragraphs.append(paragraph)
+            length += len(paragraph) + 2
+        page = "\n\n".join(paragraphs) + "\n"
+        pages.append(page)
+        total += len(page)
+    return pages
+
+
+def timed(fn, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=float, default=10)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--overlap", type=int, default=150)
+    parser.add_argument("--unit", choices=["chars", "tokens"], default="chars")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pages = synthetic_pages(int(args.size_mb * 1024 * 1024))
+    size_mb = sum(len(p) for p in pages) / (1024 * 1024)
+
+    # the old path needs the whole document as one string before slicing
+    slicer_time, slicer_chunks = timed(lambda: create_chunks("".join(pages)), args.repeat)
+    stream_time, stream_result = timed(
+        lambda: list(stream_chunks(pages, args.chunk_size, args.overlap, args.unit)), args.repeat)
+
+    print(f"corpus: {size_mb:.1f} MB in {len(pages)} pages")
+    print(f"{'chunker':<32}{'MB/s':>10}{'chunks':>10}{'avg chars':>12}")
+    for name, elapsed, chunks in (
+        ("create_chunks (100 chars)", slicer_time, slicer_chunks),
+        (f"stream_chunks ({args.chunk_size} {args.unit})", stream_time, stream_result),
+    ):
+        average = sum(len(c) for c in chunks) / max(len(chunks), 1)
+        print(f"{name:<32}{size_mb / elapsed:>10.1f}{len(chunks):>10}{average:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
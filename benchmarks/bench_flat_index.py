@@ -0,0 +1,115 @@
+"""
+Flat exact index vs Chroma/HNSW: query latency and cold open time by collection size.
+
+Use it to pick FLAT_MAX_ROWS, the size past which auto collections are moved to chroma.
+
+usage:
+    python benchmarks/bench_flat_index.py --sizes 500,1000,2000,5000,10000,20000 --queries 200
+    python benchmarks/bench_flat_index.py --skip-chroma   # flat backend only
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vectorization.stores import FlatCollection  # noqa: E402
+
+
+BATCH = 1000
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def time_queries(collection, queries, k):
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        collection.query(query_embeddings=[query.tolist()], n_results=k)
+        latencies.append(time.perf_counter() - started)
+    return {"p50_ms": round(statistics.median(latencies) * 1000, 3),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 3)}
+
+
+def fill(collection, vectors):
+    for start in range(0, len(vectors), BATCH):
+        part = vectors[start:start + BATCH]
+        collection.upsert(ids=[f"row{start + i}" for i in range(len(part))], embeddings=part.tolist(),
+                          documents=["chunk"] * len(part))
+
+
+def bench_flat(workdir, name, vectors, queries, k):
+    fill(FlatCollection(name, workdir), vectors)
+    started = time.perf_counter()
+    collection = FlatCollection(name, workdir)
+    collection.query(query_embeddings=[queries[0].tolist()], n_results=k)
+    cold = time.perf_counter() - started
+    return {"cold_open_ms": round(cold * 1000, 3), **time_queries(collection, queries, k)}
+
+
+def bench_chroma(workdir, name, vectors, queries, k):
+    import chromadb
+
+    path = os.path.join(workdir, "chroma")
+    fill(chromadb.PersistentClient(path=path).get_or_create_collection(name=name), vectors)
+    chromadb.PersistentClient(path=path).clear_system_cache()  # force the next open to load from disk
+    started = time.perf_counter()
+    collection = chromadb.PersistentClient(path=path).get_collection(name=name)
+    collection.query(query_embeddings=[queries[0].tolist()], n_results=k)
+    cold = time.perf_counter() - started
+    return {"cold_open_ms": round(cold * 1000, 3), **time_queries(collection, queries, k)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="500,1000,2000,5000,10000,20000")
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--skip-chroma", action="store_true")
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    queries = rng.standard_normal((args.queries, args.dimension), dtype=np.float32)
+    workdir = tempfile.mkdtemp(prefix="klaw_flat_bench_")
+    results = []
+    try:
+        print(f"{'rows':>8}  {'backend':<8}{'cold open ms':>14}{'p50 ms':>10}{'p95 ms':>10}")
+        for size in [int(size) for size in args.sizes.split(",")]:
+            vectors = rng.standard_normal((size, args.dimension), dtype=np.float32)
+            row = {"rows": size, "flat": bench_flat(workdir, f"flat_{size}", vectors, queries, args.k)}
+            if not args.skip_chroma:
+                row["chroma"] = bench_chroma(workdir, f"hnsw_{size}", vectors, queries, args.k)
+            for backend in ("flat", "chroma"):
+                if backend in row:
+                    r = row[backend]
+                    print(f"{size:>8}  {backend:<8}{r['cold_open_ms']:>14}{r['p50_ms']:>10}{r['p95_ms']:>10}")
+            results.append(row)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if not args.skip_chroma:
+        crossover = next((r["rows"] for r in results if r["chroma"]["p50_ms"] < r["flat"]["p50_ms"]), None)
+        if crossover is None:
+            print("flat was faster at every size measured")
+        else:
+            print(f"chroma/HNSW queries become faster than the flat index at about {crossover} rows")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""
+Benchmark suite for the vectorization pipeline.
+
+Generates synthetic PDF and TXT corpora of several sizes and measures each stage separately:
+pdf/txt extraction, chunking (create_chunks and stream_chunks), embedding and collection.add
+into a temporary Chroma directory. Every stage reports throughput (MB/s, chunks/s), peak
+python memory and p50/p95 latency over the repeats. Results are written as JSON so runs from
+different commits can be compared with --compare.
+
+usage:
+    python benchmarks/bench_vectorization.py --sizes 1,5,20 --repeat 5 --output bench.json
+    python benchmarks/bench_vectorization.py --compare old.json --output new.json
+    python benchmarks/bench_vectorization.py --skip-embed --skip-store   # no model or chroma needed
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.bench_chunks import synthetic_pages  # noqa: E402
+from vectorization.chunks import create_chunks, stream_chunks  # noqa: E402
+from vectorization.ingest import iter_txt_blocks  # noqa: E402
+from vectorization.pdf_extract import extract_text_from_pdf  # noqa: E402
+
+
+MB = 1024 * 1024
+LINES_PER_PAGE = 60
+LINE_WIDTH = 90
+
+
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path, pages):
+    # minimal single font pdf with one text stream per page, enough for PyPDF2 to extract
+    lines_per_page = []
+    for page in pages:
+        lines = []
+        for paragraph in page.split("\n"):
+            while len(paragraph) > LINE_WIDTH:
+                cut = paragraph.rfind(" ", 0, LINE_WIDTH) + 1 or LINE_WIDTH
+                lines.append(paragraph[:cut])
+                paragraph = paragraph[cut:]
+            lines.append(paragraph)
+        for i in range(0, len(lines), LINES_PER_PAGE):
+            lines_per_page.append(lines[i:i + LINES_PER_PAGE])
+
+    page_count = len(lines_per_page)
+    # object numbers: 1 catalog, 2 pages, 3 font, then (page, content) pairs
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        2: ("<< /Type /Pages /Kids [%s] /Count %d >>" % (
+            " ".join(f"{4 + 2 * i} 0 R" for i in range(page_count)), page_count)).encode(),
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    for i, lines in enumerate(lines_per_page):
+        body = "BT /F1 9 Tf 40 800 Td 12 TL\n" + "".join(f"({_pdf_escape(line)}) '\n" for line in lines) + "ET"
+        body = body.encode("latin-1", "replace")
+        objects[4 + 2 * i] = (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>"
+        ).encode()
+        objects[5 + 2 * i] = b"<< /Length %d >>\nstream\n" % len(body) + body + b"\nendstream"
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = {}
+        for number in sorted(objects):
+            offsets[number] = f.tell()
+            f.write(b"%d 0 obj\n" % number + objects[number] + b"\nendobj\n")
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for number in sorted(objects):
+            f.write(b"%010d 00000 n \n" % offsets[number])
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+
+
+def build_corpus(directory, sizes_mb):
+    corpus = []
+    for size in sizes_mb:
+        pages = synthetic_pages(int(size * MB), seed=int(size * 1000))
+        txt_path = os.path.join(directory, f"corpus_{size}mb.txt")
+        with open(txt_path, "w", encoding="utf-8") as f:
+            f.writelines(pages)
+        pdf_path = os.path.join(directory, f"corpus_{size}mb.pdf")
+        write_pdf(pdf_path, pages)
+        corpus.append({"size_mb": size, "txt": txt_path, "pdf": pdf_path})
+    return corpus
+
+
+def measure(fn, repeat):
+    # times fn `repeat` times, then runs it once more under tracemalloc for the peak memory
+    # (tracing slows allocation heavy code like PyPDF2 down too much to time it at the same time)
+    latencies = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        latencies.append(time.perf_counter() - started)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return latencies, peak, result
+
+
+def summarize(latencies, peak, text_bytes=None, chunks=None):
+    ordered = sorted(latencies)
+    p50 = statistics.median(ordered)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    summary = {
+        "runs": len(ordered),
+        "p50_s": round(p50, 6),
+        "p95_s": round(p95, 6),
+        "peak_mem_mb": round(peak / MB, 3),
+    }
+    if text_bytes is not None:
+        summary["mb_per_s"] = round(text_bytes / MB / p50, 3)
+    if chunks is not None:
+        summary["chunks"] = chunks
+        summary["chunks_per_s"] = round(chunks / p50, 1)
+    return summary
+
+
+def read_txt(path):
+    # the same block reader add() uses for txt files
+    return "".join(iter_txt_blocks(path))
+
+
+def run(args, workdir):
+    from vectorization.add import CHUNK_OVERLAP, CHUNK_SIZE, CHUNK_UNIT
+
+    results = []
+    for entry in build_corpus(workdir, args.sizes):
+        label = f"{entry['size_mb']}MB"
+        print(f"corpus {label}")
+        stages = {}
+
+        latencies, peak, text = measure(lambda: extract_text_from_pdf(entry["pdf"]), args.repeat)
+        text_bytes = len(text.encode("utf-8"))
+        stages["extract_pdf"] = summarize(latencies, peak, text_bytes)
+        if args.pdf_workers > 1:
+            latencies, peak, _ = measure(
+                lambda: extract_text_from_pdf(entry["pdf"], workers=args.pdf_workers), args.repeat)
+            stages[f"extract_pdf_{args.pdf_workers}_workers"] = summarize(latencies, peak, text_bytes)
+
+        latencies, peak, _ = measure(lambda: read_txt(entry["txt"]), args.repeat)
+        stages["extract_txt"] = summarize(latencies, peak, os.path.getsize(entry["txt"]))
+
+        latencies, peak, chunks = measure(lambda: create_chunks(text), args.repeat)
+        stages["create_chunks"] = summarize(latencies, peak, text_bytes, len(chunks))
+
+        latencies, peak, chunks = measure(
+            lambda: list(stream_chunks([text], CHUNK_SIZE, CHUNK_OVERLAP, CHUNK_UNIT)), args.repeat)
+        stages["stream_chunks"] = summarize(latencies, peak, text_bytes, len(chunks))
+
+        sample = chunks[:args.embed_chunks]
+        embeddings = None
+        if not args.skip_embed:
+            from vectorization.embed import embed_texts
+            embed_texts(sample[:1])  # load the model before timing
+            latencies, peak, embeddings = measure(lambda: embed_texts(sample), args.repeat)
+            stages["embed"] = summarize(latencies, peak, sum(len(c.encode("utf-8")) for c in sample), len(sample))
+
+        if not args.skip_store:
+            stages["collection_add"] = bench_store(workdir, label, sample, embeddings, args.repeat)
+
+        for stage, summary in stages.items():
+            print(f"  {stage:<28}" + "  ".join(f"{key}={value}" for key, value in summary.items()))
+        results.append({"corpus": label, "size_mb": entry["size_mb"], "stages": stages})
+    return results
+
+
+def bench_store(workdir, label, chunks, embeddings, repeat):
+    import chromadb
+
+    client = chromadb.PersistentClient(path=os.path.join(workdir, "chroma"))
+    if embeddings is None:
+        # fixed random vectors so the store is measured without an embedding model
+        import numpy as np
+        rng = np.random.default_rng(0)
+        embeddings = rng.standard_normal((len(chunks), 384), dtype=np.float32).tolist()
+
+    runs = []
+
+    def add_once():
+        name = f"bench_{label.replace('.', '_')}_{len(runs)}"
+        runs.append(name)
+        collection = client.get_or_create_collection(name=name)
+        collection.add(documents=chunks, embeddings=embeddings,
+                       metadatas=[{"source": name} for _ in chunks],
+                       ids=[f"{name}_{i}" for i in range(len(chunks))])
+
+    latencies, peak, _ = measure(add_once, repeat)
+    for name in runs:
+        client.delete_collection(name)
+    return summarize(latencies, peak, sum(len(c.encode("utf-8")) for c in chunks), len(chunks))
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old, new):
+    # prints p50 change per stage, positive means slower
+    old_stages = {(c["corpus"], s): v for c in old["results"] for s, v in c["stages"].items()}
+    print(f"\ncompared with {old.get('commit')}:")
+    for corpus in new["results"]:
+        for stage, summary in corpus["stages"].items():
+            before = old_stages.get((corpus["corpus"], stage))
+            if before is None:
+                continue
+            change = (summary["p50_s"] - before["p50_s"]) / before["p50_s"] * 100 if before["p50_s"] else 0.0
+            print(f"  {corpus['corpus']:<8}{stage:<28}{before['p50_s']:>10.4f}s ->{summary['p50_s']:>10.4f}s"
+                  f"  {change:+6.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1,5", help="comma separated corpus sizes in MB")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--pdf-workers", type=int, default=0, help="also time parallel pdf extraction")
+    parser.add_argument("--embed-chunks", type=int, default=256, help="chunks embedded and stored per run")
+    parser.add_argument("--skip-embed", action="store_true")
+    parser.add_argument("--skip-store", action="store_true")
+    parser.add_argument("--output", default="bench_vectorization.json")
+    parser.add_argument("--compare", help="earlier JSON result to compare against")
+    args = parser.parse_args()
+    args.sizes = [float(size) for size in args.sizes.split(",")]
+
+    workdir = tempfile.mkdtemp(prefix="klaw_bench_")
+    try:
+        results = run(args, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "commit": git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "args": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""
+Load test for the dispatch path to the AI server.
+
+Runs the `process_course` job that ProcessCourseAPIView queues, through admin_panel.jobs and
+admin_panel.processing as shipped: basic info, the outcome, syllabus and question batches, the
+material hash check and parallel uploads with their MaterialUpload records, then the processing
+trigger. The course rows live in a throwaway sqlite database (klaw_app/test_settings.py), and
+worker threads claim and run the jobs like `manage.py run_jobs`, so a failed attempt is retried
+from its step. Courses run at each of the given concurrency levels against ai.py with injected
+latency and faults, and the run reports throughput, per-step and per-course p50/p95/p99 latency
+and failures, next to the server side stats of ai.py. Results are written as JSON so runs from
+different commits can be compared. sqlite serializes the job and upload record writes, which
+shows in the step times at high concurrency levels.
+
+usage:
+    python benchmarks/load_ai_dispatch.py --concurrency 1,4,16 --courses 32
+    python benchmarks/load_ai_dispatch.py --latency-ms 50 --latency-dist lognormal --error-rate 0.02 --reset-rate 0.01
+    python benchmarks/load_ai_dispatch.py --server http://127.0.0.1:5000 --compare old.json --output new.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.bench_vectorization import git_commit  # noqa: E402
+
+FAULTS = ["latency_ms", "latency_dist", "latency_sigma", "error_rate", "reset_rate", "upload_kbps"]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_stub():
+    # ai.py on a free local port, returns (process, base url) once it answers
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "ai.py"), "--host", "127.0.0.1", "--port", str(port), "--quiet"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f"{base_url}/__stats", timeout=1)
+            return process, base_url
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("ai.py did not start")
+
+
+def setup_django(workdir, base_url):
+    # the app against a sqlite database in workdir, sending to the AI server at base_url
+    os.environ["DJANGO_SETTINGS_MODULE"] = "klaw_app.test_settings"
+    os.environ["AI_SERVER"] = base_url
+    import django
+    from django.conf import settings
+    from django.core.management import call_command
+
+    settings.DATABASES["default"]["NAME"] = os.path.join(workdir, "load.sqlite3")
+    settings.DATABASES["default"]["OPTIONS"] = {"timeout": 60}  # workers write job progress concurrently
+    django.setup()
+    from django.db.backends.sqlite3.base import DatabaseWrapper
+
+    # transactions take sqlite's write lock when they begin, so concurrent workers wait for each
+    # other instead of failing read-then-write transactions (update_or_create) with "database is locked"
+    DatabaseWrapper._start_transaction_under_autocommit = lambda self: self.cursor().execute("BEGIN IMMEDIATE")
+    call_command("migrate", run_syncdb=True, verbosity=0)
+    logging.getLogger("admin_panel").setLevel(logging.CRITICAL)  # failed attempts are counted instead
+
+
+def build_materials(directory, count, size_kb):
+    # files under media/ of the working directory, where material_file_path looks for them
+    os.makedirs(os.path.join(directory, "media"), exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, "media", f"material_{i}.txt")
+        with open(path, "wb") as f:
+            f.write(os.urandom(size_kb * 1024))
+        paths.append(path)
+    return paths
+
+
+def create_course(course_code, args, materials):
+    from admin_panel.models import CourseBasicInfo, CourseMaterial, CourseOutcome, CourseQuestion, CourseSyllabus
+
+    CourseBasicInfo.objects.create(course_name=f"Load test {course_code}", course_code=course_code,
+                                   year=2024, branch="CSE", semester=5, group="A")
+    CourseOutcome.objects.bulk_create([
+        CourseOutcome(course_code=course_code, short_form=f"CO{i + 1}", outcome=f"Outcome {i + 1} of {course_code}")
+        for i in range(args.rows)])
+    CourseSyllabus.objects.bulk_create([
+        CourseSyllabus(course_code=course_code, syllabus_item=f"Unit {i + 1}: topic {i + 1} of {course_code}")
+        for i in range(args.rows)])
+    CourseQuestion.objects.bulk_create([
+        CourseQuestion(course_code=course_code, question=f"Question {i + 1} about {course_code}?")
+        for i in range(args.rows)])
+    CourseMaterial.objects.bulk_create([
+        CourseMaterial(course_code=course_code, file_path=f"/media/{os.path.basename(path)}", file_type="notes")
+        for path in materials])
+
+
+def run_jobs(worker_id, job_ids, claimed_at, finished_at):
+    # the loop of `manage.py run_jobs` until every job of this level has finished
+    from django.db import connection
+
+    from admin_panel import jobs
+    from admin_panel.models import BackgroundJob
+
+    try:
+        while True:
+            job = jobs.claim(worker_id, ["process_course"])
+            if job is None:
+                if not BackgroundJob.objects.filter(_id__in=job_ids, status__in=["queued", "running"]).exists():
+                    return
+                time.sleep(0.01)  # a failed attempt waits for its retry delay
+                continue
+            claimed_at.setdefault(job._id, time.perf_counter())
+            jobs.run(job)
+            finished_at[job._id] = time.perf_counter()
+    finally:
+        connection.close()
+
+
+def step_names():
+    from admin_panel.processing import STEPS
+    return [name for name, _ in STEPS]
+
+
+def percentiles(values):
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def at(fraction):
+        return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+    return {
+        "count": len(ordered),
+        "p50_ms": round(statistics.median(ordered) * 1000, 2),
+        "p95_ms": round(at(0.95) * 1000, 2),
+        "p99_ms": round(at(0.99) * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+
+def run_level(base_url, concurrency, args, materials, run_index):
+    from admin_panel import jobs
+    from admin_panel.models import BackgroundJob
+
+    requests.post(f"{base_url}/__reset", timeout=5)
+    codes = [f"LOAD{run_index}C{concurrency}N{i}" for i in range(args.courses)]
+    for code in codes:
+        create_course(code, args, materials)
+    job_ids = [jobs.enqueue("process_course", code, max_attempts=args.max_attempts)._id for code in codes]
+    claimed_at, finished_at = {}, {}
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(lambda index: run_jobs(f"load-{run_index}-{index}", job_ids, claimed_at, finished_at),
+                          range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    outcomes = []
+    for job in BackgroundJob.objects.filter(_id__in=job_ids):
+        timings = json.loads(job.timings)
+        outcomes.append({
+            "seconds": finished_at[job._id] - claimed_at[job._id],  # from the first claim, retry delays included
+            "attempts": job.attempts,
+            "succeeded": job.status == "succeeded",
+            "error": f"{job.stage}: {job.error.split(':')[0]}" if job.status == "failed" else None,
+            "steps": {name: [timings[name]] if name in timings else [] for name in step_names()},
+        })
+
+    failures = {}
+    for outcome in outcomes:
+        if not outcome["succeeded"]:
+            failures[outcome["error"]] = failures.get(outcome["error"], 0) + 1
+    succeeded = sum(outcome["succeeded"] for outcome in outcomes)
+    return {
+        "concurrency": concurrency,
+        "courses": len(outcomes),
+        "succeeded": succeeded,
+        "failures": failures,
+        "retried": sum(outcome["attempts"] > 1 for outcome in outcomes),
+        "seconds": round(elapsed, 3),
+        "courses_per_s": round(succeeded / elapsed, 2) if elapsed else 0.0,
+        "course": percentiles([outcome["seconds"] for outcome in outcomes if outcome["succeeded"]]),
+        "steps": {name: percentiles([t for outcome in outcomes for t in outcome["steps"][name]])
+                  for name in step_names()},
+        "server": requests.get(f"{base_url}/__stats", timeout=5).json()["endpoints"],
+    }
+
+
+def compare(old, new):
+    # prints throughput and course p95 change per concurrency level
+    before_levels = {level["concurrency"]: level for level in old["results"]}
+    print(f"\ncompared with {old.get('commit')}:")
+    for level in new["results"]:
+        before = before_levels.get(level["concurrency"])
+        if before is None or "p95_ms" not in before["course"] or "p95_ms" not in level["course"]:
+            continue
+        throughput = ((level["courses_per_s"] - before["courses_per_s"]) / before["courses_per_s"] * 100
+                      if before["courses_per_s"] else 0.0)
+        p95 = ((level["course"]["p95_ms"] - before["course"]["p95_ms"]) / before["course"]["p95_ms"] * 100
+               if before["course"]["p95_ms"] else 0.0)
+        print(f"  concurrency {level['concurrency']:<4}"
+              f"{before['courses_per_s']:>8.2f} ->{level['courses_per_s']:>8.2f} courses/s {throughput:+6.1f}%   "
+              f"p95 {before['course']['p95_ms']:>9.1f} ->{level['course']['p95_ms']:>9.1f} ms {p95:+6.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", help="base url of a running ai.py, by default one is started on a free port")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma separated numbers of courses in flight")
+    parser.add_argument("--courses", type=int, default=32, help="courses per concurrency level")
+    parser.add_argument("--rows", type=int, default=20, help="outcomes, syllabus items and questions per course")
+    parser.add_argument("--materials", type=int, default=2, help="material files per course")
+    parser.add_argument("--material-kb", type=int, default=256)
+    parser.add_argument("--max-attempts", type=int, default=3, help="attempts per course, like JOB_MAX_ATTEMPTS")
+    parser.add_argument("--retry-delay", type=float, default=0.0,
+                        help="seconds before the first retry, doubled per attempt (JOB_RETRY_DELAY is 30)")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--latency-dist", choices=["fixed", "uniform", "lognormal"], default="fixed")
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--reset-rate", type=float, default=0.0)
+    parser.add_argument("--upload-kbps", type=float, default=0.0)
+    parser.add_argument("--output", default="load_ai_dispatch.json")
+    parser.add_argument("--compare", help="earlier JSON result to compare against")
+    args = parser.parse_args()
+    levels = [int(level) for level in args.concurrency.split(",")]
+    output = os.path.abspath(args.output)
+
+    process = None
+    base_url = args.server
+    if base_url is None:
+        process, base_url = start_stub()
+    workdir = tempfile.mkdtemp(prefix="klaw_load_")
+    cwd = os.getcwd()
+    try:
+        setup_django(workdir, base_url)
+        from admin_panel import jobs
+        jobs.JOB_RETRY_DELAY = args.retry_delay
+        os.chdir(workdir)  # material_file_path resolves media/ against the working directory
+        fault_config = {key: getattr(args, key) for key in FAULTS}
+        requests.post(f"{base_url}/__config", json=fault_config, timeout=5).raise_for_status()
+        materials = build_materials(workdir, args.materials, args.material_kb)
+        results = []
+        for index, concurrency in enumerate(levels):
+            level = run_level(base_url, concurrency, args, materials, index)
+            course = level["course"]
+            print(f"concurrency {concurrency:<4} {level['succeeded']}/{level['courses']} courses "
+                  f"in {level['seconds']}s  {level['courses_per_s']} courses/s  "
+                  f"p50={course.get('p50_ms')}ms p95={course.get('p95_ms')}ms p99={course.get('p99_ms')}ms  "
+                  f"retried={level['retried']} failures={level['failures']}")
+            for name, summary in level["steps"].items():
+                print(f"  {name:<16}" + "  ".join(f"{key}={value}" for key, value in summary.items()))
+            results.append(level)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    report = {
+        "commit": git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "args": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "server")},
+        "results": results,
+    }
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
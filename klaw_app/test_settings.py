@@ -0,0 +1,33 @@
+"""
+Settings for the test suite: `python manage.py test --settings=klaw_app.test_settings`.
+
+The tests run against a throwaway sqlite database instead of the MongoDB server, and do not
+need the firebase service account.
+"""
+import os
+
+# settings.py requires the variable; the file is never read, firebase is set up below
+os.environ.setdefault('GOOGLE_APPLICATION_CREDENTIALS', 'test-credentials.json')
+
+from .settings import *  # noqa: E402,F401,F403
+
+import firebase_admin  # noqa: E402
+from djongo.models import fields  # noqa: E402
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'test.sqlite3',  # noqa: F405
+    }
+}
+
+# the admin_panel migrations are written for djongo, the tables are created from the models
+MIGRATION_MODULES = {'admin_panel': None}
+
+# djongo's ObjectIdField has no sqlite column type; on sqlite the _id columns are integer keys
+fields.ObjectIdField.get_internal_type = lambda self: "AutoField"
+
+# admin_panel.utils initializes firebase from the service account file unless an app exists;
+# application default credentials are only loaded when a notification is sent
+if not firebase_admin._apps:
+    firebase_admin.initialize_app()
@@ -1,82 +1,194 @@
 
-from .pdf_extract import extract_text_from_pdf  # to extract contents from pdf
-from .chunks import create_chunks
+from .ingest import iter_text  # to extract contents from pdf and txt files
+from .chunks import stream_chunks
 from .create import access_collection
-from datetime import datetime
+from .manifest import get_manifest, file_sha256, chunk_sha256, chunk_id
+from .embed import embed_chunks
+from .search import invalidate as invalidate_search_cache
 
-import filetype
+import os
+import queue
+import threading
+import time
 
 
+# worker processes used to extract pdf pages, 1 keeps extraction in the calling process
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", 1))
 
-  
-def add(dbname,file):
-
+# chunk size and overlap, measured in CHUNK_UNIT ("chars" or "tokens")
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 1000))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", 150))
+CHUNK_UNIT = os.getenv("CHUNK_UNIT", "chars")
 
+# chunks written to the collection per collection.add call
+BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 64))
 
-    # access a collection for storing your PDF data
-    collection = access_collection(dbname)
+# batches that may wait in the queue before extraction and chunking block
+QUEUE_BATCHES = int(os.getenv("INGEST_QUEUE_BATCHES", 4))
 
 
-    print(f"going to work on  database =  {dbname}")        
-    print(f"going to work on  file =  {file}")            
+_DONE = object()  # end of stream marker put on the queue by the producer
 
 
-    # extract data from pdf or txt file
+def _produce_batches(chunks, batch_size, batches, failure, stop):
+    # runs in a background thread: extraction and chunking happen here while the
+    # calling thread embeds and writes earlier batches. put() blocks when the queue is full.
+    try:
+        batch = []
+        for chunk in chunks:
+            if stop.is_set():
+                return
+            batch.append(chunk)
+            if len(batch) == batch_size:
+                batches.put(batch)
+                batch = []
+        if batch:
+            batches.put(batch)
+    except BaseException as e:
+        failure.append(e)
+    finally:
+        batches.put(_DONE)
 
-    # Guess the file type using the filetype library
-    kind = filetype.guess(file)
-    #print(f"Guessed kind: {kind}")
-
-    # Check if it's a text file based on extension
-    if file.lower().endswith('.txt'):
-        print("File recognized as a text file based on its extension.")
-        # Proceed with reading the text file
-        with open(file, 'r') as f:
-            text_data = f.read()
-        print("Text data extracted.")
-    
-    elif kind.extension == 'pdf':
-        print("file found to be pdf")
-
-        text_data = extract_text_from_pdf(file)
-
-        print("pdf data extracted")
-
-    
-    else:
-        print("No accepted file type")
 
+  
+def add(dbname, file, batch_size=BATCH_SIZE, queue_batches=QUEUE_BATCHES, on_batch=None, source=None, force=False):
+    """
+    Extracts, chunks and stores a pdf or txt file in the collection `dbname`.
 
+    Ingestion is idempotent: chunk ids are derived from the file (`source`, default the file
+    name) and the chunk text. A file whose content hash is already recorded in the manifest is
+    skipped and "skipped" is returned, unless force=True. For a changed file only new chunks
+    are upserted and chunks that disappeared are deleted.
 
-    chunks = create_chunks(text_data) # created chunks of text data
-    print("Created data chunks")
+    Chunks are written in batches of `batch_size`; at most `queue_batches` batches are
+    buffered between the extraction thread and the writer. on_batch(index, size, seconds)
+    is called after every batch is written.
 
+    Raises ValueError for files that are neither pdf nor txt.
+    """
 
 
 
+    # extract data from pdf or txt file, as a stream of pages or text blocks.
+    # unsupported file types fail here, before anything is written
+    text_data = iter_text(file, pdf_workers=PDF_WORKERS)
 
-    # Get the current date and time
-    now = datetime.now()
+    # access a collection for storing your PDF data
+    collection = access_collection(dbname)
 
-    # Format the date and time
-    formatted_time = now.strftime("%Y-%m-%d-%H-%M-%S")
 
+    print(f"going to work on  database =  {dbname}")        
+    print(f"going to work on  file =  {file}")            
 
-    # Add extracted texts to the collection with unique IDs
-    collection.add(                          # instructs ChromaDB to store new information 
-        documents=chunks,             #  a list that contains the actual content you want to store.
-        metadatas=[{"source": f"{dbname}"}]*len(chunks),  #  allows you to add extra information about each document being added
-        ids=[f"{dbname}_{formatted_time}_{i}" for i in range(len(chunks))]  #assigns unique identifiers to each chunks of document being added.
+    source = source or os.path.basename(file)
+    manifest = get_manifest()
+    file_hash = file_sha256(file)
+    # an empty collection means the manifest is stale (collection dropped or backend switched)
+    stored = collection.count() > 0
+    if not force and stored and manifest.file_hash(dbname, source) == file_hash:
+        print(f"{source} is unchanged since the last ingestion, skipping")
+        return "skipped"
+    previous_ids = manifest.chunk_ids(dbname, source) if stored else set()
+
+
+    # created chunks of text data on paragraph/sentence boundaries, page by page
+    chunks = stream_chunks(text_data, CHUNK_SIZE, CHUNK_OVERLAP, CHUNK_UNIT)
+
+    batches = queue.Queue(maxsize=queue_batches)
+    failure = []
+    stop = threading.Event()
+    producer = threading.Thread(
+        target=_produce_batches, args=(chunks, batch_size, batches, failure, stop), daemon=True
     )
-    print("Created the vectoriezed data successfully")
+    producer.start()
+
+
+
+
+
+    metadata = {"source": f"{dbname}", "file": source}
+    chunk_ids = []
+    occurrences = {}
+    written = 0
+    batch_index = 0
+    started = time.perf_counter()
+
+    try:
+        while True:
+            batch = batches.get()
+            if batch is _DONE:
+                break
+
+            batch_started = time.perf_counter()
+            documents = []
+            hashes = []
+            ids = []
+            for chunk in batch:
+                chunk_hash = chunk_sha256(chunk)
+                occurrence = occurrences.get(chunk_hash, 0)
+                occurrences[chunk_hash] = occurrence + 1
+                cid = chunk_id(source, chunk_hash, occurrence)
+                chunk_ids.append(cid)
+                if cid not in previous_ids:  # chunks already stored from an earlier version are left alone
+                    documents.append(chunk)
+                    hashes.append(chunk_hash)
+                    ids.append(cid)
+
+            if ids:
+                # Add extracted texts to the collection, replacing any chunk with the same id
+                collection.upsert(                       # instructs ChromaDB to store new information
+                    documents=documents,             #  a list that contains the actual content you want to store.
+                    embeddings=embed_chunks(documents, hashes),  # cached vectors, only new text is embedded
+                    metadatas=[dict(metadata) for _ in ids],  #  allows you to add extra information about each document being added
+                    ids=ids  #assigns unique identifiers to each chunks of document being added.
+                )
+            elapsed = time.perf_counter() - batch_started
+            print(f"batch {batch_index}: {len(ids)} of {len(batch)} chunks written in {elapsed:.3f}s")
+            if on_batch is not None:
+                on_batch(batch_index, len(ids), elapsed)
+
+            written += len(ids)
+            batch_index += 1
+    finally:
+        # stop and unblock the producer if the writer stopped early
+        stop.set()
+        while producer.is_alive():
+            try:
+                batches.get_nowait()
+            except queue.Empty:
+                producer.join(0.1)
+
+    if failure:
+        raise failure[0]
+
+    # chunks of the previous version that no longer exist in the file
+    stale_ids = list(previous_ids.difference(chunk_ids))
+    for i in range(0, len(stale_ids), batch_size):
+        collection.delete(ids=stale_ids[i:i + batch_size])
+
+    manifest.record(dbname, source, file_hash, chunk_ids)
+    invalidate_search_cache(dbname)
+
+    print(f"Created the vectoriezed data successfully: {written} chunks written, {len(stale_ids)} removed, "
+          f"{len(chunk_ids) - written} unchanged in {batch_index} batches, "
+          f"{time.perf_counter() - started:.3f}s")
 
 
     return "success"
 
 
-
-
-
-
-
-
+def remove(dbname, source, batch_size=BATCH_SIZE):
+    """
+    Deletes the chunks of one ingested file (`source`, the name it was added under) from the
+    collection `dbname`. Returns the number of chunks removed.
+    """
+    manifest = get_manifest()
+    stale_ids = list(manifest.chunk_ids(dbname, source))
+    if stale_ids:
+        collection = access_collection(dbname)
+        for i in range(0, len(stale_ids), batch_size):
+            collection.delete(ids=stale_ids[i:i + batch_size])
+    manifest.forget(dbname, source)
+    invalidate_search_cache(dbname)
+    print(f"Removed {source} from {dbname}: {len(stale_ids)} chunks deleted")
+    return len(stale_ids)
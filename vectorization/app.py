@@ -1,7 +1,12 @@
+import sys
 
 from .add import add
 from .create import access_collection
 
-#sample usage
-access_collection("abd441")  # function to create a vectordb collection
-add("abd491","E:\JOB\fawstech\klaw app full idea script.txt")  # to access the collection and store pdf files one by one.
\ No newline at end of file
+#sample usage:  python -m vectorization.app <collection> <file>
+# (use "python manage.py vectorize" to ingest many files or whole courses at once)
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit("usage: python -m vectorization.app <collection> <file>")
+    access_collection(sys.argv[1])  # function to create a vectordb collection
+    add(sys.argv[1], sys.argv[2])  # to access the collection and store pdf files one by one.
@@ -1,7 +1,128 @@
-
-
+import re
 
 
 def create_chunks(text, chunk_size=100):
     # Split the text into chunks of a specified size
-    return [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
\ No newline at end of file
+    return [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+
+
+# places where a chunk may end, best first: paragraph break, end of sentence, any whitespace
+_BOUNDARIES = [
+    re.compile(r"\n[ \t\r\f\v]*\n\s*"),
+    re.compile(r"[.!?][\"')\]]*\s+"),
+    re.compile(r"\s+"),
+]
+_TOKEN = re.compile(r"\S+")
+_WHITESPACE = re.compile(r"\s")
+
+
+class _Chars:
+    # measures chunk size and overlap in characters
+
+    @staticmethod
+    def end(buffer, pos, n):
+        # index just after n units counted from pos, None if the buffer holds fewer
+        end = pos + n
+        return end if end <= len(buffer) else None
+
+    @staticmethod
+    def back(buffer, cut, n, floor):
+        # index n units before cut, moved forward to the start of a word
+        start = max(cut - n, floor)
+        if start > floor and not buffer[start - 1].isspace():
+            match = _WHITESPACE.search(buffer, start, cut)
+            start = match.end() if match else cut
+        return start
+
+
+class _Tokens:
+    # measures chunk size and overlap in whitespace separated tokens
+
+    @staticmethod
+    def end(buffer, pos, n):
+        if n <= 0:
+            return pos
+        count = 0
+        for match in _TOKEN.finditer(buffer, pos):
+            count += 1
+            if count == n:
+                return match.end()
+        return None
+
+    @staticmethod
+    def back(buffer, cut, n, floor):
+        if n <= 0:
+            return cut
+        starts = [match.start() for match in _TOKEN.finditer(buffer, floor, cut)]
+        return starts[-n] if len(starts) >= n else floor
+
+
+_UNITS = {"chars": _Chars, "tokens": _Tokens}
+
+
+def _find_cut(buffer, lower, upper):
+    # last boundary inside buffer[lower:upper], trying the strongest kind of boundary first;
+    # None when there is none
+    for pattern in _BOUNDARIES:
+        cut = None
+        for match in pattern.finditer(buffer, lower, upper):
+            cut = match.end()
+        if cut is not None:
+            return cut
+    return None
+
+
+def stream_chunks(pieces, chunk_size=1000, overlap=150, unit="chars"):
+    """
+    Splits an iterable of text pieces (pages, file blocks, ...) into chunks of at most
+    chunk_size units that end on a paragraph or sentence boundary where possible.
+    Consecutive chunks share roughly `overlap` units of text.
+    unit is "chars" or "tokens" (whitespace separated words).
+    Only a window of about one chunk is kept in memory and the source text is never joined.
+    """
+    if unit not in _UNITS:
+        raise ValueError(f"unit must be one of {sorted(_UNITS)}, got {unit!r}")
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive")
+    if not 0 <= overlap < chunk_size:
+        raise ValueError("overlap must be at least 0 and smaller than chunk_size")
+
+    measure = _UNITS[unit]
+    min_size = max(chunk_size // 2, 1)  # never cut a chunk shorter than this on a boundary
+    buffer = ""
+    pos = 0  # start of the text that is not yet fully emitted
+    emitted = 0  # end of the last emitted chunk
+
+    for piece in pieces:
+        if not piece:
+            continue
+        # drop the consumed prefix once per piece, not once per chunk
+        buffer = buffer[pos:] + piece
+        emitted = max(emitted - pos, 0)
+        pos = 0
+
+        while True:
+            limit = measure.end(buffer, pos, chunk_size)
+            if limit is None or limit >= len(buffer):
+                break  # wait for more text so the boundary search sees what follows
+            # every chunk ends past the previous one, else a large overlap could find the same
+            # boundary again and repeat the previous chunk
+            cut = _find_cut(buffer, max(measure.end(buffer, pos, min_size), emitted + 1), limit)
+            if cut is None and pos < emitted:
+                # no boundary between the previous chunk and the end of this window, start the
+                # window after the previous chunk instead of cutting a word
+                pos = emitted
+                continue
+            if cut is None:
+                cut = limit
+            chunk = buffer[pos:cut].strip()
+            if chunk:
+                yield chunk
+            emitted = cut
+            next_pos = measure.back(buffer, cut, overlap, pos)
+            pos = next_pos if next_pos > pos else cut
+
+    if buffer[emitted:].strip():
+        chunk = buffer[pos:].strip()
+        if chunk:
+            yield chunk
@@ -1,24 +1,161 @@
+import atexit
+import os
+import threading
+from collections import OrderedDict
+
 import chromadb
 
 
+DB_PATH = "db/"
+
+# how many collection handles are kept open per process
+COLLECTION_CACHE_SIZE = int(os.getenv("CHROMA_COLLECTION_CACHE_SIZE", 32))
+
+
+_clients = {}  # one PersistentClient per resolved db path
+_clients_lock = threading.Lock()
 
-def access_collection(dbname):
-    # Create a persistent ChromaDB client
-    client = chromadb.PersistentClient(path="db/")
+
+def get_client(path=DB_PATH):
+    # Create (once per process) a persistent ChromaDB client
 
     """
 
-    persist_directory="db/": This tells ChromaDB where to save its data on your computer. 
+    persist_directory="db/": This tells ChromaDB where to save its data on your computer.
     The "db/" means it will create a folder named "db" in your current working directory to store all the information.
 
+    Opening the client reads the sqlite metadata store under db/, so the client is created once
+    per path and shared by every thread of the process.
 
     """
 
+    key = os.path.abspath(path)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = chromadb.PersistentClient(path=path)
+                _clients[key] = client
+    return client
 
 
-    # Create a collection for storing your PDF data
-    collection = client.get_or_create_collection(name=dbname)  # collection is a cabinet for holding all of your files.
+class CollectionCache:
+    # bounded LRU of collection handles keyed by (db path, collection name). A handle is reopened
+    # when the generation marker of its collection changed, see vectorization/stores.py
+
+    def __init__(self, max_size=COLLECTION_CACHE_SIZE):
+        self.max_size = max_size
+        self._handles = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.reopened = 0
+
+    def get(self, path, name, create=True):
+        # with create=False a collection that does not exist is None and nothing is cached
+        from .stores import collection_generation, open_collection
+
+        key = (os.path.abspath(path), name)
+        generation = collection_generation(name, path)
+        with self._lock:
+            entry = self._handles.get(key)
+            if entry is not None and entry[1] == generation:
+                self._handles.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                self.reopened += 1  # promoted, dropped or rebuilt since it was opened
+            self.misses += 1
+
+        # opening the collection happens outside the lock so other names are not blocked
+        collection = open_collection(name, path, create=create)
+        if collection is None:
+            return None
+
+        with self._lock:
+            self._handles[key] = (collection, generation)
+            self._handles.move_to_end(key)
+            while len(self._handles) > self.max_size:
+                self._handles.popitem(last=False)
+                self.evictions += 1
+        return collection
+
+    def discard(self, path, name):
+        with self._lock:
+            self._handles.pop((os.path.abspath(path), name), None)
+
+    def clear(self):
+        with self._lock:
+            self._handles.clear()
+
+    def metrics(self):
+        with self._lock:
+            return {
+                "size": len(self._handles),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "reopened": self.reopened,
+            }
 
-    print("db accessed successfully")
+
+collection_cache = CollectionCache()
+
+
+def access_collection(dbname, path=DB_PATH, create=True):
+
+    # Create a collection for storing your PDF data
+    # (create=False for readers: None instead of a new, empty collection)
+    collection = collection_cache.get(path, dbname, create=create)  # collection is a cabinet for holding all of your files.
 
     return collection
+
+
+def drop_collection(dbname, path=DB_PATH):
+    # removes the collection from whichever backend holds it, with its manifest entries.
+    # returns True if anything was deleted.
+    from .manifest import get_manifest
+    from .search import invalidate
+    from .stores import bump_generation, flat_directory
+    import shutil
+
+    flat = flat_directory(dbname, path)  # raises ValueError for names that are not collection names
+    collection_cache.discard(path, dbname)
+    dropped = False
+    if os.path.isdir(flat):
+        shutil.rmtree(flat)
+        dropped = True
+    try:
+        get_client(path).delete_collection(name=dbname)
+        dropped = True
+    except Exception:  # not a chroma collection, the error type differs between chroma versions
+        pass
+    if dropped:
+        bump_generation(dbname, path)
+    get_manifest(path).forget(dbname)
+    invalidate(dbname)
+    return dropped
+
+
+def cache_metrics():
+    return collection_cache.metrics()
+
+
+def close_clients():
+    # shutdown hook: drops every cached handle and client. chroma writes through to db/ on every
+    # add, so there is nothing left to flush; clearing the shared system cache releases the
+    # sqlite connections and hnsw segments held by the process.
+    with _clients_lock:
+        collection_cache.clear()
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        clear_system_cache = getattr(client, "clear_system_cache", None)
+        if clear_system_cache is not None:
+            clear_system_cache()
+
+
+atexit.register(close_clients)
@@ -0,0 +1,267 @@
+import atexit
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from .embed_cache import get_embedding_cache
+
+
+# must match the embedding function the collections were created with, chroma's default
+# embedding function is all-MiniLM-L6-v2
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+
+# processes running the embedding model, 0 embeds in the calling thread instead
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", min(4, os.cpu_count() or 1)))
+
+# texts sent to a worker in one call, and how long a partial batch may wait for more texts
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 64))
+EMBED_MAX_LATENCY_MS = float(os.getenv("EMBED_MAX_LATENCY_MS", 50))
+
+# longest an embed() call waits for its vectors
+EMBED_TIMEOUT_S = float(os.getenv("EMBED_TIMEOUT_S", 300))
+
+_embedding_function = None
+_embedding_function_lock = threading.Lock()
+
+
+def get_embedding_function():
+    global _embedding_function
+    if _embedding_function is None:
+        with _embedding_function_lock:
+            if _embedding_function is None:
+                from chromadb.utils import embedding_functions
+                if EMBEDDING_MODEL == "all-MiniLM-L6-v2":
+                    _embedding_function = embedding_functions.DefaultEmbeddingFunction()
+                else:
+                    _embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
+                        model_name=EMBEDDING_MODEL
+                    )
+    return _embedding_function
+
+
+def _embed_in_worker(texts):
+    # runs inside a pool process, the model is loaded once per process on first use
+    vectors = get_embedding_function()(texts)
+    return [np.asarray(vector, dtype=np.float32) for vector in vectors]
+
+
+class _Request:
+    # texts from one embed() call, filled in as the batches holding them complete
+
+    def __init__(self, texts):
+        self.texts = texts
+        self.vectors = [None] * len(texts)
+        self.remaining = len(texts)
+        self.future = Future()
+        self.lock = threading.Lock()
+
+    def fill(self, index, vector):
+        with self.lock:
+            self.vectors[index] = vector
+            self.remaining -= 1
+            done = self.remaining == 0
+        if done and not self.future.done():  # failed meanwhile by another of its batches
+            self.future.set_result(self.vectors)
+
+
+class EmbeddingPool:
+    """
+    Embeds texts in a pool of worker processes.
+
+    Texts from concurrent embed() calls are grouped into batches of `batch_size`. A batch is
+    dispatched when it is full or when its oldest text has waited `max_latency_ms`.
+
+    A worker that dies (out of memory, a crash in the model runtime) breaks the whole process
+    pool; it is replaced by a new one and the batches it was running are sent once more.
+    """
+
+    def __init__(self, workers=EMBED_WORKERS, batch_size=EMBED_BATCH_SIZE, max_latency_ms=EMBED_MAX_LATENCY_MS,
+                 timeout=EMBED_TIMEOUT_S, function=_embed_in_worker):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_latency = max_latency_ms / 1000
+        self.timeout = timeout
+        self.function = function  # runs in the workers, so it must be importable there
+        self._executor = self._new_executor()
+        self._executor_lock = threading.Lock()
+        self._requests = queue.Queue()
+        self._in_flight = threading.BoundedSemaphore(workers * 2)
+        self._closed = False
+        self.batches = 0
+        self.texts = 0
+        self.restarts = 0
+        self._dispatcher = threading.Thread(target=self._dispatch, name="embedding-dispatcher", daemon=True)
+        self._dispatcher.start()
+
+    def _new_executor(self):
+        # spawn: the model runtime is not safe to use from a forked copy of a threaded process
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def running(self):
+        return not self._closed and self._dispatcher.is_alive()
+
+    def embed(self, texts):
+        if not texts:
+            return []
+        if not self.running():
+            raise RuntimeError("embedding pool is closed")
+        request = _Request(list(texts))
+        self._requests.put(request)
+        try:
+            return request.future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise TimeoutError(f"embedding {len(request.texts)} texts took longer than {self.timeout:.0f}s") from None
+
+    def _dispatch(self):
+        pending = []  # (request, index) waiting for a batch
+        deadline = None
+        try:
+            while True:
+                timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+                try:
+                    request = self._requests.get(timeout=timeout)
+                except queue.Empty:
+                    request = None
+                if request is not None and request is not _CLOSE:
+                    if not pending:
+                        deadline = time.monotonic() + self.max_latency
+                    pending.extend((request, index) for index in range(len(request.texts)))
+
+                while len(pending) >= self.batch_size:
+                    self._submit(pending[:self.batch_size])
+                    pending = pending[self.batch_size:]
+                    deadline = time.monotonic() + self.max_latency if pending else None
+                if pending and (request is _CLOSE or time.monotonic() >= deadline):
+                    self._submit(pending)
+                    pending = []
+                    deadline = None
+                if request is _CLOSE:
+                    return
+        finally:
+            # after close() nothing is left; after an unexpected error the waiting callers get it
+            # now instead of at their timeout
+            error = RuntimeError("embedding dispatcher stopped")
+            self._fail(pending, error)
+            while True:
+                try:
+                    request = self._requests.get_nowait()
+                except queue.Empty:
+                    break
+                if request is not _CLOSE:
+                    self._fail([(request, 0)], error)
+
+    def _submit(self, items):
+        self._in_flight.acquire()  # back pressure: at most two batches per worker in flight
+        self.batches += 1
+        self.texts += len(items)
+        self._send(items, retries=1)
+
+    def _send(self, items, retries):
+        # the in-flight slot taken by _submit is released once the batch has its vectors or failed
+        executor = self._executor
+        try:
+            future = executor.submit(self.function, [request.texts[index] for request, index in items])
+        except BrokenProcessPool as e:
+            self._broken(executor, items, retries, e)
+            return
+        except BaseException as e:
+            self._in_flight.release()
+            self._fail(items, e)
+            return
+
+        def done(result):
+            error = result.exception()
+            if isinstance(error, BrokenProcessPool):
+                self._broken(executor, items, retries, error)
+                return
+            self._in_flight.release()
+            if error is not None:
+                self._fail(items, error)
+                return
+            for (request, index), vector in zip(items, result.result()):
+                request.fill(index, vector)
+
+        future.add_done_callback(done)
+
+    def _broken(self, executor, items, retries, error):
+        # a worker of `executor` died, it refuses all work from then on
+        with self._executor_lock:
+            replace = self._executor is executor and not self._closed
+            if replace:
+                self._executor = self._new_executor()
+                self.restarts += 1
+        if replace:
+            executor.shutdown(wait=False)
+        if retries and not self._closed:
+            self._send(items, retries - 1)
+        else:
+            self._in_flight.release()
+            self._fail(items, error)
+
+    @staticmethod
+    def _fail(items, error):
+        for request in {id(request): request for request, _ in items}.values():
+            if not request.future.done():
+                request.future.set_exception(error)
+
+    def metrics(self):
+        return {"workers": self.workers, "batches": self.batches, "texts": self.texts, "restarts": self.restarts}
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._requests.put(_CLOSE)
+        self._dispatcher.join()
+        with self._executor_lock:
+            executor = self._executor
+        executor.shutdown(wait=True)
+
+
+_CLOSE = object()  # queued by close() to flush the last batch and stop the dispatcher
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_embedding_pool():
+    global _pool
+    if _pool is None or not _pool.running():
+        with _pool_lock:
+            if _pool is None or not _pool.running():
+                if _pool is not None:
+                    _pool.close()  # its dispatcher stopped, see EmbeddingPool._dispatch
+                _pool = EmbeddingPool()
+                atexit.register(_pool.close)
+    return _pool
+
+
+def embed_texts(texts):
+    # the embedding stage: the worker pool when EMBED_WORKERS > 0, else the calling thread
+    if EMBED_WORKERS > 0:
+        return get_embedding_pool().embed(texts)
+    return get_embedding_function()(texts)
+
+
+def embed_chunks(texts, chunk_hashes):
+    # embeddings for texts in order, computing only the ones missing from the cache
+    cache = get_embedding_cache()
+    cached = cache.get_many(EMBEDDING_MODEL, chunk_hashes)
+
+    missing = {}
+    for text, chunk_hash in zip(texts, chunk_hashes):
+        if chunk_hash not in cached and chunk_hash not in missing:
+            missing[chunk_hash] = text
+    if missing:
+        vectors = embed_texts(list(missing.values()))
+        computed = dict(zip(missing.keys(), vectors))
+        cache.put_many(EMBEDDING_MODEL, computed.items())
+        cached.update(computed)
+
+    return [np.asarray(cached[chunk_hash], dtype=np.float32).tolist() for chunk_hash in chunk_hashes]
@@ -0,0 +1,106 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+import numpy as np
+
+from .create import DB_PATH
+
+
+CACHE_FILE = "embedding_cache.sqlite3"
+
+# upper bound on cached vectors, the least recently used are evicted past it
+MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 100000))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    model TEXT NOT NULL,
+    chunk_hash TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (model, chunk_hash)
+);
+CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used);
+"""
+
+# sqlite limits the number of bound parameters per statement
+_LOOKUP_BATCH = 500
+
+
+class EmbeddingCache:
+    # on-disk float32 vectors keyed by (model name, chunk hash) with LRU eviction
+
+    def __init__(self, path=DB_PATH, max_entries=MAX_ENTRIES):
+        os.makedirs(path, exist_ok=True)
+        self.path = os.path.join(path, CACHE_FILE)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get_many(self, model, chunk_hashes):
+        # returns {chunk_hash: vector} for the hashes that are cached
+        found = {}
+        unique = list(dict.fromkeys(chunk_hashes))
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            for i in range(0, len(unique), _LOOKUP_BATCH):
+                part = unique[i:i + _LOOKUP_BATCH]
+                marks = ",".join("?" * len(part))
+                rows = conn.execute(
+                    f"SELECT chunk_hash, vector FROM embeddings WHERE model = ? AND chunk_hash IN ({marks})",
+                    [model, *part],
+                ).fetchall()
+                for chunk_hash, vector in rows:
+                    found[chunk_hash] = np.frombuffer(vector, dtype=np.float32)
+                if rows:
+                    conn.execute(
+                        f"UPDATE embeddings SET last_used = ? WHERE model = ? AND chunk_hash IN ({marks})",
+                        [now, model, *part],
+                    )
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(unique) - len(found)
+        return found
+
+    def put_many(self, model, items):
+        # items: iterable of (chunk_hash, vector)
+        now = time.time()
+        rows = [(model, chunk_hash, np.asarray(vector, dtype=np.float32).tobytes(), now)
+                for chunk_hash, vector in items]
+        if not rows:
+            return
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, chunk_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            count = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if count > self.max_entries:
+                conn.execute(
+                    "DELETE FROM embeddings WHERE rowid IN "
+                    "(SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+
+    def metrics(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "max_entries": self.max_entries}
+
+
+_caches = {}
+
+
+def get_embedding_cache(path=DB_PATH):
+    key = os.path.abspath(path)
+    if key not in _caches:
+        _caches[key] = EmbeddingCache(path)
+    return _caches[key]
@@ -0,0 +1,78 @@
+import codecs
+import io
+import os
+
+import filetype
+from charset_normalizer import from_bytes
+
+from .pdf_extract import extract_text_from_pdf
+
+
+# bytes read from a txt file per step, memory use does not depend on the file size
+TXT_BLOCK_SIZE = int(os.getenv("TXT_BLOCK_SIZE", 64 * 1024))
+
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+
+def detect_encoding(sample):
+    # encoding of a file from its first block
+    for bom, encoding in _BOMS:
+        if sample.startswith(bom):
+            return encoding
+    try:
+        # the block may end in the middle of a character, so decode it incrementally
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    matches = from_bytes(sample)
+    best = matches.best()
+    if best is None:
+        return "latin-1"
+    # short samples often fit several single byte code pages equally well, windows-1252 is
+    # by far the most common one among uploads
+    for match in matches:
+        if match.encoding == "cp1252" and match.chaos <= best.chaos and match.coherence >= best.coherence:
+            return "cp1252"
+    return best.encoding
+
+
+def iter_txt_blocks(path, block_size=TXT_BLOCK_SIZE):
+    # yields the text of the file a block at a time, newlines normalised like open(path, 'r')
+    with open(path, 'rb') as f:
+        block = f.read(block_size)
+        encoding = detect_encoding(block)
+        decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder(encoding)(errors="replace"), translate=True)
+        while block:
+            text = decoder.decode(block)
+            if text:
+                yield text
+            block = f.read(block_size)
+        text = decoder.decode(b"", final=True)
+        if text:
+            yield text
+
+
+def file_kind(path):
+    if path.lower().endswith('.txt'):
+        return "txt"
+    kind = filetype.guess(path)
+    if kind is not None and kind.extension == 'pdf':
+        return "pdf"
+    raise ValueError(f"Unsupported file type for {os.path.basename(path)}: only pdf and txt files can be vectorized")
+
+
+def iter_text(path, pdf_workers=1):
+    """
+    Text of a pdf or txt file as a stream of pieces for stream_chunks: pdf pages, or txt
+    blocks of TXT_BLOCK_SIZE bytes. Raises ValueError right away for any other file type.
+    """
+    if file_kind(path) == "txt":
+        return iter_txt_blocks(path)
+    return extract_text_from_pdf(path, stream=True, workers=pdf_workers)
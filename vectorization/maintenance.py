@@ -0,0 +1,168 @@
+import os
+import re
+import shutil
+import sqlite3
+from contextlib import closing
+
+from .create import DB_PATH, access_collection, collection_cache, drop_collection, get_client
+from .stores import FLAT_DIR, FlatCollection, bump_generation, flat_directory
+
+
+_UUID = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+
+# rows copied per call when a chroma collection is rebuilt
+REBUILD_BATCH = 1000
+
+
+class CatalogError(RuntimeError):
+    # chroma.sqlite3 is missing or unreadable, so which segment directories are in use is unknown
+    pass
+
+
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _chroma_segments(path):
+    # {collection name: [segment ids]} read straight from chroma's sqlite catalog
+    catalog = os.path.join(path, "chroma.sqlite3")
+    if not os.path.exists(catalog):
+        return {}
+    with closing(sqlite3.connect(f"file:{catalog}?mode=ro", uri=True)) as conn:
+        rows = conn.execute(
+            "SELECT collections.name, segments.id FROM segments JOIN collections ON segments.collection = collections.id"
+        ).fetchall()
+    segments = {}
+    for name, segment_id in rows:
+        segments.setdefault(name, []).append(segment_id)
+    return segments
+
+
+def collection_directories(path=DB_PATH):
+    # {collection name: (backend, [directories holding its files])} for every collection on disk
+    directories = {}
+    for name, segment_ids in _chroma_segments(path).items():
+        directories[name] = ("chroma", [
+            os.path.join(path, s) for s in segment_ids if os.path.isdir(os.path.join(path, s))
+        ])
+    flat_root = os.path.join(path, FLAT_DIR)
+    if os.path.isdir(flat_root):
+        for name in os.listdir(flat_root):
+            directories.setdefault(name, ("flat", [flat_directory(name, path)]))
+    return directories
+
+
+def collection_stats(path=DB_PATH):
+    # one dict per collection: name, backend, chunk count and bytes on disk
+    stats = []
+    for name, segment_ids in sorted(_chroma_segments(path).items()):
+        directories = [os.path.join(path, s) for s in segment_ids if os.path.isdir(os.path.join(path, s))]
+        stats.append({
+            "name": name,
+            "backend": "chroma",
+            "count": get_client(path).get_collection(name=name).count(),
+            "bytes": sum(directory_size(d) for d in directories),
+            "segments": [os.path.basename(d) for d in directories],
+        })
+    flat_root = os.path.join(path, FLAT_DIR)
+    if os.path.isdir(flat_root):
+        for name in sorted(os.listdir(flat_root)):
+            stats.append({
+                "name": name,
+                "backend": "flat",
+                "count": FlatCollection(name, path).count(),
+                "bytes": directory_size(flat_directory(name, path)),
+                "segments": [],
+            })
+    return stats
+
+
+def orphan_segment_directories(path=DB_PATH):
+    """
+    HNSW segment folders under db/ that no collection in the catalog refers to. Raises
+    CatalogError when there are segment folders but the catalog cannot be read: without it
+    every folder would look unreferenced.
+    """
+    if not os.path.isdir(path):
+        return []
+    candidates = [name for name in os.listdir(path) if _UUID.match(name) and os.path.isdir(os.path.join(path, name))]
+    if not candidates:
+        return []
+    catalog = os.path.join(path, "chroma.sqlite3")
+    if not os.path.exists(catalog):
+        raise CatalogError(f"{catalog} is missing, cannot tell which of {len(candidates)} segment directories are in use")
+    try:
+        referenced = {s for segment_ids in _chroma_segments(path).values() for s in segment_ids}
+    except sqlite3.Error as e:
+        raise CatalogError(f"Cannot read {catalog}: {e}")
+    return sorted(os.path.join(path, name) for name in candidates if name not in referenced)
+
+
+def remove_directories(directories):
+    # returns (bytes freed, directories that could not be removed completely)
+    freed = 0
+    failed = []
+    for directory in directories:
+        size = directory_size(directory)
+        try:
+            shutil.rmtree(directory)
+        except OSError:
+            failed.append(directory)
+        freed += size - directory_size(directory)
+    return freed, failed
+
+
+def drop_collections(names, path=DB_PATH):
+    return [name for name in names if drop_collection(name, path)]
+
+
+def rebuild_collection(name, path=DB_PATH):
+    """
+    Flat collections are compacted in place. Chroma collections are copied into a fresh
+    collection which then takes over the name, so the HNSW index is built again without the
+    deleted elements it keeps marking. The original is only deleted once the copy is complete.
+    """
+    collection = access_collection(name, path)
+    if isinstance(collection, FlatCollection) and collection.moved() is None:
+        return {"name": name, "backend": "flat", "removed": collection.compact(), "count": collection.count()}
+
+    client = get_client(path)
+    source = client.get_collection(name=name)
+    temporary_name = f"{name}__rebuild"
+    try:
+        client.delete_collection(name=temporary_name)  # left over from an interrupted rebuild
+    except Exception:
+        pass
+    target = client.create_collection(name=temporary_name, metadata=source.metadata or None)
+    offset = 0
+    while True:
+        page = source.get(include=["embeddings", "documents", "metadatas"], limit=REBUILD_BATCH, offset=offset)
+        if not page["ids"]:
+            break
+        target.add(ids=page["ids"], embeddings=page["embeddings"],
+                   documents=page["documents"], metadatas=page["metadatas"])
+        offset += len(page["ids"])
+
+    collection_cache.discard(path, name)
+    client.delete_collection(name=name)
+    target.modify(name=name)
+    bump_generation(name, path)  # handles of other processes still point at the deleted collection
+    return {"name": name, "backend": "chroma", "removed": 0, "count": offset}
+
+
+def vacuum_catalog(path=DB_PATH):
+    # returns the bytes freed in chroma.sqlite3
+    catalog = os.path.join(path, "chroma.sqlite3")
+    if not os.path.exists(catalog):
+        return 0
+    before = os.path.getsize(catalog)
+    with closing(sqlite3.connect(catalog, timeout=30)) as conn:
+        conn.execute("VACUUM")
+    return before - os.path.getsize(catalog)
@@ -0,0 +1,131 @@
+import hashlib
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+from .create import DB_PATH
+
+
+# record of which files have been ingested into which collection, and the chunk ids they produced
+MANIFEST_FILE = "ingest_manifest.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    collection TEXT NOT NULL,
+    source TEXT NOT NULL,
+    file_hash TEXT NOT NULL,
+    chunk_count INTEGER NOT NULL,
+    ingested_at REAL NOT NULL,
+    PRIMARY KEY (collection, source)
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    collection TEXT NOT NULL,
+    source TEXT NOT NULL,
+    chunk_id TEXT NOT NULL,
+    PRIMARY KEY (collection, source, chunk_id)
+);
+"""
+
+
+def file_sha256(path, block_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_sha256(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_id(source, chunk_hash, occurrence):
+    # the same chunk text in the same file always gets the same id, so unchanged chunks keep
+    # their ids when the rest of the file is edited. occurrence separates repeated chunks.
+    source_hash = hashlib.sha256(source.encode("utf-8")).hexdigest()
+    return f"{source_hash[:16]}_{chunk_hash[:32]}_{occurrence}"
+
+
+class Manifest:
+
+    def __init__(self, path=DB_PATH):
+        os.makedirs(path, exist_ok=True)
+        self.path = os.path.join(path, MANIFEST_FILE)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def file_hash(self, collection, source):
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT file_hash FROM files WHERE collection = ? AND source = ?", (collection, source)
+            ).fetchone()
+        return row[0] if row else None
+
+    def chunk_ids(self, collection, source):
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT chunk_id FROM chunks WHERE collection = ? AND source = ?", (collection, source)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def sources(self, collection):
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT source, file_hash, chunk_count, ingested_at FROM files WHERE collection = ?",
+                (collection,),
+            ).fetchall()
+        return [dict(zip(("source", "file_hash", "chunk_count", "ingested_at"), row)) for row in rows]
+
+    def version(self, collection):
+        # changes whenever a file of the collection is ingested or forgotten
+        with closing(self._connect()) as conn:
+            return tuple(conn.execute(
+                "SELECT COUNT(*), MAX(ingested_at) FROM files WHERE collection = ?", (collection,)
+            ).fetchone())
+
+    def recent_collections(self, limit):
+        # collections ordered by their latest ingest, newest first
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT collection FROM files GROUP BY collection ORDER BY MAX(ingested_at) DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def record(self, collection, source, file_hash, chunk_ids):
+        # replaces whatever was recorded for the file in one transaction
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM chunks WHERE collection = ? AND source = ?", (collection, source))
+            conn.executemany(
+                "INSERT OR IGNORE INTO chunks (collection, source, chunk_id) VALUES (?, ?, ?)",
+                ((collection, source, cid) for cid in chunk_ids),
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO files (collection, source, file_hash, chunk_count, ingested_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (collection, source, file_hash, len(chunk_ids), time.time()),
+            )
+
+    def forget(self, collection, source=None):
+        # source=None forgets the whole collection
+        with closing(self._connect()) as conn, conn:
+            if source is None:
+                conn.execute("DELETE FROM chunks WHERE collection = ?", (collection,))
+                conn.execute("DELETE FROM files WHERE collection = ?", (collection,))
+            else:
+                conn.execute("DELETE FROM chunks WHERE collection = ? AND source = ?", (collection, source))
+                conn.execute("DELETE FROM files WHERE collection = ? AND source = ?", (collection, source))
+
+
+_manifests = {}
+
+
+def get_manifest(path=DB_PATH):
+    key = os.path.abspath(path)
+    if key not in _manifests:
+        _manifests[key] = Manifest(path)
+    return _manifests[key]
@@ -1,14 +1,81 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
 
 import PyPDF2
 
-def extract_text_from_pdf(pdf_path):
+
+# number of pages handed to a worker process in one task when extracting in parallel
+PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", 16))
+
+
+def _page_text(page):
+    # extract_text() can return None for pages without a text layer
+    return (page.extract_text() or "") + "\n"
+
+
+def iter_pdf_pages(pdf_path):
+    # yields the text of the pdf one page at a time, so only one page is held in memory
     with open(pdf_path, 'rb') as file:
         reader = PyPDF2.PdfReader(file)
-        text = ""
         for page in reader.pages:
-            text += page.extract_text() + "\n"
-            #print(f"extracted text = {text}")
-    return text
+            yield _page_text(page)
+
+
+def count_pdf_pages(pdf_path):
+    with open(pdf_path, 'rb') as file:
+        return len(PyPDF2.PdfReader(file).pages)
+
+
+_worker_reader = None  # (path, open file, reader) kept by each worker process between tasks
+
+
+def _extract_page_range(pdf_path, start, stop):
+    # runs inside a worker process: every worker opens its own reader on the file, once
+    global _worker_reader
+    if _worker_reader is None or _worker_reader[0] != pdf_path:
+        if _worker_reader is not None:
+            _worker_reader[1].close()
+        file = open(pdf_path, 'rb')
+        _worker_reader = (pdf_path, file, PyPDF2.PdfReader(file))
+    reader = _worker_reader[2]
+    return [_page_text(reader.pages[i]) for i in range(start, stop)]
+
+
+def iter_pdf_pages_parallel(pdf_path, workers=None, pages_per_task=PAGES_PER_TASK):
+    # extracts page ranges in a process pool and yields the pages back in document order.
+    # at most two ranges per worker are in flight, so memory stays bounded for any page count.
+    page_count = count_pdf_pages(pdf_path)
+    ranges = [(start, min(start + pages_per_task, page_count)) for start in range(0, page_count, pages_per_task)]
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 2
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = []
+        next_range = 0
+        while next_range < len(ranges) or pending:
+            while next_range < len(ranges) and len(pending) < max_in_flight:
+                start, stop = ranges[next_range]
+                pending.append(executor.submit(_extract_page_range, pdf_path, start, stop))
+                next_range += 1
+            # results are consumed in submission order to keep the page order intact
+            for text in pending.pop(0).result():
+                yield text
+
+
+def extract_text_from_pdf(pdf_path, stream=False, workers=None):
+    """
+    stream=False: returns the whole text of the pdf as one string (original behaviour).
+    stream=True: returns a generator yielding the text page by page.
+    workers: when set above 1, pages are extracted in parallel by that many processes.
+    """
+    if workers and workers > 1:
+        pages = iter_pdf_pages_parallel(pdf_path, workers=workers)
+    else:
+        pages = iter_pdf_pages(pdf_path)
+
+    if stream:
+        return pages
+    return "".join(pages)
 
 # Extract text from both PDFs
 
@@ -19,7 +86,7 @@ sample usage
 text_subject1 = extract_text_from_pdf("Adolf_Hitler.pdf")
 text_subject2 = extract_text_from_pdf("Kunchan_Nambiar.pdf")
 
-'''
-
-
+for page_text in extract_text_from_pdf("Adolf_Hitler.pdf", stream=True, workers=4):
+    print(page_text)
 
+'''
@@ -0,0 +1,97 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .create import access_collection
+from .embed import get_embedding_function
+from .manifest import get_manifest
+
+
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", 256))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", 300))
+
+
+class ResultCache:
+    """
+    LRU of search results that expire after `ttl` seconds.
+
+    Every entry remembers the manifest version of its collection, so an ingestion in any
+    process makes the cached results of that collection stale. invalidate() drops them at once
+    for ingestions in this process.
+    """
+
+    def __init__(self, max_size=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, version, results)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, cached_version, results = entry
+                if expires_at > time.monotonic() and cached_version == version:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return results
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, version, results):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, version, results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, collection):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == collection]:
+                del self._entries[key]
+
+    def metrics(self):
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+result_cache = ResultCache()
+
+
+def invalidate(collection):
+    result_cache.invalidate(collection)
+
+
+def search(collection_name, query, k=5):
+    # returns (results, cached). results are the k closest chunks, nearest first
+    key = (collection_name, " ".join(query.split()), k)
+    version = get_manifest().version(collection_name)
+    results = result_cache.get(key, version)
+    if results is not None:
+        return results, True
+
+    collection = access_collection(collection_name, create=False)
+    if collection is None:
+        # nothing ingested for this course yet; searching must not create an empty collection
+        result_cache.put(key, version, [])
+        return [], False
+    # the query is embedded in this process: going through the worker pool would add its
+    # batching delay to every request
+    query_embedding = get_embedding_function()([key[1]])[0]
+    response = collection.query(
+        query_embeddings=[[float(x) for x in query_embedding]],
+        n_results=k,
+        include=["documents", "metadatas", "distances"],
+    )
+    results = [
+        {"id": chunk_id, "document": document, "metadata": metadata, "distance": distance}
+        for chunk_id, document, metadata, distance in zip(
+            response["ids"][0], response["documents"][0], response["metadatas"][0], response["distances"][0]
+        )
+    ]
+    result_cache.put(key, version, results)
+    return results, False
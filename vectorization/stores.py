@@ -0,0 +1,457 @@
+"""
+Vector store backends behind access_collection. Both expose the part of the chroma Collection
+api the project uses: name, count, add, upsert, delete, get and query.
+
+chroma: chromadb collection with an HNSW index under db/.
+flat:   FlatCollection, a memory-mapped float32 matrix searched exactly. For a few thousand
+        chunks this beats HNSW on both query time and cold open time.
+auto:   new collections start flat and are moved to chroma once they grow past FLAT_MAX_ROWS.
+
+Promoting, dropping or rebuilding a collection replaces the files behind its name, while other
+processes still hold handles to the old ones. Each of these bumps the generation marker of the
+collection under db/generations/; the collection cache reopens a handle whose marker changed,
+and a FlatCollection whose directory is gone follows the collection to its new place.
+"""
+import json
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import uuid
+from contextlib import closing
+
+import numpy as np
+
+from .create import DB_PATH, get_client
+
+
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "auto")
+FLAT_MAX_ROWS = int(os.getenv("FLAT_MAX_ROWS", 5000))
+FLAT_DIR = "flat"
+GENERATIONS_DIR = "generations"
+
+# rows copied per upsert when a flat collection is moved to chroma
+_PROMOTE_BATCH = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rows (
+    idx INTEGER PRIMARY KEY,
+    id TEXT NOT NULL,
+    document TEXT,
+    metadata TEXT,
+    alive INTEGER NOT NULL DEFAULT 1
+);
+CREATE UNIQUE INDEX IF NOT EXISTS rows_alive_id ON rows (id) WHERE alive = 1;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+# collection names end up in paths under db/, so only the characters chroma accepts are allowed
+_COLLECTION_NAME = re.compile(r"^[A-Za-z0-9._-]+$")
+
+
+def check_collection_name(name):
+    if not isinstance(name, str) or not _COLLECTION_NAME.match(name) or name.startswith(".") or ".." in name:
+        raise ValueError(f"Invalid collection name {name!r}, use letters, digits, '.', '_' and '-'")
+    return name
+
+
+def flat_directory(name, path=DB_PATH):
+    check_collection_name(name)
+    root = os.path.realpath(os.path.join(path, FLAT_DIR))
+    if os.path.dirname(os.path.realpath(os.path.join(root, name))) != root:
+        raise ValueError(f"Collection {name!r} resolves outside of {root}")
+    return os.path.join(path, FLAT_DIR, name)
+
+
+def _generation_path(name, path):
+    return os.path.join(path, GENERATIONS_DIR, check_collection_name(name))
+
+
+def collection_generation(name, path=DB_PATH):
+    # marker of the files behind a collection name, None until they were first replaced
+    try:
+        with open(_generation_path(name, path)) as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def bump_generation(name, path=DB_PATH):
+    # after the files behind a collection name were replaced; every process reopens its handle
+    marker = _generation_path(name, path)
+    os.makedirs(os.path.dirname(marker), exist_ok=True)
+    temporary = f"{marker}.{uuid.uuid4().hex}.tmp"
+    with open(temporary, "w") as f:
+        f.write(uuid.uuid4().hex)
+    os.replace(temporary, marker)
+
+
+def _normalize(vectors):
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+class FlatCollection:
+    """
+    Exact cosine search over a float32 matrix stored in vectors.f32 and memory-mapped for queries.
+
+    Row data (id, document, metadata) lives in rows.sqlite3 next to it. Updates and deletes only
+    mark the old row dead; `compact()` rewrites both files without the dead rows. Rows are
+    written at the position given by their idx inside a sqlite write transaction, which also
+    serializes writers from different processes. The compacted matrix goes to a new file
+    (vectors.<n>.f32) named by the meta row of the same transaction, so the row table and the
+    matrix it indexes are always switched together.
+    """
+
+    def __init__(self, name, path=DB_PATH, max_rows=None):
+        self.name = name
+        self.path = path
+        self.max_rows = max_rows  # promote to chroma past this many rows, None never promotes
+        self.directory = flat_directory(name, path)
+        os.makedirs(self.directory, exist_ok=True)
+        self._rows_path = os.path.join(self.directory, "rows.sqlite3")
+        self._lock = threading.RLock()
+        self._loaded_version = None
+        self._matrix = None
+        self._alive = None
+        self.promoted = None  # the collection that replaced this one, see moved()
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self._rows_path, timeout=30, isolation_level=None)
+
+    @staticmethod
+    def _meta(conn, key, default=None):
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    @staticmethod
+    def _set_meta(conn, key, value):
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def _vectors_path(self, conn):
+        # the matrix file the row table of this transaction indexes
+        generation = self._meta(conn, "vectors", 0)
+        return os.path.join(self.directory, f"vectors.{generation}.f32" if generation else "vectors.f32")
+
+    def _bump_version(self, conn):
+        self._set_meta(conn, "version", self._meta(conn, "version", 0) + 1)
+
+    def moved(self):
+        """
+        The collection that replaced this one, None while its flat files are in place. A handle
+        in another process may have promoted the collection to chroma, or it was dropped; the
+        directory is gone then and the collection is opened again by name.
+        """
+        if self.promoted is None and not os.path.isdir(self.directory):
+            self.promoted = open_collection(self.name, self.path)
+        return self.promoted
+
+    def _begin_write(self, conn):
+        # takes the write lock; False when another handle promoted the collection while this one waited
+        conn.execute("BEGIN IMMEDIATE")
+        if self._meta(conn, "promoted"):
+            conn.execute("ROLLBACK")
+            self.promoted = get_client(self.path).get_or_create_collection(name=self.name)
+            return False
+        return True
+
+    # --- writes ---
+
+    def add(self, ids, embeddings=None, metadatas=None, documents=None):
+        return self.upsert(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=documents)
+
+    def upsert(self, ids, embeddings=None, metadatas=None, documents=None):
+        if self.moved() is not None:
+            return self.promoted.upsert(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=documents)
+        if not ids:
+            return
+        if embeddings is None:
+            from .embed import get_embedding_function
+            embeddings = get_embedding_function()(documents)
+        vectors = _normalize(embeddings)
+        documents = documents or [None] * len(ids)
+        metadatas = metadatas or [None] * len(ids)
+
+        with self._lock, closing(self._connect()) as conn:
+            if not self._begin_write(conn):
+                return self.promoted.upsert(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=documents)
+            try:
+                dimension = self._meta(conn, "dimension")
+                if dimension is None:
+                    dimension = vectors.shape[1]
+                    self._set_meta(conn, "dimension", dimension)
+                elif dimension != vectors.shape[1]:
+                    raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match collection dimension {dimension}")
+
+                self._mark_dead(conn, ids)
+                start = conn.execute("SELECT COALESCE(MAX(idx) + 1, 0) FROM rows").fetchone()[0]
+                conn.executemany(
+                    "INSERT INTO rows (idx, id, document, metadata, alive) VALUES (?, ?, ?, ?, 1)",
+                    [(start + i, cid, document, json.dumps(metadata) if metadata is not None else None)
+                     for i, (cid, document, metadata) in enumerate(zip(ids, documents, metadatas))],
+                )
+                # vectors go to disk before the rows become visible with the commit
+                vectors_path = self._vectors_path(conn)
+                with open(vectors_path, "r+b" if os.path.exists(vectors_path) else "wb") as f:
+                    f.seek(start * dimension * 4)
+                    f.write(vectors.tobytes())
+                self._bump_version(conn)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+        if self.max_rows is not None and self.count() > self.max_rows:
+            self.promote()
+
+    def delete(self, ids=None, where=None):
+        if self.moved() is not None:
+            return self.promoted.delete(ids=ids, where=where)
+        if where is not None:
+            raise NotImplementedError("FlatCollection.delete only supports ids")
+        if not ids:
+            return
+        with self._lock, closing(self._connect()) as conn:
+            if not self._begin_write(conn):
+                return self.promoted.delete(ids=ids, where=where)
+            self._mark_dead(conn, ids)
+            self._bump_version(conn)
+            conn.execute("COMMIT")
+
+    @staticmethod
+    def _mark_dead(conn, ids):
+        for i in range(0, len(ids), 500):
+            part = ids[i:i + 500]
+            conn.execute(
+                f"UPDATE rows SET alive = 0 WHERE alive = 1 AND id IN ({','.join('?' * len(part))})", part
+            )
+
+    # --- reads ---
+
+    def count(self):
+        if self.moved() is not None:
+            return self.promoted.count()
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM rows WHERE alive = 1").fetchone()[0]
+
+    def _load(self):
+        # (re)maps the matrix when this or another process changed the collection
+        with closing(self._connect()) as conn:
+            while True:
+                conn.execute("BEGIN")  # the meta and rows read below belong to one commit
+                try:
+                    version = self._meta(conn, "version", 0)
+                    if version == self._loaded_version:
+                        return
+                    dimension = self._meta(conn, "dimension")
+                    size = conn.execute("SELECT COALESCE(MAX(idx) + 1, 0) FROM rows").fetchone()[0]
+                    alive = np.zeros(size, dtype=bool)
+                    for (idx,) in conn.execute("SELECT idx FROM rows WHERE alive = 1"):
+                        alive[idx] = True
+                    matrix = None
+                    if size and dimension:
+                        matrix = np.memmap(self._vectors_path(conn), dtype=np.float32, mode="r", shape=(size, dimension))
+                    break
+                except FileNotFoundError:
+                    continue  # compacted meanwhile, its commit removed the file this read was given
+                finally:
+                    conn.execute("COMMIT")
+        self._matrix = matrix
+        self._alive = alive
+        self._loaded_version = version
+
+    def _rows(self, conn, column, value_list):
+        rows = {}
+        for i in range(0, len(value_list), 500):
+            part = value_list[i:i + 500]
+            for row in conn.execute(
+                f"SELECT idx, id, document, metadata FROM rows WHERE {column} IN ({','.join('?' * len(part))})"
+                + (" AND alive = 1" if column == "id" else ""),
+                part,
+            ):
+                rows[row[0] if column == "idx" else row[1]] = row
+        return rows
+
+    def query(self, query_embeddings=None, query_texts=None, n_results=10, where=None,
+              include=("documents", "metadatas", "distances")):
+        if self.moved() is not None:
+            return self.promoted.query(query_embeddings=query_embeddings, query_texts=query_texts,
+                                       n_results=n_results, where=where, include=list(include))
+        if where is not None:
+            raise NotImplementedError("FlatCollection.query does not support where filters")
+        if query_embeddings is None:
+            from .embed import get_embedding_function
+            query_embeddings = get_embedding_function()(query_texts)
+
+        with self._lock:
+            self._load()
+            matrix, alive = self._matrix, self._alive
+
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        queries = _normalize(query_embeddings)
+        with closing(self._connect()) as conn:
+            for query in queries:
+                if matrix is None or not alive.any():
+                    for key in result:
+                        result[key].append([])
+                    continue
+                scores = matrix @ query
+                scores[~alive] = -np.inf
+                k = min(n_results, int(alive.sum()))
+                top = np.argpartition(-scores, k - 1)[:k]
+                top = top[np.argsort(-scores[top])]
+                rows = self._rows(conn, "idx", [int(i) for i in top])
+                result["ids"].append([rows[int(i)][1] for i in top])
+                result["documents"].append([rows[int(i)][2] for i in top])
+                result["metadatas"].append([json.loads(rows[int(i)][3]) if rows[int(i)][3] else None for i in top])
+                result["distances"].append([float(1 - scores[i]) for i in top])  # cosine distance
+        return {key: value for key, value in result.items() if key == "ids" or key in include}
+
+    def get(self, ids=None, include=("documents", "metadatas"), limit=None, offset=None):
+        if self.moved() is not None:
+            return self.promoted.get(ids=ids, include=list(include), limit=limit, offset=offset)
+        with self._lock:
+            self._load()
+            matrix = self._matrix
+        with closing(self._connect()) as conn:
+            if ids is not None:
+                found = self._rows(conn, "id", list(ids))
+                rows = [found[cid] for cid in ids if cid in found]
+            else:
+                rows = conn.execute(
+                    "SELECT idx, id, document, metadata FROM rows WHERE alive = 1 ORDER BY idx LIMIT ? OFFSET ?",
+                    (-1 if limit is None else limit, offset or 0),
+                ).fetchall()
+        result = {"ids": [row[1] for row in rows]}
+        if "documents" in include:
+            result["documents"] = [row[2] for row in rows]
+        if "metadatas" in include:
+            result["metadatas"] = [json.loads(row[3]) if row[3] else None for row in rows]
+        if "embeddings" in include:
+            result["embeddings"] = [matrix[row[0]].tolist() for row in rows]
+        return result
+
+    # --- maintenance ---
+
+    def promote(self):
+        # copies every live row into a chroma collection of the same name and removes the flat files
+        with self._lock:
+            if self.moved() is not None:
+                return self.promoted
+            chroma = get_client(self.path).get_or_create_collection(name=self.name)
+            with closing(self._connect()) as conn:
+                # writers on other handles wait for the lock until the copy is complete, then see
+                # the promoted marker and write to chroma instead
+                if not self._begin_write(conn):
+                    return self.promoted
+                try:
+                    offset = 0
+                    while True:
+                        page = self.get(include=("documents", "metadatas", "embeddings"),
+                                        limit=_PROMOTE_BATCH, offset=offset)
+                        if not page["ids"]:
+                            break
+                        chroma.upsert(ids=page["ids"], embeddings=page["embeddings"],
+                                      documents=page["documents"], metadatas=page["metadatas"])
+                        offset += len(page["ids"])
+                    self._set_meta(conn, "promoted", 1)
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+            self.promoted = chroma
+            self._matrix = None
+            shutil.rmtree(self.directory, ignore_errors=True)
+        bump_generation(self.name, self.path)
+        print(f"collection {self.name} moved to chroma with {offset} rows")
+        return chroma
+
+    def compact(self):
+        # rewrites the matrix and the row table without dead rows
+        if self.moved() is not None:
+            return 0
+        with self._lock, closing(self._connect()) as conn:
+            if not self._begin_write(conn):
+                return 0
+            current = self._vectors_path(conn)
+            compacted = None
+            try:
+                dimension = self._meta(conn, "dimension")
+                live = conn.execute("SELECT idx, id, document, metadata FROM rows WHERE alive = 1 ORDER BY idx").fetchall()
+                dead = conn.execute("SELECT COUNT(*) FROM rows WHERE alive = 0").fetchone()[0]
+                if dimension and dead:
+                    # the old matrix stays in place until the new row table is committed
+                    self._set_meta(conn, "vectors", self._meta(conn, "vectors", 0) + 1)
+                    compacted = self._vectors_path(conn)
+                    source = np.memmap(current, dtype=np.float32, mode="r")
+                    source = source.reshape(-1, dimension)
+                    with open(compacted, "wb") as f:
+                        for row in live:
+                            f.write(source[row[0]].tobytes())
+                    del source
+                    conn.execute("DELETE FROM rows")
+                    conn.executemany(
+                        "INSERT INTO rows (idx, id, document, metadata, alive) VALUES (?, ?, ?, ?, 1)",
+                        [(i, row[1], row[2], row[3]) for i, row in enumerate(live)],
+                    )
+                    self._bump_version(conn)
+                # matrix files of compactions that crashed before their commit
+                for name in os.listdir(self.directory):
+                    if name.startswith("vectors.") and name.endswith(".f32") and \
+                            os.path.join(self.directory, name) not in (current, compacted):
+                        os.remove(os.path.join(self.directory, name))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                if compacted is not None and os.path.exists(compacted):
+                    os.remove(compacted)
+                raise
+            self._loaded_version = None
+        if compacted is not None:
+            os.remove(current)  # no commit refers to it any more, open memory maps keep their pages
+        return dead
+
+
+def _chroma_collection(name, path):
+    # the existing chroma collection of this name, None without one; a db/ without the chroma
+    # catalog has none, and opening a client there would create the catalog
+    if not os.path.exists(os.path.join(path, "chroma.sqlite3")):
+        return None
+    try:
+        return get_client(path).get_collection(name=name)
+    except Exception:  # chroma raises ValueError or its own NotFound error depending on version
+        return None
+
+
+def open_collection(name, path=DB_PATH, backend=None, create=True):
+    # picks the backend for a collection, see the module docstring. With create=False a
+    # collection that does not exist yet is None instead of a new, empty one
+    check_collection_name(name)
+    backend = backend or VECTOR_BACKEND
+    if backend == "flat":
+        if not create and not os.path.isdir(flat_directory(name, path)):
+            return None
+        return FlatCollection(name, path)
+    if backend == "chroma":
+        if not create:
+            return _chroma_collection(name, path)
+        return get_client(path).get_or_create_collection(name=name)
+    if backend != "auto":
+        raise ValueError(f"Unknown VECTOR_BACKEND {backend!r}, use auto, flat or chroma")
+
+    if os.path.isdir(flat_directory(name, path)):
+        return FlatCollection(name, path, max_rows=FLAT_MAX_ROWS)
+    collection = _chroma_collection(name, path)
+    if collection is not None or not create:
+        return collection
+    return FlatCollection(name, path, max_rows=FLAT_MAX_ROWS)
@@ -0,0 +1,92 @@
+"""
+Warm-up of the vector store before the first request.
+
+A freshly started process has no collection handle open and none of the index files under db/
+in the page cache, so the first query against a course reads its HNSW segment (or flat matrix)
+from disk. warm_up() does that work ahead of time: it maps every file of the chosen collections
+with a readahead hint, opens the collections and runs one query against each so the index is
+loaded into memory.
+
+VECTOR_WARMUP=1 runs it in a background thread when django starts (see admin_panel.apps),
+`python manage.py vectordb warmup` runs it on demand.
+"""
+import logging
+import mmap
+import os
+import threading
+import time
+
+from .create import DB_PATH, access_collection
+from .maintenance import collection_directories
+from .manifest import get_manifest
+
+
+logger = logging.getLogger(__name__)
+
+# comma separated collections to warm up, empty warms the most recently ingested ones
+WARMUP_COLLECTIONS = [name for name in os.getenv("VECTOR_WARMUP_COLLECTIONS", "").split(",") if name.strip()]
+WARMUP_LIMIT = int(os.getenv("VECTOR_WARMUP_LIMIT", 8))
+
+
+def preload_file(file_path):
+    # brings the file into the page cache, returns its size
+    size = os.path.getsize(file_path)
+    if size == 0:
+        return 0
+    with open(file_path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if hasattr(mapped, "madvise"):
+                mapped.madvise(mmap.MADV_WILLNEED)
+            elif hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(f.fileno(), 0, size, os.POSIX_FADV_WILLNEED)
+            # the hint is asynchronous, reading one byte per page makes sure the pages are resident
+            for offset in range(0, size, mmap.PAGESIZE):
+                mapped[offset]
+    return size
+
+
+def warm_collection(name, directories, path=DB_PATH):
+    started = time.perf_counter()
+    preloaded = 0
+    for directory in directories:
+        for root, _, files in os.walk(directory):
+            for file_name in files:
+                preloaded += preload_file(os.path.join(root, file_name))
+
+    collection = access_collection(name, path)
+    sample = collection.get(limit=1, include=["embeddings"])
+    if sample["ids"]:
+        # the index itself is only loaded by the first query
+        collection.query(query_embeddings=[list(sample["embeddings"][0])], n_results=1)
+    return {"name": name, "bytes": preloaded, "seconds": round(time.perf_counter() - started, 3)}
+
+
+def warm_up(names=None, limit=WARMUP_LIMIT, path=DB_PATH):
+    """
+    names: collections to warm up. Defaults to VECTOR_WARMUP_COLLECTIONS, or else the `limit`
+    most recently ingested collections. Names without a collection on disk are skipped.
+    Returns one dict per collection with the bytes preloaded and the seconds it took.
+    """
+    started = time.perf_counter()
+    names = names or WARMUP_COLLECTIONS or get_manifest(path).recent_collections(limit)
+    directories = collection_directories(path)
+
+    results = []
+    for name in names:
+        if name not in directories:
+            logger.warning(f"Warm-up skipped {name}: no such collection")
+            continue
+        try:
+            results.append(warm_collection(name, directories[name][1], path))
+        except Exception as e:
+            logger.error(f"Warm-up of {name} failed: {str(e)}")
+
+    logger.info(f"Vector store warm-up: {len(results)} collections, "
+                f"{sum(r['bytes'] for r in results)} bytes in {time.perf_counter() - started:.2f}s")
+    return results
+
+
+def warm_up_in_background(names=None):
+    thread = threading.Thread(target=warm_up, args=(names,), name="vector-warmup", daemon=True)
+    thread.start()
+    return thread